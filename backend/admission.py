@@ -0,0 +1,113 @@
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator
+
+logger = logging.getLogger(__name__)
+
+MAX_CONCURRENT_WORKFLOWS = int(os.getenv("MAX_CONCURRENT_WORKFLOWS", "8"))
+MAX_QUEUED_WORKFLOWS = int(os.getenv("MAX_QUEUED_WORKFLOWS", "16"))
+QUEUE_TIMEOUT = float(os.getenv("WORKFLOW_QUEUE_TIMEOUT", "10"))
+RETRY_AFTER = int(os.getenv("WORKFLOW_RETRY_AFTER", "5"))
+
+class Overloaded(Exception):
+    def __init__(self, status: int, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+class AdmissionGate:
+    """Caps how many workflows run at once, with a bounded wait queue in front.
+
+    A request that finds the queue full is rejected immediately with 429; one
+    that waits longer than ``queue_timeout`` or arrives after ``close()`` gets 503.
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int, queue_timeout: float, retry_after: int):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self.closed = False
+        self._cond = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._cond:
+            if self.closed:
+                raise Overloaded(503, "Server is shutting down", self.retry_after)
+            if self.active < self.max_concurrent and self.waiting == 0:
+                self.active += 1
+                return
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                logger.warning("[Admission] Queue full (%d active, %d waiting), rejecting", self.active, self.waiting)
+                raise Overloaded(429, "Too many requests in progress", self.retry_after)
+
+            self.waiting += 1
+            try:
+                deadline = time.monotonic() + self.queue_timeout
+                while self.active >= self.max_concurrent and not self.closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.rejected += 1
+                        logger.warning("[Admission] Request waited %.1fs without a free slot, rejecting", self.queue_timeout)
+                        raise Overloaded(503, "Timed out waiting for a free worker", self.retry_after)
+                    self._cond.wait(remaining)
+                if self.closed:
+                    raise Overloaded(503, "Server is shutting down", self.retry_after)
+                self.active += 1
+            finally:
+                self.waiting -= 1
+
+    def release(self) -> None:
+        with self._cond:
+            self.active -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def close(self) -> None:
+        """Stop admitting work; queued requests are rejected, running ones continue."""
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+        logger.info("[Admission] Closed, %d workflows still running", self.active)
+
+    def drain(self, timeout: float) -> bool:
+        """Close the gate and wait up to ``timeout`` seconds for running workflows to finish."""
+        self.close()
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self.active > 0:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.warning("[Admission] Drain timed out with %d workflows running", self.active)
+                    return False
+                self._cond.wait(remaining)
+        logger.info("[Admission] Drained")
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "active": self.active,
+                "waiting": self.waiting,
+                "rejected": self.rejected,
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "closed": self.closed
+            }
+
+workflow_gate = AdmissionGate(MAX_CONCURRENT_WORKFLOWS, MAX_QUEUED_WORKFLOWS, QUEUE_TIMEOUT, RETRY_AFTER)
@@ -1,8 +1,18 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
-from workflow import run_workflow, FarmerState
+from workflow import run_workflow, run_batch, stream_workflow, profile_analysis_node, FarmerState
+from eligibility import scheme_table
+from charts import get_chart
+from validation import refine_path_counts
+from admission import workflow_gate, Overloaded
+from metrics import REQUEST_SECONDS
+from request_log import LOGGED_PATHS, request_log
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from dotenv import load_dotenv
 import logging
+import json
+import os
+import time
 
 load_dotenv()
 
@@ -13,6 +23,109 @@ CORS(app)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+REQUIRED_FIELDS = ['district', 'state', 'land_size', 'crop_type']
+BATCH_MAX_PROFILES = int(os.getenv("BATCH_MAX_PROFILES", "500"))
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def observe_latency(response):
+    if request.url_rule is not None and "request_start" in g:
+        REQUEST_SECONDS.labels(request.url_rule.rule, str(response.status_code)).observe(time.perf_counter() - g.request_start)
+    if request_log is not None and request.method == 'POST' and request.path in LOGGED_PATHS:
+        request_log.record(request.path, request.get_json(silent=True), response.status_code)
+    return response
+
+def profile_error(profile):
+    """Return an (error, message) pair for an invalid profile, or None if it is valid."""
+    if not isinstance(profile, dict):
+        return "Invalid request format", "Profile data is required"
+    for field in REQUIRED_FIELDS:
+        if field not in profile or not profile[field]:
+            return "Missing required field", f"{field} is required in profile"
+    return None
+
+def validate_request(data):
+    """Return an error response for a malformed request body, or None if it is valid."""
+    error = profile_error(data.get('profile') if isinstance(data, dict) else None)
+    if error:
+        return jsonify({
+            "error": error[0],
+            "message": error[1]
+        }), 400
+    return None
+
+def build_initial_state(data) -> FarmerState:
+    return {
+        "profile": {
+            "village": data['profile'].get('village', ''),
+            "district": data['profile']['district'],
+            "state": data['profile']['state'],
+            "land_size": data['profile']['land_size'],
+            "land_ownership": data['profile'].get('ownership', 'owned').lower(),
+            "crop_type": data['profile']['crop_type'],
+            "irrigation": data['profile'].get('irrigation', 'rain-fed').lower(),
+            "income": data['profile'].get('income', '0'),
+            "caste_category": data['profile'].get('caste_category', 'general').lower(),
+            "bank_account": data['profile'].get('bank_account', 'yes').lower(),
+            "existing_schemes": data['profile'].get('existing_schemes', 'none').lower()
+        },
+        "schemes": [],
+        "recommendations": None,
+        "refinement_needed": False,
+        "feedback": data.get('feedback'),
+        "visuals": [],
+        "bypass_cache": bool(data.get('bypass_cache', False)),
+        "cache_hit": False
+    }
+
+def format_schemes(schemes):
+    return [
+        {
+            "title": doc.metadata.get('title', 'Untitled'),
+            "summary": doc.page_content[:200] + "..." if len(doc.page_content) > 200 else doc.page_content,
+            "url": doc.metadata.get('url', ''),
+            "source": doc.metadata.get('source', 'unknown')
+        }
+        for doc in schemes
+    ]
+
+def format_response(result, include_timings=False):
+    response = {
+        "status": "success",
+        "data": {
+            "profile": result["profile"],
+            "recommendations": result["recommendations"],
+            "schemes": format_schemes(result["schemes"]),
+            "visuals": [f"/api/charts/{key}.png" for key in result.get("visuals", [])],
+            "needs_refinement": result.get("refinement_needed", False)
+        },
+        "metadata": {
+            "farmer_type": result["profile"].get("farmer_type", "unknown"),
+            "needs_insurance": result["profile"].get("needs_insurance", "unknown"),
+            "cache_hit": result.get("cache_hit", False),
+            "context": result.get("context_stats", {})
+        }
+    }
+    if include_timings:
+        response["metadata"]["timings"] = result.get("timings", {})
+    return response
+
+def overloaded_response(error: Overloaded):
+    response = jsonify({
+        "status": "error",
+        "error": error.reason,
+        "message": "Server is busy, please retry later"
+    })
+    response.status_code = error.status
+    response.headers["Retry-After"] = str(error.retry_after)
+    return response
+
+def sse_event(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
 @app.route('/api/recommendations', methods=['POST'])
 def get_recommendations():
     """
@@ -32,80 +145,31 @@ def get_recommendations():
             "bank_account": "yes",
             "existing_schemes": "none"
         },
-        "feedback": null  # Optional for refinement
+        "feedback": null,  # Optional for refinement
+        "bypass_cache": false,  # Optional, skip the response cache
+        "timings": false  # Optional, add a per-stage timing breakdown (ms) to metadata
     }
     """
     try:
         # Validate and parse input
         data = request.get_json()
-        if not data or 'profile' not in data:
-            return jsonify({
-                "error": "Invalid request format",
-                "message": "Profile data is required"
-            }), 400
-
-        # Required fields validation
-        required_fields = ['district', 'state', 'land_size', 'crop_type']
-        for field in required_fields:
-            if field not in data['profile'] or not data['profile'][field]:
-                return jsonify({
-                    "error": "Missing required field",
-                    "message": f"{field} is required in profile"
-                }), 400
+        error = validate_request(data)
+        if error:
+            return error
 
         # Prepare initial state
-        initial_state: FarmerState = {
-            "profile": {
-                "village": data['profile'].get('village', ''),
-                "district": data['profile']['district'],
-                "state": data['profile']['state'],
-                "land_size": data['profile']['land_size'],
-                "land_ownership": data['profile'].get('ownership', 'owned').lower(),
-                "crop_type": data['profile']['crop_type'],
-                "irrigation": data['profile'].get('irrigation', 'rain-fed').lower(),
-                "income": data['profile'].get('income', '0'),
-                "caste_category": data['profile'].get('caste_category', 'general').lower(),
-                "bank_account": data['profile'].get('bank_account', 'yes').lower(),
-                "existing_schemes": data['profile'].get('existing_schemes', 'none').lower()
-            },
-            "schemes": [],
-            "recommendations": None,
-            "refinement_needed": False,
-            "feedback": data.get('feedback'),
-            "visuals": []
-        }
+        initial_state = build_initial_state(data)
 
         logger.info(f"Processing request for farmer in {initial_state['profile']['district']}, {initial_state['profile']['state']}")
 
         # Run the workflow
-        result = run_workflow(initial_state)
+        with workflow_gate.slot():
+            result = run_workflow(initial_state)
 
-        # Format the response
-        response = {
-            "status": "success",
-            "data": {
-                "profile": result["profile"],
-                "recommendations": result["recommendations"],
-                "schemes": [
-                    {
-                        "title": doc.metadata.get('title', 'Untitled'),
-                        "summary": doc.page_content[:200] + "..." if len(doc.page_content) > 200 else doc.page_content,
-                        "url": doc.metadata.get('url', ''),
-                        "source": doc.metadata.get('source', 'unknown')
-                    }
-                    for doc in result["schemes"]
-                ],
-                "visuals": result.get("visuals", []),
-                "needs_refinement": result.get("refinement_needed", False)
-            },
-            "metadata": {
-                "farmer_type": result["profile"].get("farmer_type", "unknown"),
-                "needs_insurance": result["profile"].get("needs_insurance", "unknown")
-            }
-        }
-
-        return jsonify(response)
+        return jsonify(format_response(result, include_timings=bool(data.get('timings'))))
 
+    except Overloaded as e:
+        return overloaded_response(e)
     except Exception as e:
         logger.error(f"Error processing request: {str(e)}", exc_info=True)
         return jsonify({
@@ -114,5 +178,192 @@ def get_recommendations():
             "message": "Failed to process request"
         }), 500
 
+@app.route('/api/recommendations/stream', methods=['POST'])
+def stream_recommendations():
+    """
+    Same input as /api/recommendations, answered as a Server-Sent Events stream.
+    Read it with fetch() and a stream reader, since EventSource cannot POST. Events:
+        schemes  - retrieved schemes, sent as soon as web search finishes
+        token    - {"text": ...} chunks of the draft as the LLM generates them
+        draft    - {"refinement_needed": ...} once a draft is complete
+        done     - the full /api/recommendations response body
+        error    - {"error": ..., "message": ...} if the workflow fails midway
+    """
+    data = request.get_json(silent=True)
+    error = validate_request(data)
+    if error:
+        return error
+
+    initial_state = build_initial_state(data)
+    try:
+        workflow_gate.acquire()
+    except Overloaded as e:
+        return overloaded_response(e)
+    logger.info(f"Streaming request for farmer in {initial_state['profile']['district']}, {initial_state['profile']['state']}")
+
+    def generate():
+        try:
+            for event, payload in stream_workflow(initial_state):
+                if event == "schemes":
+                    yield sse_event(event, format_schemes(payload))
+                elif event == "token":
+                    yield sse_event(event, {"text": payload})
+                elif event == "done":
+                    yield sse_event(event, format_response(payload, include_timings=bool(data.get('timings'))))
+                else:
+                    yield sse_event(event, payload)
+        except Exception as e:
+            logger.error(f"Error streaming request: {str(e)}", exc_info=True)
+            yield sse_event("error", {"error": str(e), "message": "Failed to process request"})
+
+    response = Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+    # The slot is held until the stream is closed, even if the client disconnects early.
+    response.call_on_close(workflow_gate.release)
+    return response
+
+@app.route('/api/health', methods=['GET'])
+def health():
+    stats = workflow_gate.stats()
+    return jsonify({"status": "draining" if stats["closed"] else "ok", "workflows": stats, "refine_paths": refine_path_counts()}), 503 if stats["closed"] else 200
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics for this worker process."""
+    return Response(generate_latest(), content_type=CONTENT_TYPE_LATEST)
+
+@app.route('/api/recommendations/batch', methods=['POST'])
+def get_batch_recommendations():
+    """
+    Endpoint for submitting many farmer profiles at once (e.g. from a village camp)
+    Expected JSON input format:
+    {
+        "profiles": [{...same fields as /api/recommendations profile...}, ...],
+        "bypass_cache": false,  # Optional, applies to every profile
+        "timings": false  # Optional, per-stage timing breakdown in each result's metadata
+    }
+    Results come back in input order, each either a success or a per-profile error.
+    """
+    try:
+        data = request.get_json()
+        profiles = data.get('profiles') if isinstance(data, dict) else None
+        if not isinstance(profiles, list) or not profiles:
+            return jsonify({
+                "error": "Invalid request format",
+                "message": "A non-empty profiles list is required"
+            }), 400
+        if len(profiles) > BATCH_MAX_PROFILES:
+            return jsonify({
+                "error": "Batch too large",
+                "message": f"At most {BATCH_MAX_PROFILES} profiles per batch"
+            }), 413
+
+        results = [None] * len(profiles)
+        valid = []
+        for i, profile in enumerate(profiles):
+            error = profile_error(profile)
+            if error:
+                results[i] = {"index": i, "status": "error", "error": error[0], "message": error[1]}
+            else:
+                valid.append(i)
+
+        logger.info(f"Processing batch of {len(profiles)} profiles ({len(valid)} valid)")
+
+        states = [build_initial_state({"profile": profiles[i], "bypass_cache": data.get('bypass_cache', False)}) for i in valid]
+        outcomes = run_batch(states, gate=workflow_gate)
+        rejected = [outcome for outcome in outcomes if isinstance(outcome, Overloaded)]
+        if rejected and len(rejected) == len(outcomes):
+            raise rejected[0]
+
+        for i, outcome in zip(valid, outcomes):
+            if isinstance(outcome, Exception):
+                results[i] = {"index": i, "status": "error", "error": str(outcome), "message": "Failed to process profile"}
+            else:
+                results[i] = {"index": i, **format_response(outcome, include_timings=bool(data.get('timings')))}
+
+        failed = sum(1 for result in results if result["status"] == "error")
+        return jsonify({
+            "status": "success",
+            "results": results,
+            "metadata": {"profiles": len(profiles), "succeeded": len(profiles) - failed, "failed": failed}
+        })
+
+    except Overloaded as e:
+        return overloaded_response(e)
+    except Exception as e:
+        logger.error(f"Error processing batch: {str(e)}", exc_info=True)
+        return jsonify({
+            "status": "error",
+            "error": str(e),
+            "message": "Failed to process batch"
+        }), 500
+
+@app.route('/api/eligibility', methods=['POST'])
+def check_eligibility():
+    """
+    Rule-based eligibility against the scheme catalogue, without any LLM call.
+    Accepts {"profile": {...}} or {"profiles": [{...}, ...]} with the same fields as
+    /api/recommendations; all profiles are checked in one vectorized pass.
+    """
+    data = request.get_json(silent=True)
+    profiles = data.get('profiles', [data.get('profile')]) if isinstance(data, dict) else None
+    if not isinstance(profiles, list) or not profiles:
+        return jsonify({
+            "error": "Invalid request format",
+            "message": "A profile or a non-empty profiles list is required"
+        }), 400
+    if len(profiles) > BATCH_MAX_PROFILES:
+        return jsonify({
+            "error": "Batch too large",
+            "message": f"At most {BATCH_MAX_PROFILES} profiles per request"
+        }), 413
+    for i, profile in enumerate(profiles):
+        error = profile_error(profile)
+        if error:
+            return jsonify({"error": error[0], "message": f"Profile {i}: {error[1]}"}), 400
+
+    analysed = []
+    for profile in profiles:
+        state = build_initial_state({"profile": profile})
+        analysed.append(profile_analysis_node(state)["profile"])
+    eligible, scores = scheme_table.evaluate(analysed)
+
+    results = []
+    for i in range(len(analysed)):
+        order = sorted((j for j in range(len(scheme_table.schemes)) if eligible[i, j]), key=lambda j: -scores[i, j])
+        results.append({
+            "index": i,
+            "schemes": [
+                {key: scheme_table.schemes[j][key] for key in ("title", "url", "desc")}
+                for j in order
+            ]
+        })
+    return jsonify({"status": "success", "results": results})
+
+@app.route('/api/charts/<chart_key>.png', methods=['GET'])
+def get_chart_image(chart_key):
+    """
+    Serve a chart referenced from the "visuals" list of a recommendations response.
+    Chart ids are content hashes, so responses are immutable and carry the id as ETag.
+    """
+    png = get_chart(chart_key)
+    if png is None:
+        return jsonify({
+            "status": "error",
+            "error": "Chart not found",
+            "message": f"No chart with id {chart_key}"
+        }), 404
+
+    response = Response(png, mimetype='image/png')
+    response.set_etag(chart_key)
+    response.cache_control.public = True
+    response.cache_control.max_age = 31536000
+    response.cache_control.immutable = True
+    return response.make_conditional(request)
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=8000, debug=True)
\ No newline at end of file
+    # Development server only; use serve.py in production.
+    app.run(host='0.0.0.0', port=8000, debug=True)
@@ -0,0 +1,218 @@
+"""
+Offline end-to-end benchmark of the recommendation workflows.
+
+Every outside service is replaced with a latency-injecting fake from
+``fakes``: the chat model streams canned markdown at a fixed token rate,
+Tavily and the vector index answer after a fixed delay, and the scheme
+websites are served by a local HTTP server. The fakes are installed with
+``clients.override`` and by pointing ``retrieval.SCHEME_SITES`` at the local
+server, so the workflow code runs unchanged.
+
+Scenarios:
+    single      requests one at a time, caches cleared before each (cold)
+    warm        requests one at a time after one priming run (cache warm)
+    concurrent  all requests at once from ``--concurrency`` threads, cold
+    batch       all requests through ``workflow.run_batch``, cold
+
+Peak RSS is the process high-water mark, so it only grows from one scenario
+to the next; run a single ``--scenario`` to measure one in isolation.
+
+Usage: python bench.py --requests 20 --concurrency 8 --llm-tokens-per-second 100
+"""
+import json
+import time
+import logging
+import argparse
+import resource
+import importlib
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.documents import Document
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SCENARIOS = ["single", "warm", "concurrent", "batch"]
+
+PROFILES = [
+    {"village": "hasdar", "district": "Pune", "state": "Maharashtra", "land_size": "2 hectares", "land_ownership": "owned", "crop_type": "wheat", "irrigation": "rain-fed", "income": "150000", "caste_category": "general", "bank_account": "yes", "existing_schemes": "none"},
+    {"village": "sonpur", "district": "Patna", "state": "Bihar", "land_size": "1 acre", "land_ownership": "leased", "crop_type": "rice", "irrigation": "canal", "income": "60000", "caste_category": "sc", "bank_account": "yes", "existing_schemes": "pm-kisan"},
+    {"village": "kallur", "district": "Raichur", "state": "Karnataka", "land_size": "4 hectares", "land_ownership": "owned", "crop_type": "cotton", "irrigation": "drip", "income": "300000", "caste_category": "obc", "bank_account": "yes", "existing_schemes": "none"},
+    {"village": "nandpur", "district": "Ludhiana", "state": "Punjab", "land_size": "6 acres", "land_ownership": "owned", "crop_type": "wheat", "irrigation": "tube well", "income": "450000", "caste_category": "general", "bank_account": "no", "existing_schemes": "pmfby"}
+]
+
+def initial_state(profile: Dict[str, str], bypass_cache: bool) -> Dict[str, Any]:
+    return {
+        "profile": dict(profile),
+        "schemes": [],
+        "recommendations": None,
+        "refinement_needed": False,
+        "feedback": None,
+        "visuals": [],
+        "bypass_cache": bypass_cache,
+        "cache_hit": False,
+        "draft_valid": False,
+        "eligible_schemes": []
+    }
+
+def scheme_corpus() -> List[Document]:
+    """One passage per catalogue scheme, annotated the way ingestion annotates chunks."""
+    from eligibility import SCHEMES
+    from chunk_metadata import ALL_CROPS, ALL_INDIA
+
+    return [
+        Document(
+            id=f"bench-{i}",
+            page_content=f"{scheme['title']}: {scheme['desc']}. Eligible farmers can apply online at {scheme['url']} with Aadhaar and land records.",
+            metadata={"title": scheme["title"], "url": scheme["url"], "states": [s.title() for s in scheme.get("states", [])] or [ALL_INDIA], "crops": scheme.get("crops") or [ALL_CROPS]}
+        )
+        for i, scheme in enumerate(SCHEMES)
+    ]
+
+def add_fake_arguments(parser: argparse.ArgumentParser) -> None:
+    """The latency and failure knobs of the fakes, as read by ``install_fakes``."""
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Seconds to the first LLM token")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--tavily-latency", type=float, default=0.8)
+    parser.add_argument("--embed-latency", type=float, default=0.1)
+    parser.add_argument("--vector-latency", type=float, default=0.05)
+    parser.add_argument("--scrape-delay", type=float, default=0.3, help="Seconds the local scheme sites take to answer")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Probability that any fake call fails")
+
+def install_fakes(args: argparse.Namespace) -> Any:
+    """Point every client at a fake and the scheme sites at a local server. Returns the started server."""
+    import clients
+    import retrieval
+    from fakes import FakeChatModel, FakeEmbeddings, FakeSchemeSites, FakeTavilyClient, FakeVectorStore, CANNED_RECOMMENDATIONS
+    from embedding_cache import CachedEmbeddings
+    from lexical import BM25Index, HybridRetriever
+    from metrics import LLMMetricsHandler
+
+    response = CANNED_RECOMMENDATIONS
+    if getattr(args, "workflow", "workflow") == "workflow3":
+        # The ReAct agent only stops on a final answer.
+        response = f"Thought: I now know the final answer\nFinal Answer: {CANNED_RECOMMENDATIONS}"
+    clients.override("llm", FakeChatModel(
+        response=response,
+        tokens_per_second=args.llm_tokens_per_second,
+        first_token_latency=args.llm_latency,
+        failure_rate=args.failure_rate,
+        callbacks=[LLMMetricsHandler()]
+    ))
+    clients.override("tavily", retrieval.CachedTavilyClient(FakeTavilyClient(latency=args.tavily_latency, failure_rate=args.failure_rate)))
+
+    embeddings = CachedEmbeddings(FakeEmbeddings(latency=args.embed_latency, failure_rate=args.failure_rate), model="fake")
+    store = FakeVectorStore(embeddings, latency=args.vector_latency, failure_rate=args.failure_rate)
+    corpus = scheme_corpus()
+    store.add_texts([doc.page_content for doc in corpus], [doc.metadata for doc in corpus], [doc.id for doc in corpus])
+    index = BM25Index(records=[{"id": doc.id, "page_content": doc.page_content, "metadata": doc.metadata} for doc in corpus])
+    clients.override("embeddings", embeddings)
+    clients.override("vector_store", store)
+    clients.override("retriever", HybridRetriever(vector_store=store, index=index, k=clients.RETRIEVER_K))
+
+    sites = FakeSchemeSites(delay=args.scrape_delay, failure_rate=args.failure_rate).start()
+    retrieval.SCHEME_SITES[:] = [dict(site, url=sites.url(site["title"])) for site in retrieval.SCHEME_SITES]
+    logger.info("[Bench] Fakes installed, scheme sites served from %s", sites.address)
+    return sites
+
+def clear_caches() -> None:
+    """Empty every in-memory cache, so the next request starts cold. Disk-backed stores are left alone."""
+    from cache import live_caches
+    from retrieval import scrape_cache
+
+    for cache in live_caches():
+        cache.clear()
+    scrape_cache.clear()
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def _timed(run: Callable[[Dict[str, Any]], Any], state: Dict[str, Any]) -> Optional[float]:
+    start = time.perf_counter()
+    try:
+        run(state)
+    except Exception as e:
+        logger.error("[Bench] Request failed: %s", str(e))
+        return None
+    return time.perf_counter() - start
+
+def summarize(name: str, latencies: List[Optional[float]], seconds: float) -> Dict[str, Any]:
+    ok = np.array([t for t in latencies if t is not None], dtype=np.float64)
+    p50, p95, p99 = np.percentile(ok, [50, 95, 99]) if ok.size else (float("nan"),) * 3
+    return {
+        "scenario": name,
+        "requests": len(latencies),
+        "failed": len(latencies) - int(ok.size),
+        "p50": round(float(p50), 3),
+        "p95": round(float(p95), 3),
+        "p99": round(float(p99), 3),
+        "requests_per_second": round(len(latencies) / seconds, 2) if seconds else 0.0,
+        "seconds": round(seconds, 2),
+        "peak_rss_mb": round(peak_rss_mb(), 1)
+    }
+
+def run_scenario(name: str, workflow: Any, profiles: List[Dict[str, str]], concurrency: int) -> Dict[str, Any]:
+    clear_caches()
+    cold = name != "warm"
+    states = [initial_state(profile, bypass_cache=cold) for profile in profiles]
+    logger.info("[Bench] Scenario %s: %d requests", name, len(states))
+
+    if name == "warm":
+        for state in {s["profile"]["state"]: s for s in states}.values():
+            _timed(workflow.run_workflow, dict(state))
+
+    start = time.perf_counter()
+    if name in ("single", "warm"):
+        latencies = []
+        for state in states:
+            if cold:
+                clear_caches()
+            latencies.append(_timed(workflow.run_workflow, state))
+    elif name == "concurrent":
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="bench") as executor:
+            latencies = list(executor.map(lambda state: _timed(workflow.run_workflow, state), states))
+    else:
+        outcomes = workflow.run_batch(states, parallelism=concurrency)
+        # run_batch shares retrieval across profiles, so only the batch as a whole has a latency.
+        elapsed = time.perf_counter() - start
+        latencies = [None if isinstance(outcome, Exception) else elapsed for outcome in outcomes]
+    return summarize(name, latencies, time.perf_counter() - start)
+
+def run_benchmark(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    sites = install_fakes(args)
+    try:
+        workflow = importlib.import_module(args.workflow)
+        profiles = [PROFILES[i % len(PROFILES)] for i in range(args.requests)]
+        results = []
+        for name in args.scenario or SCENARIOS:
+            if name == "batch" and not hasattr(workflow, "run_batch"):
+                logger.warning("[Bench] %s has no run_batch, skipping the batch scenario", args.workflow)
+                continue
+            results.append(run_scenario(name, workflow, profiles, args.concurrency))
+        return results
+    finally:
+        sites.stop()
+
+def print_table(results: List[Dict[str, Any]]) -> None:
+    print(f"{'scenario':<12}{'requests':>9}{'failed':>8}{'p50 s':>9}{'p95 s':>9}{'p99 s':>9}{'req/s':>9}{'RSS MB':>9}")
+    for r in results:
+        print(f"{r['scenario']:<12}{r['requests']:>9}{r['failed']:>8}{r['p50']:>9.3f}{r['p95']:>9.3f}{r['p99']:>9.3f}{r['requests_per_second']:>9.2f}{r['peak_rss_mb']:>9.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the FarmWise workflows offline against latency-injecting fakes.")
+    parser.add_argument("--workflow", choices=["workflow", "workflow2", "workflow3"], default="workflow")
+    parser.add_argument("--scenario", choices=SCENARIOS, action="append", help="Run only this scenario (repeatable)")
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=8)
+    add_fake_arguments(parser)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format="%(asctime)s [%(levelname)s] [%(name)s] - %(message)s")
+    results = run_benchmark(args)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_table(results)
@@ -0,0 +1,47 @@
+import os
+import time
+import logging
+from typing import Any, Dict, Mapping
+
+logger = logging.getLogger(__name__)
+
+# Wall-clock budget for one request, from the moment its state is created to
+# the final answer, and the most LLM calls (drafts plus refinements) it may make.
+REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE", "30"))
+MAX_LLM_CALLS = int(os.getenv("MAX_LLM_CALLS", "4"))
+# Time kept back for generation when retrieval is sized, and the least time
+# left in which another LLM call is still worth starting.
+GENERATION_RESERVE = float(os.getenv("GENERATION_RESERVE", "12"))
+MIN_LLM_TIME = float(os.getenv("MIN_LLM_TIME", "5"))
+
+def new_budget(deadline: float = REQUEST_DEADLINE, max_llm_calls: int = MAX_LLM_CALLS) -> Dict[str, Any]:
+    """State fields that start a request's budget now."""
+    return {"deadline": time.time() + deadline, "llm_calls": 0, "max_llm_calls": max_llm_calls}
+
+def with_budget(state: Mapping[str, Any]) -> Dict[str, Any]:
+    """Copy of ``state`` with a fresh budget filled in wherever it has none."""
+    filled = dict(state)
+    for key, value in new_budget().items():
+        if filled.get(key) is None:
+            filled[key] = value
+    return filled
+
+def time_left(state: Mapping[str, Any]) -> float:
+    deadline = state.get("deadline")
+    return float("inf") if deadline is None else deadline - time.time()
+
+def llm_calls_left(state: Mapping[str, Any]) -> int:
+    return state.get("max_llm_calls", MAX_LLM_CALLS) - state.get("llm_calls", 0)
+
+def can_call_llm(state: Mapping[str, Any]) -> bool:
+    if llm_calls_left(state) <= 0:
+        logger.warning("[Budget] LLM call budget of %d spent", state.get("max_llm_calls", MAX_LLM_CALLS))
+        return False
+    if time_left(state) < MIN_LLM_TIME:
+        logger.warning("[Budget] %.1fs left, not starting another LLM call", time_left(state))
+        return False
+    return True
+
+def retrieval_window(state: Mapping[str, Any], limit: float) -> float:
+    """Seconds retrieval may take: ``limit``, less whatever generation still needs."""
+    return max(0.0, min(limit, time_left(state) - GENERATION_RESERVE))
@@ -0,0 +1,281 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Every LRUCache and StaleWhileRevalidateCache in the process, so their counters can be exported (see metrics.py).
+_caches: "weakref.WeakSet[Any]" = weakref.WeakSet()
+
+def live_caches() -> List[Any]:
+    return list(_caches)
+
+class DiskStore:
+    """SQLite-backed key/value table that every worker process on the host can share."""
+
+    def __init__(self, path: str, table: str = "cache"):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value BLOB NOT NULL, stored_at REAL NOT NULL)"
+            )
+
+    def get(self, key: str) -> Optional[Tuple[bytes, float]]:
+        with self._lock:
+            row = self._conn.execute(f"SELECT value, stored_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+        return (bytes(row[0]), row[1]) if row else None
+
+    def set(self, key: str, value: bytes, stored_at: Optional[float] = None) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, stored_at) VALUES (?, ?, ?)",
+                (key, value, stored_at if stored_at is not None else time.time())
+            )
+
+    def delete(self, key: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def prune(self, max_entries: int) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key NOT IN (SELECT key FROM {self.table} ORDER BY stored_at DESC LIMIT ?)",
+                (max_entries,)
+            )
+
+class LRUCache:
+    """Thread-safe LRU cache with a TTL, hit/miss counters and an optional shared disk tier.
+
+    Values must be JSON-serializable when a ``DiskStore`` is attached. The disk tier
+    is consulted on a memory miss and pruned to ``max_entries`` every
+    ``prune_every`` writes.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600, store: Optional[DiskStore] = None, name: str = "cache", prune_every: int = 100):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.store = store
+        self.name = name
+        self.prune_every = prune_every
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._writes = 0
+        self._entries: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        _caches.add(self)
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[1] <= self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+
+        entry = self._load_from_disk(key)
+        with self._lock:
+            if entry is None or now - entry[1] > self.ttl:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._insert(key, entry)
+        return entry[0]
+
+    def put(self, key: str, value: Any) -> None:
+        stored_at = time.time()
+        with self._lock:
+            self._insert(key, (value, stored_at))
+            self._writes += 1
+            prune = self._writes % self.prune_every == 0
+        if self.store is None:
+            return
+        try:
+            self.store.set(key, json.dumps(value).encode("utf-8"), stored_at)
+            if prune:
+                self.store.prune(self.max_entries)
+        except Exception as e:
+            logger.warning("[Cache:%s] Could not persist %s: %s", self.name, key, str(e))
+
+    def get_or_load(self, key: str, loader: Callable[[], Any]) -> Any:
+        value = self.get(key)
+        if value is None:
+            value = loader()
+            self.put(key, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "name": self.name,
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0
+            }
+
+    def _insert(self, key: str, entry: Tuple[Any, float]) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _load_from_disk(self, key: str) -> Optional[Tuple[Any, float]]:
+        if self.store is None:
+            return None
+        try:
+            row = self.store.get(key)
+        except Exception as e:
+            logger.warning("[Cache:%s] Could not read %s from disk: %s", self.name, key, str(e))
+            return None
+        return (json.loads(row[0].decode("utf-8")), row[1]) if row else None
+
+class StaleWhileRevalidateCache:
+    """Process-wide cache that serves stale values while a background refresh runs.
+
+    Values younger than ``ttl`` are served as-is. Older values are still served,
+    and a single refresh per key is scheduled in the background; only values older
+    than ``max_stale`` (or missing ones) are loaded on the caller's thread. When a
+    ``DiskStore`` is given, values are persisted as JSON so a restarted worker
+    starts warm. Stale values served count as hits and, separately, as ``stale``.
+    """
+
+    def __init__(self, ttl: float, max_stale: float = 7 * 24 * 3600, store: Optional[DiskStore] = None, name: str = "cache"):
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.store = store
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+        self._entries: Dict[str, Tuple[Any, float]] = {}
+        self._refreshing: Set[str] = set()
+        self._lock = threading.Lock()
+        self._refresher = ThreadPoolExecutor(max_workers=2, thread_name_prefix=f"{name}-refresh")
+        _caches.add(self)
+
+    def get(self, key: str, loader: Callable[[], Any]) -> Any:
+        entry = self._lookup(key)
+        if entry is None:
+            logger.info("[Cache:%s] Miss for %s", self.name, key)
+            self._count("misses")
+            return self._load(key, loader)
+
+        value, stored_at = entry
+        age = time.time() - stored_at
+        if age <= self.ttl:
+            self._count("hits")
+            return value
+        if age > self.max_stale:
+            logger.info("[Cache:%s] Entry for %s is %.0fs old, reloading", self.name, key, age)
+            try:
+                value = self._load(key, loader)
+                self._count("misses")
+                return value
+            except Exception as e:
+                logger.warning("[Cache:%s] Reload of %s failed, serving stale value: %s", self.name, key, str(e))
+                self._count("hits", "stale")
+                return value
+
+        with self._lock:
+            self.hits += 1
+            self.stale += 1
+            schedule = key not in self._refreshing
+            self._refreshing.add(key)
+        if schedule:
+            logger.info("[Cache:%s] Serving stale %s, refreshing in background", self.name, key)
+            self._refresher.submit(self._refresh, key, loader)
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        stored_at = time.time()
+        with self._lock:
+            self._entries[key] = (value, stored_at)
+        if self.store is not None:
+            try:
+                self.store.set(key, json.dumps(value).encode("utf-8"), stored_at)
+            except Exception as e:
+                logger.warning("[Cache:%s] Could not persist %s: %s", self.name, key, str(e))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "name": self.name,
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": 0,
+                "stale": self.stale,
+                "refreshes": self.refreshes,
+                "refresh_failures": self.refresh_failures,
+                "hit_rate": self.hits / total if total else 0.0
+            }
+
+    def _count(self, *counters: str) -> None:
+        with self._lock:
+            for counter in counters:
+                setattr(self, counter, getattr(self, counter) + 1)
+
+    def _lookup(self, key: str) -> Optional[Tuple[Any, float]]:
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None or self.store is None:
+            return entry
+        try:
+            row = self.store.get(key)
+        except Exception as e:
+            logger.warning("[Cache:%s] Could not read %s from disk: %s", self.name, key, str(e))
+            return None
+        if row is None:
+            return None
+        entry = (json.loads(row[0].decode("utf-8")), row[1])
+        with self._lock:
+            self._entries[key] = entry
+        return entry
+
+    def _load(self, key: str, loader: Callable[[], Any]) -> Any:
+        value = loader()
+        self.put(key, value)
+        return value
+
+    def _refresh(self, key: str, loader: Callable[[], Any]) -> None:
+        try:
+            self._load(key, loader)
+            self._count("refreshes")
+            logger.info("[Cache:%s] Refreshed %s", self.name, key)
+        except Exception as e:
+            self._count("refresh_failures")
+            logger.warning("[Cache:%s] Background refresh of %s failed: %s", self.name, key, str(e))
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
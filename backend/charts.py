@@ -0,0 +1,73 @@
+import io
+import json
+import base64
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SUBSIDY_BREAKDOWN = {
+    "kind": "pie",
+    "title": "Estimated Subsidy Contribution",
+    "labels": ["PM-KISAN", "PMFBY", "Maha DBT", "SMAM"],
+    "values": [40, 25, 20, 15]
+}
+
+_specs: Dict[str, Dict[str, Any]] = {}
+_rendered: Dict[str, bytes] = {}
+_lock = threading.Lock()
+
+def chart_id(spec: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+def register_chart(spec: Dict[str, Any]) -> str:
+    """Register ``spec`` and return its content-hash id. Rendering is deferred to ``get_chart``."""
+    key = chart_id(spec)
+    with _lock:
+        _specs.setdefault(key, spec)
+    return key
+
+def _render_png(spec: Dict[str, Any]) -> bytes:
+    # pyplot is only imported the first time a chart is actually drawn, and
+    # always on the non-interactive Agg backend so it is safe in worker threads.
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    if spec["kind"] != "pie":
+        raise ValueError(f"Unsupported chart kind: {spec['kind']}")
+    fig, ax = plt.subplots(figsize=(6, 4))
+    try:
+        ax.pie(spec["values"], labels=spec["labels"], autopct="%1.1f%%")
+        ax.set_title(spec.get("title", ""))
+        buf = io.BytesIO()
+        fig.savefig(buf, format="png")
+        return buf.getvalue()
+    finally:
+        plt.close(fig)
+
+def get_chart(key: str) -> Optional[bytes]:
+    """Return the PNG for a registered chart, rendering it once per process."""
+    with _lock:
+        png = _rendered.get(key)
+        spec = _specs.get(key)
+    if png is not None or spec is None:
+        return png
+    png = _render_png(spec)
+    with _lock:
+        png = _rendered.setdefault(key, png)
+    logger.info("[Charts] Rendered chart %s (%d bytes)", key, len(png))
+    return png
+
+def chart_base64(key: str) -> Optional[str]:
+    png = get_chart(key)
+    return base64.b64encode(png).decode("utf-8") if png is not None else None
+
+def subsidy_charts() -> List[str]:
+    return [register_chart(SUBSIDY_BREAKDOWN)]
+
+# Registered at import so chart ids coming back from the response cache resolve
+# in a freshly started worker.
+register_chart(SUBSIDY_BREAKDOWN)
@@ -0,0 +1,166 @@
+"""
+Structured metadata for ingested chunks.
+
+``scan_document`` reads a document's opening pages for what applies to the
+whole document; ``annotate_chunks`` then fills in, chunk by chunk as they
+stream past, the scheme title, the states and crops it applies to and a
+source URL, next to the page range the splitter already records. Extraction
+is deterministic (gazetteers and patterns); with EXTRACT_METADATA_WITH_LLM=1
+an LLM is asked about chunks whose scheme the patterns could not name.
+
+A chunk's states come from the chunk text, then the catalogue entry of the
+scheme it names, then its document; failing all three it is ALL_INDIA, so
+``profile_filter`` can select "this state or nationwide" with one ``$in``
+clause that Pinecone, LocalVectorStore and BM25Index all evaluate. Chunks
+indexed before a field existed lack it; ``METADATA_VERSION`` is part of
+every chunk id, so bumping it makes the next sync re-annotate and re-upsert
+them, and until then the filter lets chunks without ``states`` through.
+"""
+import os
+import re
+import json
+import logging
+from collections import Counter
+from langchain_core.documents import Document
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Set, Tuple
+from eligibility import SCHEMES, normalize
+
+logger = logging.getLogger(__name__)
+
+EXTRACT_WITH_LLM = os.getenv("EXTRACT_METADATA_WITH_LLM", "0") == "1"
+
+ALL_INDIA = "all-India"
+ALL_CROPS = "all"
+# A document naming more states than this is treated as nationwide.
+MAX_DOCUMENT_STATES = 3
+# Part of every chunk id (see ingest.chunk_id): bump it whenever the fields
+# written here change, so the next sync replaces chunks annotated the old way.
+METADATA_VERSION = 1
+# How much of the start of a document is searched for the scheme it is about.
+SCHEME_SCAN_CHARS = 5000
+
+STATES = [
+    "Andhra Pradesh", "Arunachal Pradesh", "Assam", "Bihar", "Chhattisgarh", "Goa", "Gujarat", "Haryana",
+    "Himachal Pradesh", "Jharkhand", "Karnataka", "Kerala", "Madhya Pradesh", "Maharashtra", "Manipur",
+    "Meghalaya", "Mizoram", "Nagaland", "Odisha", "Punjab", "Rajasthan", "Sikkim", "Tamil Nadu", "Telangana",
+    "Tripura", "Uttar Pradesh", "Uttarakhand", "West Bengal", "Andaman and Nicobar Islands", "Chandigarh",
+    "Dadra and Nagar Haveli and Daman and Diu", "Delhi", "Jammu and Kashmir", "Ladakh", "Lakshadweep", "Puducherry"
+]
+STATE_ALIASES = {"orissa": "Odisha", "uttaranchal": "Uttarakhand", "pondicherry": "Puducherry", "nct of delhi": "Delhi", "j&k": "Jammu and Kashmir"}
+CROPS = [
+    "rice", "paddy", "wheat", "maize", "jowar", "bajra", "ragi", "millets", "pulses", "gram", "tur", "moong", "urad",
+    "soybean", "groundnut", "mustard", "sunflower", "cotton", "sugarcane", "jute", "tea", "coffee", "rubber",
+    "coconut", "arecanut", "banana", "mango", "grapes", "pomegranate", "onion", "potato", "tomato", "vegetables",
+    "fruits", "spices", "horticulture"
+]
+
+_STATE_RE = re.compile(r"\b(" + "|".join(re.escape(s.lower()) for s in sorted(list(STATE_ALIASES) + [s for s in STATES], key=len, reverse=True)) + r")\b", re.IGNORECASE)
+_CROP_RE = re.compile(r"\b(" + "|".join(CROPS) + r")\b", re.IGNORECASE)
+_URL_RE = re.compile(r"https?://[^\s)\]>\"']*[^\s)\]>\"'.,;:]")
+_SCHEME_NAME_RE = re.compile(r"\b((?:[A-Z][\w.'-]*\s+){1,6}(?:Yojana|Yojna|Scheme|Mission|Abhiyan|Programme|Program))\b")
+_STATE_BY_NAME = {**{s.lower(): s for s in STATES}, **STATE_ALIASES}
+_CATALOGUE_ALIASES = [(normalize(alias), scheme) for scheme in SCHEMES for alias in scheme.get("aliases", []) + [scheme["title"]]]
+
+def find_states(text: str) -> List[str]:
+    return sorted({_STATE_BY_NAME[m.lower()] for m in _STATE_RE.findall(text)})
+
+def find_crops(text: str) -> List[str]:
+    return sorted({m.lower() for m in _CROP_RE.findall(text)})
+
+def find_scheme(text: str) -> Optional[Dict[str, str]]:
+    """The scheme a passage is about: a catalogue scheme if one is named, else a "... Yojana"-style name."""
+    normalized = f" {normalize(text)} "
+    counts = Counter(scheme["title"] for alias, scheme in _CATALOGUE_ALIASES if f" {alias} " in normalized)
+    if counts:
+        title = counts.most_common(1)[0][0]
+        scheme = next(s for s in SCHEMES if s["title"] == title)
+        # Catalogue schemes without a state rule are nationwide.
+        states = [_STATE_BY_NAME.get(state, state) for state in scheme.get("states", [])] or [ALL_INDIA]
+        return {"title": title, "url": scheme["url"], "states": states}
+    match = _SCHEME_NAME_RE.search(text)
+    return {"title": match.group(1).strip()} if match else None
+
+def _llm_metadata(text: str) -> Dict[str, Any]:
+    from clients import get_llm
+
+    prompt = (
+        "From this passage of an Indian agricultural scheme document, return JSON with keys "
+        "\"title\" (the scheme name, or null), \"states\" (list of Indian states it applies to, empty if nationwide) "
+        "and \"crops\" (list, empty if any crop). Return only the JSON.\n\n" + text[:4000]
+    )
+    reply = get_llm().invoke(prompt).content
+    match = re.search(r"\{.*\}", reply, re.DOTALL)
+    return json.loads(match.group(0)) if match else {}
+
+def scan_document(pages: Iterable[Tuple[int, str]], source: str) -> Dict[str, Any]:
+    """Document-level metadata from the given (opening) pages: the states, scheme and URL the whole document is about."""
+    states: Set[str] = set()
+    head: List[str] = []
+    head_length = 0
+    first_url = gov_url = ""
+    for _, text in pages:
+        states.update(find_states(text))
+        if head_length < SCHEME_SCAN_CHARS:
+            head.append(text)
+            head_length += len(text) + 1
+        if not gov_url:
+            for url in _URL_RE.findall(text):
+                first_url = first_url or url
+                if ".gov.in" in url or ".nic.in" in url:
+                    gov_url = url
+                    break
+    return {
+        "source": source,
+        "states": sorted(states) if len(states) <= MAX_DOCUMENT_STATES else [],
+        "scheme": find_scheme("\n".join(head)[:SCHEME_SCAN_CHARS]) or {},
+        "url": gov_url or first_url,
+        "fallback_title": os.path.splitext(os.path.basename(source))[0].replace("_", " ")
+    }
+
+def annotate_chunk(chunk: Document, document: Dict[str, Any], use_llm: bool = EXTRACT_WITH_LLM) -> bool:
+    """Add title, states, crops and url metadata to one chunk, in place. Returns whether the chunk names a scheme."""
+    text = chunk.page_content
+    scheme = find_scheme(text)
+    states = find_states(text) or (scheme or {}).get("states") or document["states"]
+    crops = find_crops(text)
+    if scheme is None and use_llm:
+        try:
+            extracted = _llm_metadata(text)
+            if extracted.get("title"):
+                scheme = {"title": str(extracted["title"])}
+            states = [_STATE_BY_NAME.get(str(s).lower(), str(s)) for s in extracted.get("states") or []] or states
+            crops = [str(c).lower() for c in extracted.get("crops") or []] or crops
+        except Exception as e:
+            logger.warning("[Metadata] LLM extraction failed for a chunk of %s: %s", document["source"], str(e))
+    named = scheme is not None
+    if not named:
+        scheme = dict(document["scheme"], url=document["scheme"].get("url") or document["url"])
+    urls = _URL_RE.findall(text)
+    chunk.metadata.update({
+        "title": scheme.get("title") or document["fallback_title"],
+        "states": states or [ALL_INDIA],
+        "crops": crops or [ALL_CROPS],
+        "url": urls[0] if urls else scheme.get("url") or "unknown"
+    })
+    return named
+
+def annotate_chunks(chunks: Iterable[Document], document: Dict[str, Any], use_llm: bool = EXTRACT_WITH_LLM) -> Iterator[Document]:
+    """Annotate a stream of chunks of one document as they pass through."""
+    count = unnamed = 0
+    for chunk in chunks:
+        count += 1
+        if not annotate_chunk(chunk, document, use_llm):
+            unnamed += 1
+        yield chunk
+    logger.info("[Metadata] Annotated %d chunks of %s (document states: %s, %d chunks without a named scheme)", count, document["source"], document["states"] or ALL_INDIA, unnamed)
+
+def profile_filter(profile: Mapping[str, Any]) -> Optional[Dict[str, Any]]:
+    """Metadata filter selecting chunks for the profile's state or for all of India.
+
+    Chunks without a ``states`` field predate metadata extraction and could be
+    about any state, so they are kept rather than silently filtered out.
+    """
+    state = _STATE_BY_NAME.get(str(profile.get("state", "")).strip().lower())
+    if not state:
+        return None
+    return {"$or": [{"states": {"$in": [state, ALL_INDIA]}}, {"states": {"$exists": False}}]}
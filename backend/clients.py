@@ -0,0 +1,144 @@
+"""
+Process-wide API clients, built on first use.
+
+Importing a workflow module no longer constructs any client or touches the
+network. Each getter builds its client once per process (SDK imports
+included) and returns the same instance afterwards. ``warm_up`` builds them
+all up front, e.g. in a server worker after fork. ``override`` swaps in a
+stand-in, such as the fakes in fakes.py.
+"""
+import os
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable
+
+logger = logging.getLogger(__name__)
+
+LLM_MODEL = os.getenv("LLM_MODEL", "gemini-1.5-flash")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "embed-english-v3.0")
+INDEX_NAME = os.getenv("PINECONE_INDEX_NAME", "farmwise-ai")
+RETRIEVER_K = int(os.getenv("RETRIEVER_K", "4"))
+# Set to a LangChain hub handle (e.g. "hwchase17/react") to pull the ReAct
+# prompt from the hub instead of using REACT_TEMPLATE.
+REACT_PROMPT_HUB = os.getenv("REACT_PROMPT_HUB", "")
+
+# The hwchase17/react prompt, vendored so agent start-up needs no network.
+REACT_TEMPLATE = """Answer the following questions as best you can. You have access to the following tools:
+
+{tools}
+
+Use the following format:
+
+Question: the input question you must answer
+Thought: you should always think about what to do
+Action: the action to take, should be one of [{tool_names}]
+Action Input: the input to the action
+Observation: the result of the action
+... (this Thought/Action/Action Input/Observation can repeat N times)
+Thought: I now know the final answer
+Final Answer: the final answer to the original input question
+
+Begin!
+
+Question: {input}
+Thought:{agent_scratchpad}"""
+
+_instances: Dict[str, Any] = {}
+# Reentrant: the vector store factory asks for the embeddings.
+_lock = threading.RLock()
+
+def _singleton(name: str, factory: Callable[[], Any]) -> Any:
+    instance = _instances.get(name)
+    if instance is not None:
+        return instance
+    with _lock:
+        if name not in _instances:
+            logger.info("[Clients] Initializing %s", name)
+            _instances[name] = factory()
+        return _instances[name]
+
+def _build_llm() -> Any:
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    from metrics import LLMMetricsHandler
+    return ChatGoogleGenerativeAI(model=LLM_MODEL, api_key=os.getenv("GOOGLE_API_KEY"), callbacks=[LLMMetricsHandler()])
+
+def _build_tavily() -> Any:
+    from tavily import TavilyClient
+    from retrieval import CachedTavilyClient
+    return CachedTavilyClient(TavilyClient(api_key=os.getenv("TAVILY_API_KEY")))
+
+def _build_embeddings() -> Any:
+    from langchain_cohere import CohereEmbeddings
+    from embedding_cache import CachedEmbeddings
+    return CachedEmbeddings(
+        CohereEmbeddings(cohere_api_key=os.getenv("COHERE_API_KEY"), model=EMBEDDING_MODEL),
+        model=EMBEDDING_MODEL
+    )
+
+def _build_vector_store() -> Any:
+    from vectorstore import load_vector_store
+    return load_vector_store(get_embeddings(), index_name=INDEX_NAME)
+
+def _build_retriever() -> Any:
+    from lexical import BM25_INDEX_PATH, BM25Index, HybridRetriever
+    return HybridRetriever(vector_store=get_vector_store(), index=BM25Index.load(BM25_INDEX_PATH), k=RETRIEVER_K)
+
+def _build_react_prompt() -> Any:
+    from langchain_core.prompts import PromptTemplate
+    if REACT_PROMPT_HUB:
+        try:
+            from langchain import hub
+            return hub.pull(REACT_PROMPT_HUB)
+        except Exception as e:
+            logger.warning("[Clients] Could not pull %s from the hub, using the vendored prompt: %s", REACT_PROMPT_HUB, str(e))
+    return PromptTemplate.from_template(REACT_TEMPLATE)
+
+_FACTORIES: Dict[str, Callable[[], Any]] = {
+    "llm": _build_llm,
+    "tavily": _build_tavily,
+    "embeddings": _build_embeddings,
+    "vector_store": _build_vector_store,
+    "retriever": _build_retriever,
+    "react_prompt": _build_react_prompt
+}
+
+def get_llm() -> Any:
+    return _singleton("llm", _build_llm)
+
+def get_tavily() -> Any:
+    return _singleton("tavily", _build_tavily)
+
+def get_embeddings() -> Any:
+    return _singleton("embeddings", _build_embeddings)
+
+def get_vector_store() -> Any:
+    return _singleton("vector_store", _build_vector_store)
+
+def get_retriever() -> Any:
+    return _singleton("retriever", _build_retriever)
+
+def get_react_prompt() -> Any:
+    return _singleton("react_prompt", _build_react_prompt)
+
+def override(name: str, instance: Any) -> None:
+    """Use ``instance`` as the ``name`` client from now on in this process."""
+    if name not in _FACTORIES:
+        raise ValueError(f"Unknown client: {name}")
+    with _lock:
+        _instances[name] = instance
+
+def reset() -> None:
+    with _lock:
+        _instances.clear()
+
+def warm_up(names: Iterable[str] = ("llm", "tavily")) -> None:
+    """Build the given clients now instead of on the first request.
+
+    Failures are logged, not raised, so a missing key for one backend does not
+    stop the worker; that client is retried on first use.
+    """
+    for name in names:
+        try:
+            _singleton(name, _FACTORIES[name])
+        except Exception as e:
+            logger.error("[Clients] Warm-up of %s failed: %s", name, str(e))
@@ -0,0 +1,197 @@
+"""
+Packs retrieved scheme documents into a bounded prompt context.
+
+``pack_context`` strips navigation boilerplate (lines matching menu and footer
+patterns, and short lines repeated across the retrieved pages as a site's menu
+is), drops near-duplicate passages (MinHash over word shingles), orders what
+is left by maximal marginal relevance to the farmer profile and fills
+CONTEXT_TOKEN_BUDGET, trimming the last passage to fit. Token counts are
+estimated at CHARS_PER_TOKEN characters per token; no tokenizer for the Gemini
+models ships with the SDK.
+"""
+import os
+import re
+import zlib
+import logging
+import numpy as np
+from collections import Counter
+from dataclasses import dataclass, field
+from langchain_core.documents import Document
+from typing import Any, Collection, Dict, Iterable, Iterator, List, Mapping, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))
+DUPLICATE_THRESHOLD = float(os.getenv("CONTEXT_DUPLICATE_THRESHOLD", "0.7"))
+CHARS_PER_TOKEN = 4
+SHINGLE_SIZE = 4
+NUM_HASHES = 64
+MIN_PASSAGE_TOKENS = 40  # A trimmed passage shorter than this is not worth including
+ELIGIBLE_BOOST = 0.2
+SHORT_LINE_WORDS = 3  # Lines this short are navigation when several pages share them
+
+BOILERPLATE_RE = re.compile(
+    r"^(skip to (main )?content|home|menu|login|log in|sign in|sign up|register|search|contact us|about us|"
+    r"sitemap|faq|help|screen reader access|accessibility|a\+?|a-|english|हिन्दी|hindi|close|back to top|"
+    r"copyright.*|©.*|all rights reserved.*|last updated.*|visitors?:?.*|website (policies|policy).*|"
+    r"privacy policy|terms (of use|and conditions|& conditions)|disclaimer|hyperlink policy|feedback|print|share|"
+    r"read more|more|next|previous|prev|go to top|top|gallery|photo gallery|media|what'?s new|rti|"
+    r"tenders?|careers?|important links|related links|quick links|useful links|follow us|subscribe)$",
+    re.IGNORECASE
+)
+WORD_RE = re.compile(r"[a-z0-9₹]+")
+
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(0)
+_HASH_A = _rng.integers(1, _PRIME, NUM_HASHES, dtype=np.uint64)
+_HASH_B = _rng.integers(0, _PRIME, NUM_HASHES, dtype=np.uint64)
+
+@dataclass
+class PackedContext:
+    text: str
+    documents: List[Document]
+    stats: Dict[str, int] = field(default_factory=dict)
+
+def estimate_tokens(text: str) -> int:
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+def _lines(text: str) -> Iterator[str]:
+    for line in text.splitlines():
+        line = re.sub(r"\s+", " ", line).strip()
+        if line:
+            yield line
+
+def _is_short(line: str) -> bool:
+    # Headings such as "Eligibility:" are short too, but introduce what follows.
+    return len(line.split()) <= SHORT_LINE_WORDS and not line.endswith(":")
+
+def repeated_lines(texts: Iterable[str]) -> Set[str]:
+    """Short lines (lowercased) that appear in more than one of ``texts``, like a site's menu."""
+    counts = Counter(line for text in texts for line in {line.lower() for line in _lines(text) if _is_short(line)})
+    return {line for line, count in counts.items() if count > 1}
+
+def strip_boilerplate(text: str, repeated: Collection[str] = frozenset()) -> str:
+    """Drop menu/footer lines and collapse the blank lines scraped pages are full of.
+
+    A line is dropped when it matches a known navigation or footer pattern, or
+    when it is short and in ``repeated`` (see ``repeated_lines``).
+    """
+    return " ".join(
+        line for line in _lines(text)
+        if not BOILERPLATE_RE.match(line) and not (_is_short(line) and line.lower() in repeated)
+    )
+
+def words(text: str) -> List[str]:
+    return WORD_RE.findall(text.lower())
+
+def minhash(text: str) -> np.ndarray:
+    tokens = words(text)
+    shingles = {" ".join(tokens[i:i + SHINGLE_SIZE]) for i in range(max(1, len(tokens) - SHINGLE_SIZE + 1))}
+    hashes = np.array([zlib.crc32(s.encode("utf-8")) % _PRIME for s in shingles], dtype=np.uint64)
+    # (a * h + b) mod p for every hash function and shingle. a and b range over the whole field, so
+    # a * h wraps p many times and each function permutes the shingles; a, h < 2**31 keep it in uint64.
+    return ((np.outer(_HASH_A, hashes) + _HASH_B[:, None]) % np.uint64(_PRIME)).min(axis=1)
+
+def dedupe(documents: List[Document], threshold: float = DUPLICATE_THRESHOLD) -> List[Document]:
+    """Keep the first of every group of documents whose estimated Jaccard similarity exceeds ``threshold``."""
+    if len(documents) < 2:
+        return documents
+    signatures = np.stack([minhash(doc.page_content) for doc in documents])
+    similarity = (signatures[:, None, :] == signatures[None, :, :]).mean(axis=2)
+    kept: List[int] = []
+    for i in range(len(documents)):
+        if all(similarity[i, j] < threshold for j in kept):
+            kept.append(i)
+    return [documents[i] for i in kept]
+
+def _term_vectors(texts: List[str]) -> np.ndarray:
+    counts = [Counter(words(text)) for text in texts]
+    vocab = {term: i for i, term in enumerate(sorted(set().union(*counts)))}
+    matrix = np.zeros((len(texts), max(1, len(vocab))), dtype=np.float64)
+    for row, counter in enumerate(counts):
+        for term, count in counter.items():
+            matrix[row, vocab[term]] = 1 + np.log(count)
+    # Inverse document frequency over the candidates, so words every passage shares count for little.
+    df = (matrix[1:] > 0).sum(axis=0)
+    matrix *= np.log((1 + len(texts)) / (1 + df)) + 1
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+def mmr_order(query: str, documents: List[Document], boosts: Optional[Iterable[float]] = None, lambda_: float = MMR_LAMBDA) -> List[int]:
+    """Indices of ``documents`` in maximal-marginal-relevance order for ``query``."""
+    vectors = _term_vectors([query] + [doc.page_content for doc in documents])
+    relevance = vectors[1:] @ vectors[0]
+    if boosts is not None:
+        relevance = relevance + np.fromiter(boosts, dtype=np.float64, count=len(documents))
+    overlap = vectors[1:] @ vectors[1:].T
+    order: List[int] = []
+    remaining = list(range(len(documents)))
+    while remaining:
+        redundancy = overlap[np.ix_(remaining, order)].max(axis=1) if order else np.zeros(len(remaining))
+        best = remaining[int(np.argmax(lambda_ * relevance[remaining] - (1 - lambda_) * redundancy))]
+        order.append(best)
+        remaining.remove(best)
+    return order
+
+def _trim(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    end = max(cut.rfind(". "), cut.rfind("। "))
+    return cut[:end + 1] if end > max_chars // 2 else cut.rsplit(" ", 1)[0] + "…"
+
+def format_passage(doc: Document) -> str:
+    return f"{doc.metadata.get('title', 'Untitled')}: {doc.page_content}"
+
+def pack_context(
+    profile: Mapping[str, Any],
+    documents: List[Document],
+    budget: int = CONTEXT_TOKEN_BUDGET,
+    eligible: Iterable[str] = ()
+) -> PackedContext:
+    """Select and trim ``documents`` so that their prompt text fits in ``budget`` tokens.
+
+    Passages about schemes in ``eligible`` get a relevance boost. The returned
+    ``stats`` give the estimated tokens before and after packing.
+    """
+    tokens_in = estimate_tokens("\n".join(format_passage(doc) for doc in documents))
+    repeated = repeated_lines(doc.page_content for doc in documents)
+    cleaned = []
+    for doc in documents:
+        text = strip_boilerplate(doc.page_content, repeated)
+        if text:
+            cleaned.append(Document(page_content=text, metadata=doc.metadata))
+    unique = dedupe(cleaned)
+
+    eligible = set(eligible)
+    query = " ".join(str(value) for value in profile.values())
+    order = mmr_order(query, unique, [ELIGIBLE_BOOST if doc.metadata.get("title") in eligible else 0.0 for doc in unique]) if unique else []
+
+    passages: List[str] = []
+    packed: List[Document] = []
+    remaining = budget
+    for i in order:
+        passage = format_passage(unique[i])
+        cost = estimate_tokens(passage) + 1
+        if cost > remaining:
+            if remaining < MIN_PASSAGE_TOKENS:
+                break
+            passage = _trim(passage, (remaining - 1) * CHARS_PER_TOKEN)
+            cost = estimate_tokens(passage) + 1
+        passages.append(passage)
+        packed.append(unique[i])
+        remaining -= cost
+
+    text = "\n".join(passages)
+    tokens_out = estimate_tokens(text)
+    stats = {
+        "documents_in": len(documents),
+        "duplicates_dropped": len(cleaned) - len(unique),
+        "documents_packed": len(packed),
+        "tokens_in": tokens_in,
+        "tokens_out": tokens_out,
+        "tokens_saved": max(0, tokens_in - tokens_out)
+    }
+    logger.info("[Context] Packed %d/%d documents into ~%d tokens (saved ~%d)", len(packed), len(documents), tokens_out, stats["tokens_saved"])
+    return PackedContext(text=text, documents=packed, stats=stats)
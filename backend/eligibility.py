@@ -0,0 +1,184 @@
+"""
+Rule-based scheme eligibility, evaluated with NumPy.
+
+The scheme catalogue (SCHEMES, or the JSON list at SCHEME_CATALOGUE_PATH) is
+compiled once into columns: numeric limits become float arrays and each
+categorical rule (states, crops, caste categories, ...) becomes an int64 bit
+mask per scheme. Checking P profiles against S schemes is then a handful of
+broadcast (P, S) comparisons, with no per-scheme Python loop.
+
+A rule a scheme does not set matches everything, and a profile value that
+cannot be parsed (e.g. an unknown land size) passes numeric limits, so the
+filter only drops schemes a profile clearly does not qualify for.
+"""
+import os
+import re
+import json
+import logging
+import numpy as np
+from urllib.parse import urlparse
+from langchain_core.documents import Document
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+SCHEME_CATALOGUE_PATH = os.getenv("SCHEME_CATALOGUE_PATH", "")
+
+ACRES_PER_HECTARE = 2.47105
+
+SCHEMES: List[Dict[str, Any]] = [
+    {"title": "PM-KISAN", "url": "https://pmkisan.gov.in", "desc": "₹6000/year income support in three instalments",
+     "aliases": ["pm-kisan", "pm kisan", "kisan samman"], "ownership": ["owned"], "bank_account": ["yes"]},
+    {"title": "PMFBY (Crop Insurance)", "url": "https://pmfby.gov.in", "desc": "Crop insurance at 1.5-2% premium for food crops",
+     "aliases": ["pmfby", "fasal bima", "crop insurance"], "insurance": True},
+    {"title": "SMAM (Machinery Subsidy)", "url": "https://agrimachinery.nic.in", "desc": "40-50% subsidy on farm machinery",
+     "aliases": ["smam", "agricultural mechanization", "machinery subsidy"]},
+    {"title": "Maha DBT", "url": "https://mahadbt.maharashtra.gov.in", "desc": "Maharashtra subsidies for equipment, irrigation and seeds",
+     "aliases": ["maha dbt", "mahadbt"], "states": ["maharashtra"]},
+    {"title": "Dr. Babasaheb Ambedkar Krishi Swavalamban Yojana", "url": "https://mahadbt.maharashtra.gov.in", "desc": "Wells, pumps and irrigation for SC farmers in Maharashtra",
+     "aliases": ["krishi swavalamban"], "states": ["maharashtra"], "caste_categories": ["sc"], "min_land": 0.4, "max_land": 6, "max_income": 150000},
+    {"title": "Birsa Munda Krishi Kranti Yojana", "url": "https://mahadbt.maharashtra.gov.in", "desc": "Wells, pumps and irrigation for ST farmers in Maharashtra",
+     "aliases": ["birsa munda"], "states": ["maharashtra"], "caste_categories": ["st"], "min_land": 0.2, "max_land": 6, "max_income": 150000},
+    {"title": "Kisan Credit Card", "url": "https://www.myscheme.gov.in/schemes/kcc", "desc": "Crop loans up to ₹3 lakh at 4% with prompt repayment",
+     "aliases": ["kisan credit card", "kcc"], "bank_account": ["yes"]},
+    {"title": "PM-KUSUM", "url": "https://pmkusum.mnre.gov.in", "desc": "Up to 60% subsidy on solar irrigation pumps",
+     "aliases": ["kusum"], "irrigation_support": True},
+    {"title": "PMKSY (Per Drop More Crop)", "url": "https://pmksy.gov.in", "desc": "55% subsidy on drip and sprinkler irrigation for small farmers",
+     "aliases": ["pmksy", "per drop more crop", "micro irrigation"], "irrigation_support": True},
+    {"title": "Soil Health Card", "url": "https://soilhealth.dac.gov.in", "desc": "Free soil testing with fertiliser recommendations",
+     "aliases": ["soil health card"]},
+    {"title": "Paramparagat Krishi Vikas Yojana", "url": "https://pgsindia-ncof.gov.in", "desc": "₹50,000/hectare over 3 years for organic farming",
+     "aliases": ["pkvy", "paramparagat"]},
+    {"title": "National Food Security Mission", "url": "https://nfsm.gov.in", "desc": "Seed, machinery and demonstration support for staple crops",
+     "aliases": ["nfsm", "food security mission"], "crops": ["rice", "paddy", "wheat", "pulses", "maize", "millets", "jowar", "bajra"]},
+    {"title": "Rythu Bandhu", "url": "https://rythubandhu.telangana.gov.in", "desc": "₹10,000/acre/year investment support in Telangana",
+     "aliases": ["rythu bandhu"], "states": ["telangana"], "ownership": ["owned"]},
+    {"title": "KALIA", "url": "https://kalia.odisha.gov.in", "desc": "₹10,000/year livelihood support for small farmers in Odisha",
+     "aliases": ["kalia"], "states": ["odisha"], "farmer_types": ["small"]},
+    {"title": "Krishak Bandhu", "url": "https://krishakbandhu.net", "desc": "Up to ₹10,000/year assistance for farmers in West Bengal",
+     "aliases": ["krishak bandhu"], "states": ["west bengal"]}
+]
+
+# Catalogue rule -> the profile field it is checked against.
+CATEGORICAL_RULES = {
+    "states": "state",
+    "crops": "crop_type",
+    "caste_categories": "caste_category",
+    "ownership": "land_ownership",
+    "farmer_types": "farmer_type",
+    "bank_account": "bank_account"
+}
+ANY = np.int64(-1)
+OTHER_BIT = np.int64(1)  # Profile values the catalogue never mentions
+
+def normalize(value: Any) -> str:
+    return re.sub(r"[^a-z0-9]+", " ", str(value).lower()).strip()
+
+def parse_land_size(text: Any) -> float:
+    """Hectares from e.g. "2 hectares", "1.5 ha" or "5 acres"; NaN if unreadable."""
+    match = re.search(r"(\d+(?:\.\d+)?)\s*([a-z]*)", str(text).lower())
+    if not match:
+        return float("nan")
+    value = float(match.group(1))
+    return value / ACRES_PER_HECTARE if match.group(2).startswith("acre") else value
+
+def parse_income(text: Any) -> float:
+    digits = re.sub(r"[^\d.]", "", str(text))
+    try:
+        return float(digits)
+    except ValueError:
+        return float("nan")
+
+def load_catalogue(path: str = SCHEME_CATALOGUE_PATH) -> List[Dict[str, Any]]:
+    if not path:
+        return SCHEMES
+    with open(path, encoding="utf-8") as f:
+        schemes = json.load(f)
+    logger.info("[Eligibility] Loaded %d schemes from %s", len(schemes), path)
+    return schemes
+
+class SchemeTable:
+    """A scheme catalogue compiled into NumPy columns for batch evaluation."""
+
+    def __init__(self, schemes: Sequence[Dict[str, Any]]):
+        self.schemes = list(schemes)
+        self.min_land = np.array([s.get("min_land", -np.inf) for s in self.schemes], dtype=np.float64)
+        self.max_land = np.array([s.get("max_land", np.inf) for s in self.schemes], dtype=np.float64)
+        self.max_income = np.array([s.get("max_income", np.inf) for s in self.schemes], dtype=np.float64)
+        self.insurance = np.array([bool(s.get("insurance")) for s in self.schemes])
+        self.irrigation_support = np.array([bool(s.get("irrigation_support")) for s in self.schemes])
+
+        self.vocab: Dict[str, Dict[str, np.int64]] = {}
+        self.masks: Dict[str, np.ndarray] = {}
+        for rule in CATEGORICAL_RULES:
+            values = sorted({normalize(v) for s in self.schemes for v in s.get(rule) or []})
+            if len(values) > 62:
+                raise ValueError(f"Too many distinct values for '{rule}' ({len(values)}); at most 62 are supported")
+            vocab = {value: np.int64(1 << (i + 1)) for i, value in enumerate(values)}
+            self.vocab[rule] = vocab
+            self.masks[rule] = np.array([
+                np.bitwise_or.reduce([vocab[normalize(v)] for v in s[rule]]) if s.get(rule) else ANY
+                for s in self.schemes
+            ], dtype=np.int64)
+        # Schemes with more rules are more targeted, so rank them above ones open to everyone.
+        self.specificity = sum((self.masks[rule] != ANY).astype(np.float64) for rule in CATEGORICAL_RULES)
+        self.specificity += np.isfinite(self.max_income) + np.isfinite(self.max_land)
+
+        self.hosts = [urlparse(s["url"]).netloc.lower().removeprefix("www.") for s in self.schemes]
+        self.aliases = [[normalize(a) for a in s.get("aliases", [])] + [normalize(s["title"])] for s in self.schemes]
+        # Whole words only, so e.g. "kalia" does not match inside another word.
+        self.alias_patterns = [re.compile(r"\b(?:" + "|".join(re.escape(a) for a in aliases if a) + r")\b") for aliases in self.aliases]
+
+    def evaluate(self, profiles: Sequence[Mapping[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+        """Return ``(eligible, scores)``, both shaped (profiles, schemes)."""
+        land = np.array([parse_land_size(p.get("land_size", "")) for p in profiles], dtype=np.float64)[:, None]
+        income = np.array([parse_income(p.get("income", "")) for p in profiles], dtype=np.float64)[:, None]
+
+        eligible = np.isnan(land) | ((land >= self.min_land) & (land <= self.max_land))
+        eligible &= np.isnan(income) | (income <= self.max_income)
+        for rule, field in CATEGORICAL_RULES.items():
+            vocab = self.vocab[rule]
+            bits = np.array([vocab.get(normalize(p.get(field, "")), OTHER_BIT) for p in profiles], dtype=np.int64)[:, None]
+            eligible &= (self.masks[rule] & bits) != 0
+
+        needs_insurance = np.array([p.get("needs_insurance") == "yes" for p in profiles])[:, None]
+        rain_fed = np.array([normalize(p.get("irrigation", "")) == "rain fed" for p in profiles])[:, None]
+        scores = self.specificity + (needs_insurance & self.insurance) + (rain_fed & self.irrigation_support)
+        return eligible, np.where(eligible, scores, -np.inf)
+
+    def eligible_schemes(self, profile: Mapping[str, Any]) -> List[Dict[str, Any]]:
+        """Catalogue entries ``profile`` qualifies for, most relevant first."""
+        eligible, scores = self.evaluate([profile])
+        order = np.argsort(-scores[0], kind="stable")
+        return [self.schemes[i] for i in order if eligible[0, i]]
+
+    def match(self, document: Document) -> Optional[int]:
+        """Index of the catalogue scheme a retrieved document describes, if any."""
+        host = urlparse(document.metadata.get("url", "")).netloc.lower().removeprefix("www.")
+        title = normalize(document.metadata.get("title", ""))
+        named = [i for i, pattern in enumerate(self.alias_patterns) if pattern.search(title)]
+        if named:
+            # A title naming several schemes is ambiguous; keep the document rather than guess.
+            return named[0] if len(named) == 1 else None
+        hosts = [i for i, h in enumerate(self.hosts) if h and h == host]
+        # Several schemes share a portal (e.g. Maha DBT); a URL alone only identifies a unique one.
+        return hosts[0] if len(hosts) == 1 else None
+
+    def filter_documents(self, profile: Mapping[str, Any], documents: List[Document]) -> Tuple[List[Document], List[str]]:
+        """Drop documents about catalogue schemes ``profile`` is not eligible for.
+
+        Documents that match no catalogue scheme are kept for the LLM to judge.
+        Also returns the titles of every eligible catalogue scheme.
+        """
+        eligible, scores = self.evaluate([profile])
+        kept = []
+        for document in documents:
+            i = self.match(document)
+            if i is None or eligible[0, i]:
+                kept.append(document)
+        order = np.argsort(-scores[0], kind="stable")
+        titles = [self.schemes[i]["title"] for i in order if eligible[0, i]]
+        logger.info("[Eligibility] Kept %d/%d documents; %d catalogue schemes eligible", len(kept), len(documents), len(titles))
+        return kept, titles
+
+scheme_table = SchemeTable(load_catalogue())
@@ -0,0 +1,105 @@
+import os
+import re
+import hashlib
+import logging
+import threading
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from typing import Dict, List, Optional
+from cache import DiskStore, LRUCache
+from metrics import span
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "4096"))
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "")
+# The disk tier is shared by every worker, so it holds more than one worker's LRU.
+EMBEDDING_DISK_CACHE_SIZE = int(os.getenv("EMBEDDING_DISK_CACHE_SIZE", "100000"))
+
+def normalize_text(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+class CachedEmbeddings(Embeddings):
+    """Wraps an embeddings client so each distinct text is embedded only once.
+
+    Keys combine the model name, the input type (query or document, which Cohere
+    embeds differently) and the normalized text. Vectors live in an in-memory LRU
+    and, when a ``DiskStore`` is given, as float32 blobs shared across workers,
+    pruned to ``disk_entries`` every ``prune_every`` writes.
+    ``embed_documents`` sends only the cache misses to the wrapped client, in one call.
+    """
+
+    def __init__(self, embeddings: Embeddings, model: str, store: Optional[DiskStore] = None, max_entries: int = EMBEDDING_CACHE_SIZE, disk_entries: int = EMBEDDING_DISK_CACHE_SIZE, prune_every: int = 100):
+        self.embeddings = embeddings
+        self.model = model
+        if store is None and EMBEDDING_CACHE_PATH:
+            store = DiskStore(EMBEDDING_CACHE_PATH, table="embeddings")
+        self.store = store
+        self.disk_entries = disk_entries
+        self.prune_every = prune_every
+        self.memory = LRUCache(max_entries=max_entries, ttl=float("inf"), name="embeddings")
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key("query", text)
+        vector = self._get(key)
+        if vector is None:
+            with span("external", "embedding"):
+                vector = self.embeddings.embed_query(text)
+            self._put(key, vector)
+        return vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key("document", text) for text in texts]
+        vectors: List[Optional[List[float]]] = [self._get(key) for key in keys]
+
+        # Several inputs can normalize to the same key; embed each distinct miss once.
+        misses: Dict[str, int] = {}
+        for i, vector in enumerate(vectors):
+            if vector is None and keys[i] not in misses:
+                misses[keys[i]] = i
+        if misses:
+            logger.info("[Embedding Cache] %d/%d documents not cached, embedding", len(misses), len(texts))
+            with span("external", "embedding"):
+                embedded = self.embeddings.embed_documents([texts[i] for i in misses.values()])
+            fresh = dict(zip(misses.keys(), embedded))
+            for key, vector in fresh.items():
+                self._put(key, vector)
+            vectors = [vector if vector is not None else fresh[keys[i]] for i, vector in enumerate(vectors)]
+        return vectors
+
+    def stats(self):
+        return self.memory.stats()
+
+    def _key(self, kind: str, text: str) -> str:
+        return hashlib.sha256(f"{self.model}:{kind}:{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def _get(self, key: str) -> Optional[List[float]]:
+        vector = self.memory.get(key)
+        if vector is not None or self.store is None:
+            return vector
+        try:
+            row = self.store.get(key)
+        except Exception as e:
+            logger.warning("[Embedding Cache] Could not read from disk: %s", str(e))
+            return None
+        if row is None:
+            return None
+        vector = np.frombuffer(row[0], dtype=np.float32).tolist()
+        self.memory.put(key, vector)
+        return vector
+
+    def _put(self, key: str, vector: List[float]) -> None:
+        self.memory.put(key, vector)
+        if self.store is None:
+            return
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % self.prune_every == 0
+        try:
+            self.store.set(key, np.asarray(vector, dtype=np.float32).tobytes())
+            if prune:
+                self.store.prune(self.disk_entries)
+        except Exception as e:
+            logger.warning("[Embedding Cache] Could not persist vector: %s", str(e))
@@ -0,0 +1,252 @@
+"""
+Local stand-ins for the external services, for offline benchmarks.
+
+Every fake can inject a fixed latency per call and fail a random fraction of
+calls, so throughput and retry behaviour can be measured without API keys.
+``FakeSchemeSites`` serves the scraped scheme pages from a local HTTP server
+with the same knobs.
+"""
+import re
+import json
+import time
+import random
+import hashlib
+import threading
+import numpy as np
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from typing import Any, Dict, Iterator, List, Optional
+from vectorstore import LocalVectorStore
+
+class FakeServiceError(Exception):
+    pass
+
+def _simulate_call(latency: float, failure_rate: float, what: str) -> None:
+    if latency:
+        time.sleep(latency)
+    if failure_rate and random.random() < failure_rate:
+        raise FakeServiceError(f"Injected {what} failure")
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic unit vectors derived from a hash of the text."""
+
+    def __init__(self, size: int = 1024, latency: float = 0.0, failure_rate: float = 0.0):
+        self.size = size
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.calls = 0
+        self.texts_embedded = 0
+        self._lock = threading.Lock()
+
+    def _vector(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.size).astype(np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        _simulate_call(self.latency, self.failure_rate, "embedding")
+        with self._lock:
+            self.calls += 1
+            self.texts_embedded += len(texts)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+class FakeVectorSink:
+    """Keeps upserted vectors in memory, with the same interface as ingest.PineconeSink."""
+
+    def __init__(self, latency: float = 0.0, failure_rate: float = 0.0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.records: Dict[str, Dict[str, Any]] = {}
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def upsert(self, ids: List[str], vectors: List[List[float]], texts: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        _simulate_call(self.latency, self.failure_rate, "upsert")
+        with self._lock:
+            self.calls += 1
+            for id_, vector, text, metadata in zip(ids, vectors, texts, metadatas):
+                self.records[id_] = {"values": vector, "text": text, "metadata": metadata}
+
+    def delete(self, ids: List[str]) -> None:
+        _simulate_call(self.latency, self.failure_rate, "delete")
+        with self._lock:
+            for id_ in ids:
+                self.records.pop(id_, None)
+
+    def close(self) -> None:
+        pass
+
+CANNED_RECOMMENDATIONS = """## PM-KISAN
+- Eligibility: your landholding qualifies you as a small farmer with a bank account.
+- Benefit: ₹6000 a year in three instalments, about 25% of your seed costs.
+- Steps: 1. Register at https://pmkisan.gov.in with Aadhaar and land records.
+
+## PMFBY (Crop Insurance)
+- Eligibility: rain-fed farmers growing notified crops qualify.
+- Benefit: premium of 2% for kharif crops, the rest is subsidised.
+- Steps: 1. Apply through your bank or https://pmfby.gov.in before the sowing deadline.
+
+## SMAM (Machinery Subsidy)
+- Eligibility: small and marginal farmers are eligible for the highest rate.
+- Benefit: 40-50% subsidy on tractors, tillers and sprayers.
+- Steps: 1. Apply at https://agrimachinery.nic.in and upload your quotation.
+
+## Soil Health Card
+- Eligibility: every farmer with cultivable land qualifies.
+- Benefit: free soil testing and a fertiliser plan that saves on inputs.
+- Steps: 1. Visit your district agriculture office or https://soilhealth.dac.gov.in.
+"""
+
+class FakeChatModel(BaseChatModel):
+    """Answers every prompt with ``response``, streamed in word-sized tokens.
+
+    A call waits ``first_token_latency`` and then ``1 / tokens_per_second`` per
+    token, whether it is streamed or not, so ``invoke`` costs as long as a
+    full stream does.
+    """
+
+    response: str = CANNED_RECOMMENDATIONS
+    tokens_per_second: float = 200.0
+    first_token_latency: float = 0.3
+    failure_rate: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _tokens(self) -> List[str]:
+        return re.findall(r"\S+\s*|\s+", self.response)
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        _simulate_call(self.first_token_latency, self.failure_rate, "LLM")
+        for token in self._tokens():
+            if self.tokens_per_second:
+                time.sleep(1 / self.tokens_per_second)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        _simulate_call(self.first_token_latency, self.failure_rate, "LLM")
+        if self.tokens_per_second:
+            time.sleep(len(self._tokens()) / self.tokens_per_second)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.response))])
+
+class FakeTavilyClient:
+    """Returns ``max_results`` made-up government pages per query, in Tavily's response shape."""
+
+    def __init__(self, latency: float = 0.0, failure_rate: float = 0.0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _results(self, query: str, max_results: int) -> List[Dict[str, Any]]:
+        digest = hashlib.sha256(query.encode("utf-8")).hexdigest()[:8]
+        return [
+            {
+                "title": f"Agricultural scheme {digest}-{i}",
+                "url": f"https://agriwelfare.gov.in/schemes/{digest}-{i}",
+                "content": f"Scheme {digest}-{i} offers farmers a subsidy of {10 * (i + 1)}% on inputs. Eligibility: small and marginal farmers. Apply at the district agriculture office.",
+                "score": round(1 - i / 10, 2)
+            }
+            for i in range(max_results)
+        ]
+
+    def search(self, query: str, max_results: int = 5, **kwargs: Any) -> Dict[str, Any]:
+        _simulate_call(self.latency, self.failure_rate, "Tavily")
+        with self._lock:
+            self.calls += 1
+        return {"query": query, "results": self._results(query, max_results)}
+
+    def get_search_context(self, query: str, max_results: int = 5, **kwargs: Any) -> str:
+        # Like TavilyClient, returns a JSON string rather than a dict.
+        _simulate_call(self.latency, self.failure_rate, "Tavily")
+        with self._lock:
+            self.calls += 1
+        return json.dumps(json.dumps([{"url": r["url"], "content": r["content"]} for r in self._results(query, max_results)]))
+
+class FakeVectorStore(LocalVectorStore):
+    """LocalVectorStore with injected query latency and failures, standing in for Pinecone."""
+
+    def __init__(self, embedding: Embeddings, latency: float = 0.0, failure_rate: float = 0.0, **kwargs: Any):
+        super().__init__(embedding, **kwargs)
+        self.latency = latency
+        self.failure_rate = failure_rate
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4, filter: Optional[Dict[str, Any]] = None) -> List[Any]:
+        _simulate_call(self.latency, self.failure_rate, "vector query")
+        return super().similarity_search_by_vector_with_score(embedding, k=k, filter=filter)
+
+class FakeSchemeSites:
+    """Local HTTP server standing in for the scraped scheme websites.
+
+    Any path returns a page with a ``div.content`` body after ``delay``
+    seconds; a ``failure_rate`` fraction of requests get a 503 instead.
+    ``url(name)`` gives the address to scrape for a site.
+    """
+
+    def __init__(self, delay: float = 0.0, failure_rate: float = 0.0, host: str = "127.0.0.1", port: int = 0):
+        self.delay = delay
+        self.failure_rate = failure_rate
+        self.requests = 0
+        self._lock = threading.Lock()
+        sites = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                with sites._lock:
+                    sites.requests += 1
+                if sites.delay:
+                    time.sleep(sites.delay)
+                if sites.failure_rate and random.random() < sites.failure_rate:
+                    self.send_error(503, "Injected failure")
+                    return
+                body = (
+                    f"<html><body><nav>Home | Login | Contact Us</nav><div class='content'>"
+                    f"<h1>{self.path.strip('/')}</h1><p>Eligible farmers receive financial assistance through direct benefit transfer. "
+                    f"Apply online with Aadhaar, bank details and land records.</p></div></body></html>"
+                ).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def url(self, name: str) -> str:
+        return f"{self.address}/{re.sub(r'[^a-z0-9]+', '-', name.lower()).strip('-')}"
+
+    def start(self) -> "FakeSchemeSites":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-scheme-sites", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeSchemeSites":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
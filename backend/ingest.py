@@ -0,0 +1,643 @@
+import io
+import os
+import json
+import time
+import hashlib
+import uuid
+import queue
+import random
+import shutil
+import itertools
+import logging
+import tempfile
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from PyPDF2 import PdfReader
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from langchain_core.embeddings import Embeddings
+from vectorstore import LocalVectorStore, VECTOR_BACKEND, LOCAL_INDEX_PATH
+from chunk_metadata import METADATA_VERSION, annotate_chunks, scan_document
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 8000
+CHUNK_OVERLAP = 200
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(os.cpu_count() or 1)))
+# Pages extracted ahead of the splitter; bounds memory regardless of document size.
+PAGE_WINDOW = int(os.getenv("PDF_PAGE_WINDOW", "32"))
+# Opening pages read ahead of the splitter for the document's scheme, states and portal URL.
+METADATA_LOOKAHEAD_PAGES = int(os.getenv("PDF_METADATA_LOOKAHEAD_PAGES", "10"))
+# Below this many pages, starting a process pool costs more than it saves.
+PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "40"))
+# Cohere accepts at most 96 texts per embed call; Pinecone recommends <=100 vectors (2MB) per upsert.
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "96"))
+UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", "100"))
+UPSERT_WORKERS = int(os.getenv("UPSERT_WORKERS", "4"))
+# Embedded batches waiting for an upsert worker; embedding pauses when it is full.
+UPSERT_QUEUE_DEPTH = int(os.getenv("UPSERT_QUEUE_DEPTH", "8"))
+MAX_RETRIES = int(os.getenv("INGEST_MAX_RETRIES", "5"))
+RETRY_BACKOFF = float(os.getenv("INGEST_RETRY_BACKOFF", "1.0"))
+MANIFEST_DIR = os.getenv("INGEST_MANIFEST_DIR", "data/manifests")
+DELETE_BATCH_SIZE = 1000
+
+_worker_reader = None
+
+def _pdf_source(pdf_file: Any) -> Union[str, bytes]:
+    if isinstance(pdf_file, (str, os.PathLike)):
+        return os.fspath(pdf_file)
+    if hasattr(pdf_file, "getvalue"):
+        return pdf_file.getvalue()
+    pdf_file.seek(0)
+    return pdf_file.read()
+
+def _init_worker(source: Union[str, bytes]) -> None:
+    # Each worker process parses the PDF once and then extracts the pages it is given.
+    global _worker_reader
+    _worker_reader = PdfReader(io.BytesIO(source) if isinstance(source, bytes) else source)
+
+def _extract_page(index: int) -> Tuple[int, str]:
+    return index + 1, _worker_reader.pages[index].extract_text() or ""
+
+def iter_pdf_pages(pdf_file: Any, workers: int = PDF_WORKERS, window: int = PAGE_WINDOW) -> Iterator[Tuple[int, str]]:
+    """Yield (page_number, text) in page order, at most ``window`` pages ahead of the consumer."""
+    source = _pdf_source(pdf_file)
+    reader = PdfReader(io.BytesIO(source) if isinstance(source, bytes) else source)
+    page_count = len(reader.pages)
+
+    if workers <= 1 or page_count < PARALLEL_MIN_PAGES:
+        for page_num, page in enumerate(reader.pages, 1):
+            yield page_num, page.extract_text() or ""
+        return
+
+    logger.info("[Ingest] Extracting %d pages with %d worker processes", page_count, workers)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(source,)) as pool:
+        pending = deque()
+        next_page = 0
+        while next_page < page_count or pending:
+            while next_page < page_count and len(pending) < window:
+                pending.append(pool.submit(_extract_page, next_page))
+                next_page += 1
+            yield pending.popleft().result()
+
+def _page_at(page_starts: List[Tuple[int, int]], offset: int) -> int:
+    page = page_starts[0][1]
+    for start, page_num in page_starts:
+        if start > offset:
+            break
+        page = page_num
+    return page
+
+def iter_chunks(
+    pages: Iterable[Tuple[int, str]],
+    source: str,
+    chunk_size: int = CHUNK_SIZE,
+    chunk_overlap: int = CHUNK_OVERLAP
+) -> Iterator[Document]:
+    """Split a stream of pages into chunks tagged with the pages they span.
+
+    Pages are buffered only until a few chunks' worth of text has accumulated;
+    every complete chunk is emitted and the last, possibly partial, chunk is
+    carried over into the next round.
+    """
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap, add_start_index=True)
+    flush_at = chunk_size * 4
+    parts: List[str] = []
+    length = 0
+    page_starts: List[Tuple[int, int]] = []
+
+    def split(final: bool) -> Iterator[Document]:
+        nonlocal parts, length, page_starts
+        text = "".join(parts)
+        docs = splitter.create_documents([text])
+        if not docs:
+            parts, length, page_starts = [], 0, []
+            return
+        emit = docs if final else docs[:-1]
+        for doc in emit:
+            start = doc.metadata["start_index"]
+            yield Document(
+                page_content=doc.page_content,
+                metadata={
+                    "source": source,
+                    "page_start": _page_at(page_starts, start),
+                    "page_end": _page_at(page_starts, start + len(doc.page_content) - 1)
+                }
+            )
+        if final:
+            parts, length, page_starts = [], 0, []
+            return
+        carry = docs[-1].metadata["start_index"]
+        carried_pages = [(0, _page_at(page_starts, carry))] + [(start - carry, page) for start, page in page_starts if start > carry]
+        parts, length, page_starts = [text[carry:]], len(text) - carry, carried_pages
+
+    for page_num, page_text in pages:
+        if not page_text:
+            continue
+        page_starts.append((length, page_num))
+        parts.append(page_text + "\n")
+        length += len(page_text) + 1
+        if length >= flush_at:
+            yield from split(final=False)
+
+    if length and "".join(parts).strip():
+        yield from split(final=True)
+
+def iter_pdf_chunks(pdf_file: Any, source: str, workers: int = PDF_WORKERS, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP) -> Iterator[Document]:
+    return iter_chunks(iter_pdf_pages(pdf_file, workers=workers), source, chunk_size, chunk_overlap)
+
+def iter_annotated_pdf_chunks(pdf_file: Any, source: str, workers: int = PDF_WORKERS, lookahead: int = METADATA_LOOKAHEAD_PAGES) -> Iterator[Document]:
+    """Chunks of a PDF carrying chunk_metadata's fields, from one extraction pass.
+
+    The document-level metadata is taken from the first ``lookahead`` pages,
+    which are held back until it is known and then split like the rest.
+    """
+    pages = iter_pdf_pages(pdf_file, workers=workers)
+    head = list(itertools.islice(pages, lookahead))
+    document = scan_document(head, source)
+    return annotate_chunks(iter_chunks(itertools.chain(head, pages), source), document)
+
+def with_retries(fn: Callable[[], Any], what: str, retries: int = MAX_RETRIES, backoff: float = RETRY_BACKOFF) -> Any:
+    """Call ``fn``, retrying with exponential backoff and jitter on any exception."""
+    for attempt in range(retries + 1):
+        try:
+            return fn()
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = backoff * (2 ** attempt) * (0.5 + random.random())
+            logger.warning("[Ingest] %s failed (attempt %d/%d): %s; retrying in %.1fs", what, attempt + 1, retries + 1, str(e), delay)
+            time.sleep(delay)
+
+class PineconeSink:
+    """Upserts vectors in the layout PineconeVectorStore reads (text under ``text_key``)."""
+
+    def __init__(self, index: Any, text_key: str = "text"):
+        self.index = index
+        self.text_key = text_key
+
+    def upsert(self, ids: List[str], vectors: List[List[float]], texts: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        self.index.upsert(vectors=[
+            {
+                "id": id_,
+                "values": vector,
+                "metadata": {**{k: v for k, v in metadata.items() if v is not None}, self.text_key: text}
+            }
+            for id_, vector, text, metadata in zip(ids, vectors, texts, metadatas)
+        ])
+
+    def delete(self, ids: List[str]) -> None:
+        for i in range(0, len(ids), DELETE_BATCH_SIZE):
+            self.index.delete(ids=ids[i:i + DELETE_BATCH_SIZE])
+
+    def close(self) -> None:
+        pass
+
+class LocalSink:
+    """Adds vectors to a LocalVectorStore and saves it once the run is finished."""
+
+    def __init__(self, store: Any):
+        self.store = store
+        self._lock = threading.Lock()
+
+    def upsert(self, ids: List[str], vectors: List[List[float]], texts: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self.store.add_vectors(vectors, texts, metadatas, ids)
+
+    def delete(self, ids: List[str]) -> None:
+        with self._lock:
+            self.store.delete(ids)
+
+    def close(self) -> None:
+        with self._lock:
+            self.store.save()
+
+class IngestionPipeline:
+    """Embeds chunks in provider-sized batches and upserts them concurrently.
+
+    The calling thread embeds; ``upsert_workers`` threads upsert. A bounded queue
+    between the two lets the next embedding batch overlap the previous upserts
+    without letting embedded vectors pile up in memory. Every batch is retried
+    with backoff, and a batch that still fails is counted and skipped rather than
+    aborting the whole run. ``progress`` is called on the calling thread. The
+    sink is left open; the caller closes it once all its runs are done.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        sink: Any,
+        embed_batch_size: int = EMBED_BATCH_SIZE,
+        upsert_batch_size: int = UPSERT_BATCH_SIZE,
+        upsert_workers: int = UPSERT_WORKERS,
+        queue_depth: int = UPSERT_QUEUE_DEPTH,
+        retries: int = MAX_RETRIES,
+        progress: Optional[Callable[[Dict[str, Any]], None]] = None
+    ):
+        self.embeddings = embeddings
+        self.sink = sink
+        self.embed_batch_size = embed_batch_size
+        self.upsert_batch_size = upsert_batch_size
+        self.upsert_workers = upsert_workers
+        self.queue_depth = queue_depth
+        self.retries = retries
+        self.progress = progress
+        self._lock = threading.Lock()
+
+    def run(self, chunks: Iterable[Document]) -> Dict[str, Any]:
+        stats = {"chunks": 0, "embedded": 0, "upserted": 0, "failed": 0, "failed_ids": [], "seconds": 0.0, "chunks_per_sec": 0.0}
+        start = time.monotonic()
+        batches: "queue.Queue[Optional[Tuple[List[str], List[List[float]], List[Document]]]]" = queue.Queue(maxsize=self.queue_depth)
+        workers = [
+            threading.Thread(target=self._upsert_worker, args=(batches, stats), name=f"upsert-{i}", daemon=True)
+            for i in range(self.upsert_workers)
+        ]
+        for worker in workers:
+            worker.start()
+
+        try:
+            batch: List[Document] = []
+            for chunk in chunks:
+                batch.append(chunk)
+                if len(batch) >= self.embed_batch_size:
+                    self._embed(batch, batches, stats)
+                    batch = []
+            if batch:
+                self._embed(batch, batches, stats)
+        finally:
+            for _ in workers:
+                batches.put(None)
+            for worker in workers:
+                worker.join()
+
+        stats["seconds"] = time.monotonic() - start
+        stats["chunks_per_sec"] = stats["upserted"] / stats["seconds"] if stats["seconds"] else 0.0
+        self._report(stats)
+        logger.info(
+            "[Ingest] %d chunks: %d upserted, %d failed in %.1fs (%.1f chunks/sec)",
+            stats["chunks"], stats["upserted"], stats["failed"], stats["seconds"], stats["chunks_per_sec"]
+        )
+        return stats
+
+    def _embed(self, batch: List[Document], batches: queue.Queue, stats: Dict[str, Any]) -> None:
+        ids = [doc.id or str(uuid.uuid4()) for doc in batch]
+        with self._lock:
+            stats["chunks"] += len(batch)
+        try:
+            vectors = with_retries(
+                lambda: self.embeddings.embed_documents([doc.page_content for doc in batch]),
+                f"Embedding {len(batch)} chunks",
+                self.retries
+            )
+        except Exception as e:
+            logger.error("[Ingest] Giving up on embedding %d chunks: %s", len(batch), str(e))
+            with self._lock:
+                stats["failed"] += len(batch)
+                stats["failed_ids"].extend(ids)
+            return
+        with self._lock:
+            stats["embedded"] += len(batch)
+        for i in range(0, len(batch), self.upsert_batch_size):
+            batches.put((ids[i:i + self.upsert_batch_size], vectors[i:i + self.upsert_batch_size], batch[i:i + self.upsert_batch_size]))
+        self._report(stats)
+
+    def _upsert_worker(self, batches: queue.Queue, stats: Dict[str, Any]) -> None:
+        while True:
+            item = batches.get()
+            if item is None:
+                return
+            ids, vectors, docs = item
+            try:
+                with_retries(
+                    lambda: self.sink.upsert(ids, vectors, [doc.page_content for doc in docs], [dict(doc.metadata) for doc in docs]),
+                    f"Upserting {len(ids)} vectors",
+                    self.retries
+                )
+                with self._lock:
+                    stats["upserted"] += len(ids)
+            except Exception as e:
+                logger.error("[Ingest] Giving up on upserting %d vectors: %s", len(ids), str(e))
+                with self._lock:
+                    stats["failed"] += len(ids)
+                    stats["failed_ids"].extend(ids)
+
+    def _report(self, stats: Dict[str, Any]) -> None:
+        if self.progress is not None:
+            with self._lock:
+                snapshot = dict(stats)
+            self.progress(snapshot)
+
+def chunk_id(source: str, content: str) -> str:
+    """Deterministic id for a chunk: the same text from the same source always maps to the same vector.
+
+    The metadata version is hashed in too, so chunks annotated under an older
+    schema get new ids and are re-upserted (and their old ids deleted) on the next sync.
+    """
+    return hashlib.sha256(f"{METADATA_VERSION}\n{source}\n{content}".encode("utf-8")).hexdigest()[:40]
+
+class ManifestStore:
+    """Remembers, per source document, which chunk ids are currently in the index."""
+
+    def __init__(self, directory: str = MANIFEST_DIR):
+        self.directory = directory
+
+    def _path(self, source: str) -> str:
+        return os.path.join(self.directory, hashlib.sha1(source.encode("utf-8")).hexdigest() + ".json")
+
+    def load(self, source: str) -> List[str]:
+        try:
+            with open(self._path(source), encoding="utf-8") as f:
+                return json.load(f)["chunk_ids"]
+        except FileNotFoundError:
+            return []
+
+    def save(self, source: str, chunk_ids: Iterable[str]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(source)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"source": source, "chunk_ids": sorted(chunk_ids), "updated_at": time.time()}, f)
+        os.replace(path + ".tmp", path)
+
+class SyncPlan:
+    """Which chunks of one source are new and which indexed ids are stale.
+
+    Worked out while the chunks stream through ``new_chunks``; ``stale`` is
+    only known once that stream has been read to the end.
+    """
+
+    def __init__(self, source: str, previous: Iterable[str]):
+        self.source = source
+        self.previous = set(previous)
+        self.current: Set[str] = set()
+        self.new = 0
+        self.complete = False
+
+    def new_chunks(self, chunks: Iterable[Document]) -> Iterator[Document]:
+        """Assign content-addressed ids and pass on only the chunks not already indexed."""
+        for chunk in chunks:
+            chunk.id = chunk_id(self.source, chunk.page_content)
+            if chunk.id in self.current:
+                continue
+            self.current.add(chunk.id)
+            if chunk.id not in self.previous:
+                self.new += 1
+                yield chunk
+        self.complete = True
+        logger.info(
+            "[Ingest] %s: %d chunks, %d new, %d unchanged, %d to delete",
+            self.source, len(self.current), self.new, self.unchanged, len(self.stale)
+        )
+
+    @property
+    def unchanged(self) -> int:
+        return len(self.current) - self.new
+
+    @property
+    def stale(self) -> List[str]:
+        return sorted(self.previous - self.current)
+
+def plan_sync(source: str, manifests: ManifestStore) -> SyncPlan:
+    return SyncPlan(source, manifests.load(source))
+
+def commit_sync(plan: SyncPlan, failed_ids: Iterable[str], sink: Any, manifests: ManifestStore) -> int:
+    """Delete the plan's stale chunks and record what is now in the index. Returns the number deleted."""
+    if not plan.complete:
+        # Until every chunk has been seen, current chunks would look stale.
+        raise ValueError(f"Sync plan for {plan.source} is incomplete")
+    undeleted: List[str] = []
+    stale = plan.stale
+    if stale:
+        try:
+            with_retries(lambda: sink.delete(stale), f"Deleting {len(stale)} stale chunks of {plan.source}")
+        except Exception as e:
+            logger.error("[Ingest] Could not delete stale chunks of %s: %s", plan.source, str(e))
+            undeleted = stale
+    manifests.save(plan.source, (plan.current - set(failed_ids)) | set(undeleted))
+    return len(stale) - len(undeleted)
+
+def sync_document(
+    source: str,
+    chunks: Iterable[Document],
+    embeddings: Embeddings,
+    sink: Any,
+    manifests: Optional[ManifestStore] = None,
+    **pipeline_options: Any
+) -> Dict[str, Any]:
+    """Bring the index in line with the current chunks of ``source``.
+
+    ``chunks`` is consumed as a stream. Only chunks whose content-addressed id
+    is not in the source's manifest are embedded; ids in the manifest that no
+    longer occur are deleted; the rest are left alone. Ids that failed to
+    upsert are kept out of the manifest, and ids that failed to delete are kept
+    in it, so the next run retries both.
+    """
+    manifests = manifests or ManifestStore()
+    plan = plan_sync(source, manifests)
+    stats = IngestionPipeline(embeddings, sink, **pipeline_options).run(plan.new_chunks(chunks))
+    stats.update({
+        "source": source,
+        "total": len(plan.current),
+        "new": plan.new,
+        "unchanged": plan.unchanged,
+        "deleted": commit_sync(plan, stats["failed_ids"], sink, manifests)
+    })
+    return stats
+
+def find_pdfs(directory: str) -> List[str]:
+    found = []
+    for root, _, files in os.walk(directory):
+        found.extend(os.path.join(root, name) for name in files if name.lower().endswith(".pdf"))
+    return sorted(found)
+
+class Checkpoint:
+    """Files finished by earlier runs, keyed by path with their size and mtime at the time."""
+
+    def __init__(self, path: str):
+        self.path = path
+        try:
+            with open(path, encoding="utf-8") as f:
+                self.completed: Dict[str, Dict[str, float]] = json.load(f)["completed"]
+        except FileNotFoundError:
+            self.completed = {}
+
+    @staticmethod
+    def _fingerprint(path: str) -> Dict[str, float]:
+        stat = os.stat(path)
+        return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+    def is_done(self, path: str) -> bool:
+        return self.completed.get(path) == self._fingerprint(path)
+
+    def mark_done(self, paths: Iterable[str]) -> None:
+        for path in paths:
+            self.completed[path] = self._fingerprint(path)
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"completed": self.completed}, f)
+        os.replace(self.path + ".tmp", self.path)
+
+def _spool_file(path: str, source: str, manifest_dir: str, spool_path: str) -> Tuple[str, SyncPlan, str]:
+    # Runs in a worker process: streams the file's new chunks to a spool file
+    # rather than returning them, so no process holds a whole document.
+    plan = plan_sync(source, ManifestStore(manifest_dir))
+    with open(spool_path, "w", encoding="utf-8") as f:
+        for chunk in plan.new_chunks(iter_annotated_pdf_chunks(path, source, workers=1)):
+            f.write(json.dumps({"id": chunk.id, "page_content": chunk.page_content, "metadata": chunk.metadata}, ensure_ascii=False) + "\n")
+    return path, plan, spool_path
+
+def _read_spool(spool_path: str) -> Iterator[Document]:
+    with open(spool_path, encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            yield Document(id=record["id"], page_content=record["page_content"], metadata=record["metadata"])
+
+def bulk_ingest(
+    directory: str,
+    embeddings: Embeddings,
+    sink: Any,
+    workers: int = PDF_WORKERS,
+    checkpoint_path: str = "data/ingest_checkpoint.json",
+    round_chunks: int = 2000,
+    manifests: Optional[ManifestStore] = None,
+    **pipeline_options: Any
+) -> Dict[str, Any]:
+    """Sync every PDF under ``directory`` into the index.
+
+    Files are extracted, split and diffed against their manifests in a process
+    pool; each worker streams a file's new chunks to a spool file on disk. New
+    chunks from many files are pooled into rounds of about ``round_chunks``, so
+    embedding and upsert batches stay full across small files, and are read
+    back from the spool files as they are embedded. After each round the
+    manifests, the sink and the checkpoint are saved, so an interrupted run
+    resumes with the files that were not finished.
+    """
+    manifests = manifests or ManifestStore()
+    checkpoint = Checkpoint(checkpoint_path)
+    files = find_pdfs(directory)
+    todo = [path for path in files if not checkpoint.is_done(path)]
+    summary = {
+        "files": len(files), "skipped": len(files) - len(todo), "processed": 0, "failed_files": [],
+        "chunks": 0, "new": 0, "unchanged": 0, "deleted": 0, "upserted": 0, "failed": 0, "seconds": 0.0
+    }
+    logger.info("[Ingest] %d PDFs found, %d already done, %d to process", len(files), summary["skipped"], len(todo))
+    start = time.monotonic()
+    plans: List[Tuple[str, SyncPlan, str]] = []
+    spool_dir = tempfile.mkdtemp(prefix="farmwise-ingest-")
+
+    def flush() -> None:
+        if not plans:
+            return
+        stats = IngestionPipeline(embeddings, sink, **pipeline_options).run(doc for _, _, spool in plans for doc in _read_spool(spool))
+        failed = set(stats["failed_ids"])
+        summary["upserted"] += stats["upserted"]
+        summary["failed"] += stats["failed"]
+        for _, plan, spool in plans:
+            summary["deleted"] += commit_sync(plan, failed, sink, manifests)
+            os.remove(spool)
+        sink.close()
+        # A file with failed chunks is left unfinished; its manifest already limits the retry to those chunks.
+        checkpoint.mark_done(path for path, plan, _ in plans if not plan.current & failed)
+        summary["processed"] += len(plans)
+        plans.clear()
+        elapsed = time.monotonic() - start
+        logger.info("[Ingest] Progress: %d/%d files, %d chunks upserted, %.1f chunks/sec", summary["processed"], len(todo), summary["upserted"], summary["upserted"] / elapsed if elapsed else 0.0)
+
+    try:
+        with ProcessPoolExecutor(max_workers=max(1, workers)) as pool:
+            queued = deque(enumerate(todo))
+            running = set()
+            while queued or running:
+                while queued and len(running) < max(1, workers) * 2:
+                    i, path = queued.popleft()
+                    spool = os.path.join(spool_dir, f"{i}.jsonl")
+                    running.add(pool.submit(_spool_file, path, os.path.relpath(path, directory), manifests.directory, spool))
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        path, plan, spool = future.result()
+                    except Exception as e:
+                        logger.error("[Ingest] Could not extract a file: %s", str(e))
+                        summary["failed_files"].append(str(e))
+                        continue
+                    summary["chunks"] += len(plan.current)
+                    summary["new"] += plan.new
+                    summary["unchanged"] += plan.unchanged
+                    plans.append((path, plan, spool))
+                if sum(plan.new for _, plan, _ in plans) >= round_chunks:
+                    flush()
+            flush()
+    finally:
+        shutil.rmtree(spool_dir, ignore_errors=True)
+
+    summary["seconds"] = time.monotonic() - start
+    return summary
+
+def benchmark(num_chunks: int, chunk_chars: int, embed_latency: float, upsert_latency: float, failure_rate: float, **pipeline_options: Any) -> Dict[str, Any]:
+    """Measure pipeline throughput offline against fake, latency-injecting backends."""
+    from fakes import FakeEmbeddings, FakeVectorSink
+
+    chunks = (Document(page_content=f"chunk {i} " + "x" * chunk_chars, metadata={"source": "benchmark"}) for i in range(num_chunks))
+    pipeline = IngestionPipeline(
+        FakeEmbeddings(latency=embed_latency, failure_rate=failure_rate),
+        FakeVectorSink(latency=upsert_latency, failure_rate=failure_rate),
+        retries=3,
+        **pipeline_options
+    )
+    stats = pipeline.run(chunks)
+    pipeline.sink.close()
+    return stats
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] [%(name)s] - %(message)s")
+    parser = argparse.ArgumentParser(description="FarmWise document ingestion.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    bench = commands.add_parser("bench", help="Benchmark embed/upsert throughput against local fakes.")
+    bench.add_argument("--chunks", type=int, default=2000)
+    bench.add_argument("--chunk-chars", type=int, default=2000)
+    bench.add_argument("--embed-latency", type=float, default=0.2, help="Seconds per embed call")
+    bench.add_argument("--upsert-latency", type=float, default=0.1, help="Seconds per upsert call")
+    bench.add_argument("--failure-rate", type=float, default=0.0, help="Probability that any call fails")
+    bench.add_argument("--embed-batch-size", type=int, default=EMBED_BATCH_SIZE)
+    bench.add_argument("--upsert-batch-size", type=int, default=UPSERT_BATCH_SIZE)
+    bench.add_argument("--upsert-workers", type=int, default=UPSERT_WORKERS)
+
+    run = commands.add_parser("run", help="Sync every PDF under a directory into the vector index.")
+    run.add_argument("directory")
+    run.add_argument("--backend", choices=["pinecone", "local"], default=VECTOR_BACKEND)
+    run.add_argument("--index", default="farmwise-ai", help="Pinecone index name")
+    run.add_argument("--workers", type=int, default=PDF_WORKERS, help="Extraction processes")
+    run.add_argument("--checkpoint", default="data/ingest_checkpoint.json")
+    run.add_argument("--round-chunks", type=int, default=2000, help="New chunks per embed/upsert round")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        from dotenv import load_dotenv
+        from langchain_cohere import CohereEmbeddings
+        from lexical import BM25_INDEX_PATH, BM25Index, LexicalSink
+
+        load_dotenv()
+        embeddings = CohereEmbeddings(cohere_api_key=os.getenv("COHERE_API_KEY"), model="embed-english-v3.0")
+        if args.backend == "local":
+            sink = LocalSink(LocalVectorStore.load(LOCAL_INDEX_PATH, embedding=None))
+        else:
+            from pinecone import Pinecone
+            sink = PineconeSink(Pinecone(api_key=os.getenv("PINECONE_API_KEY")).Index(args.index))
+        # Keep the BM25 index used by lexical.HybridRetriever in step with the vectors.
+        sink = LexicalSink(sink, BM25Index.load(BM25_INDEX_PATH))
+
+        summary = bulk_ingest(args.directory, embeddings, sink, workers=args.workers, checkpoint_path=args.checkpoint, round_chunks=args.round_chunks)
+        seconds = summary["seconds"] or 1e-9
+        print(f"Files:   {summary['processed']} processed, {summary['skipped']} skipped (checkpoint), {len(summary['failed_files'])} failed to extract")
+        print(f"Chunks:  {summary['chunks']} total, {summary['new']} new, {summary['unchanged']} unchanged, {summary['deleted']} deleted, {summary['failed']} failed")
+        print(f"Time:    {summary['seconds']:.1f}s, {summary['processed'] / seconds:.2f} files/sec, {summary['upserted'] / seconds:.1f} chunks/sec")
+    elif args.command == "bench":
+        stats = benchmark(
+            args.chunks, args.chunk_chars, args.embed_latency, args.upsert_latency, args.failure_rate,
+            embed_batch_size=args.embed_batch_size, upsert_batch_size=args.upsert_batch_size, upsert_workers=args.upsert_workers
+        )
+        print(f"{stats['upserted']}/{stats['chunks']} chunks in {stats['seconds']:.2f}s ({stats['chunks_per_sec']:.1f} chunks/sec), {stats['failed']} failed")
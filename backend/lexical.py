@@ -0,0 +1,261 @@
+"""
+Local BM25 index over the ingested chunks, and a hybrid retriever that fuses
+it with dense vector search.
+
+Postings are kept in CSR form: one ``offsets`` array indexed by term id and
+flat ``doc_ids``/``term_freqs`` arrays, so a query term is one slice and a
+score update is one ``np.add.at``. Documents are added and removed through
+``add``/``delete``; the arrays are rebuilt lazily on the next search or save.
+An index loaded from disk reloads itself when another process (pdf.py, the
+bulk ingest CLI) saves over it.
+"""
+import os
+import re
+import json
+import logging
+import threading
+import numpy as np
+from collections import Counter
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+from typing import Any, Dict, List, Optional, Tuple
+from vectorstore import matches_filter
+from metrics import span
+
+logger = logging.getLogger(__name__)
+
+BM25_INDEX_PATH = os.getenv("BM25_INDEX_PATH", "data/bm25_index")
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+
+POSTINGS_FILE = "postings.npz"
+DOCUMENTS_FILE = "documents.jsonl"
+
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-./][a-z0-9]+)*")
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased words. Compounds like "PM-KISAN" also yield "pmkisan", so "PM KISAN" and "PMKISAN" meet."""
+    tokens = []
+    for match in TOKEN_RE.findall(text.lower()):
+        parts = re.split(r"[-./]", match)
+        tokens.extend(parts)
+        if len(parts) > 1:
+            tokens.append("".join(parts))
+    return tokens
+
+def _file_version(path: str) -> Tuple[int, int]:
+    # Saves replace the file, so the inode changes even where mtimes are coarse.
+    stat = os.stat(path)
+    return stat.st_ino, stat.st_mtime_ns
+
+class BM25Index:
+    def __init__(self, path: Optional[str] = None, records: Optional[List[Dict[str, Any]]] = None):
+        self.path = path
+        # Keyed by chunk id; re-adding an id replaces its record.
+        self.records: Dict[str, Dict[str, Any]] = {record["id"]: record for record in records or []}
+        self._rows: List[Dict[str, Any]] = []  # records in postings order, as of the last build
+        self._lock = threading.RLock()
+        self._dirty = True
+        self._version: Optional[Tuple[int, int]] = None  # documents file (inode, mtime) as of the last load or save
+
+    @classmethod
+    def load(cls, path: str = BM25_INDEX_PATH) -> "BM25Index":
+        documents_path = os.path.join(path, DOCUMENTS_FILE)
+        if not os.path.exists(documents_path):
+            logger.warning("[BM25] No index at %s, starting empty", path)
+            return cls(path)
+        # Taken before reading, so a save that lands mid-load is picked up by the next reload.
+        version = _file_version(documents_path)
+        with open(documents_path, encoding="utf-8") as f:
+            index = cls(path, [json.loads(line) for line in f])
+        index._version = version
+        postings_path = os.path.join(path, POSTINGS_FILE)
+        if os.path.exists(postings_path):
+            with np.load(postings_path) as arrays:
+                terms = [str(t) for t in arrays["terms"]]
+                if arrays["doc_lengths"].shape[0] == len(index.records):
+                    index._rows = list(index.records.values())
+                    index._set_arrays({t: i for i, t in enumerate(terms)}, arrays["offsets"], arrays["doc_ids"], arrays["term_freqs"], arrays["doc_lengths"])
+        logger.info("[BM25] Loaded %d documents from %s", len(index.records), path)
+        return index
+
+    def reload_if_changed(self) -> bool:
+        """Reload from ``path`` if the files there were saved since this index last read or wrote them."""
+        if not self.path:
+            return False
+        try:
+            version = _file_version(os.path.join(self.path, DOCUMENTS_FILE))
+        except FileNotFoundError:
+            return False
+        if version == self._version:
+            return False
+        fresh = BM25Index.load(self.path)
+        with self._lock:
+            self.records, self._rows, self._version = fresh.records, fresh._rows, fresh._version
+            if fresh._dirty:
+                self._dirty = True
+            else:
+                self._set_arrays(fresh.vocab, fresh.offsets, fresh.doc_ids, fresh.term_freqs, fresh.doc_lengths)
+        return True
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def add(self, ids: List[str], texts: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            for id_, text, metadata in zip(ids, texts, metadatas):
+                self.records[id_] = {"id": id_, "page_content": text, "metadata": metadata}
+            self._dirty = True
+
+    def delete(self, ids: List[str]) -> None:
+        with self._lock:
+            for id_ in ids:
+                self.records.pop(id_, None)
+            self._dirty = True
+
+    def save(self, path: Optional[str] = None) -> None:
+        path = path or self.path
+        os.makedirs(path, exist_ok=True)
+        with self._lock:
+            self._build()
+            terms = np.array(sorted(self.vocab, key=self.vocab.get), dtype=np.str_)
+            np.savez(os.path.join(path, POSTINGS_FILE + ".tmp.npz"), terms=terms, offsets=self.offsets, doc_ids=self.doc_ids, term_freqs=self.term_freqs, doc_lengths=self.doc_lengths)
+            with open(os.path.join(path, DOCUMENTS_FILE + ".tmp"), "w", encoding="utf-8") as f:
+                for record in self._rows:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            os.replace(os.path.join(path, POSTINGS_FILE + ".tmp.npz"), os.path.join(path, POSTINGS_FILE))
+            os.replace(os.path.join(path, DOCUMENTS_FILE + ".tmp"), os.path.join(path, DOCUMENTS_FILE))
+            self._version = _file_version(os.path.join(path, DOCUMENTS_FILE))
+        self.path = path
+        logger.info("[BM25] Saved %d documents (%d terms) to %s", len(self.records), len(terms), path)
+
+    def _set_arrays(self, vocab: Dict[str, int], offsets: np.ndarray, doc_ids: np.ndarray, term_freqs: np.ndarray, doc_lengths: np.ndarray) -> None:
+        self.vocab = vocab
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.term_freqs = term_freqs
+        self.doc_lengths = doc_lengths
+        self.avg_length = float(doc_lengths.mean()) if doc_lengths.size else 0.0
+        self._dirty = False
+
+    def _build(self) -> None:
+        if not self._dirty:
+            return
+        vocab: Dict[str, int] = {}
+        postings: List[List[Tuple[int, int]]] = []
+        self._rows = list(self.records.values())
+        lengths = np.zeros(len(self._rows), dtype=np.int32)
+        for doc, record in enumerate(self._rows):
+            counts = Counter(tokenize(f"{record['metadata'].get('title', '')} {record['page_content']}"))
+            lengths[doc] = sum(counts.values())
+            for term, tf in counts.items():
+                term_id = vocab.setdefault(term, len(vocab))
+                if term_id == len(postings):
+                    postings.append([])
+                postings[term_id].append((doc, tf))
+        offsets = np.zeros(len(postings) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(p) for p in postings])
+        flat = [pair for p in postings for pair in p]
+        doc_ids = np.array([d for d, _ in flat], dtype=np.int32)
+        term_freqs = np.array([tf for _, tf in flat], dtype=np.float32)
+        self._set_arrays(vocab, offsets, doc_ids, term_freqs, lengths)
+
+    def search(self, query: str, k: int = 10, filter: Optional[Dict[str, Any]] = None) -> List[Tuple[Document, float]]:
+        with self._lock:
+            self._build()
+            if not self.records:
+                return []
+            scores = np.zeros(len(self.records), dtype=np.float32)
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths / max(self.avg_length, 1e-9))
+            for term in set(tokenize(query)):
+                term_id = self.vocab.get(term)
+                if term_id is None:
+                    continue
+                start, end = self.offsets[term_id], self.offsets[term_id + 1]
+                docs, tf = self.doc_ids[start:end], self.term_freqs[start:end]
+                idf = np.log(1 + (len(self.records) - docs.size + 0.5) / (docs.size + 0.5))
+                np.add.at(scores, docs, idf * tf * (BM25_K1 + 1) / (tf + norm[docs]))
+            hits = np.flatnonzero(scores)
+            if filter:
+                hits = np.array([i for i in hits if matches_filter(self._rows[i]["metadata"], filter)], dtype=np.int64)
+            top = hits[np.argsort(-scores[hits], kind="stable")[:k]]
+            return [
+                (Document(id=self._rows[i]["id"], page_content=self._rows[i]["page_content"], metadata=self._rows[i]["metadata"]), float(scores[i]))
+                for i in top
+            ]
+
+class LexicalSink:
+    """Wraps an ingest sink so every chunk it stores is also indexed in a BM25Index."""
+
+    def __init__(self, sink: Any, index: BM25Index):
+        self.sink = sink
+        self.index = index
+
+    def upsert(self, ids: List[str], vectors: List[List[float]], texts: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        self.sink.upsert(ids, vectors, texts, metadatas)
+        self.index.add(ids, texts, metadatas)
+
+    def delete(self, ids: List[str]) -> None:
+        self.sink.delete(ids)
+        self.index.delete(ids)
+
+    def close(self) -> None:
+        self.sink.close()
+        self.index.save()
+
+def _key(doc: Document) -> str:
+    return doc.id or doc.page_content
+
+class HybridRetriever(BaseRetriever):
+    """Dense and BM25 results merged by reciprocal-rank fusion.
+
+    Each list contributes ``1 / (rrf_k + rank)`` per document; documents are
+    matched across lists by id. The fused score is put in ``metadata["rrf_score"]``.
+    """
+
+    vector_store: VectorStore
+    index: BM25Index
+    k: int = 4
+    fetch_k: int = 20
+    rrf_k: int = RRF_K
+
+    model_config = {"arbitrary_types_allowed": True}
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return [doc for doc, _ in self.search(query)]
+
+    def _candidates(self, query: str, filter: Optional[Dict[str, Any]]) -> Tuple[List[Document], List[Document]]:
+        try:
+            with span("external", "vector_search"):
+                dense = [doc for doc, _ in self.vector_store.similarity_search_with_score(query=query, k=self.fetch_k, filter=filter)]
+        except Exception as e:
+            logger.error("[Hybrid] Vector search failed, using BM25 alone: %s", str(e))
+            dense = []
+        with span("external", "bm25"):
+            self.index.reload_if_changed()
+            lexical = [doc for doc, _ in self.index.search(query, k=self.fetch_k, filter=filter)]
+        return dense, lexical
+
+    def search(self, query: str, k: Optional[int] = None, filter: Optional[Dict[str, Any]] = None) -> List[Tuple[Document, float]]:
+        k = k or self.k
+        dense, lexical = self._candidates(query, filter)
+        if filter and not dense and not lexical:
+            # Unannotated chunks already pass the filter; anything else would be for another state.
+            logger.warning("[Hybrid] Nothing matched filter %s", filter)
+
+        scores: Dict[str, float] = {}
+        documents: Dict[str, Document] = {}
+        for ranking in (dense, lexical):
+            for rank, doc in enumerate(ranking):
+                key = _key(doc)
+                scores[key] = scores.get(key, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+                documents.setdefault(key, doc)
+        fused = sorted(scores, key=scores.get, reverse=True)[:k]
+        logger.info("[Hybrid] %d dense + %d BM25 hits fused into %d", len(dense), len(lexical), len(fused))
+        return [
+            (Document(id=documents[key].id, page_content=documents[key].page_content, metadata={**documents[key].metadata, "rrf_score": scores[key]}), scores[key])
+            for key in fused
+        ]
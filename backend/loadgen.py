@@ -0,0 +1,269 @@
+"""
+Synthetic traffic for load-testing the recommendations API.
+
+    python loadgen.py generate --count 500 --rate 4 --out data/load.jsonl
+    python loadgen.py serve --port 8001                  # api.py under uvicorn, backed by bench's fakes
+    python loadgen.py replay data/load.jsonl --url http://127.0.0.1:8001 --concurrency 32
+    python loadgen.py replay data/requests.jsonl --speed 2   # a log recorded with REQUEST_LOG_PATH
+
+``generate`` draws /api/recommendations bodies from rough shares of Indian
+farm holdings: states weighted by their number of holdings, mostly small
+plots quoted in hectares or acres, and crops, irrigation, caste category and
+income drawn per profile. Arrival times are a Poisson process at ``--rate``.
+
+``replay`` is open loop: every request is sent at its scheduled time whether
+or not earlier ones have finished, and latency is counted from that time, so
+requests waiting for a free client thread show up as latency rather than as
+a lower send rate.
+"""
+import json
+import time
+import logging
+import argparse
+import threading
+import numpy as np
+import requests
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+from request_log import read_request_log, write_request_log
+from bench import add_fake_arguments, install_fakes
+
+logger = logging.getLogger(__name__)
+
+# Share of holdings, districts and main crops (most grown first) per state.
+STATES = {
+    "Uttar Pradesh": (23.8, ["Varanasi", "Gorakhpur", "Bareilly", "Agra", "Sitapur"], ["wheat", "rice", "sugarcane", "potato", "mustard"]),
+    "Bihar": (16.4, ["Patna", "Gaya", "Muzaffarpur", "Purnia"], ["rice", "wheat", "maize", "pulses"]),
+    "Maharashtra": (15.3, ["Pune", "Nashik", "Nagpur", "Solapur", "Latur"], ["soybean", "cotton", "sugarcane", "jowar", "onion", "grapes"]),
+    "Madhya Pradesh": (10.0, ["Indore", "Sehore", "Jabalpur", "Ujjain"], ["soybean", "wheat", "gram", "maize"]),
+    "Karnataka": (8.7, ["Raichur", "Belagavi", "Mandya", "Dharwad"], ["ragi", "rice", "cotton", "maize", "sugarcane"]),
+    "Andhra Pradesh": (8.5, ["Guntur", "Krishna", "Kurnool", "Anantapur"], ["rice", "groundnut", "cotton", "banana"]),
+    "Tamil Nadu": (7.9, ["Thanjavur", "Coimbatore", "Madurai", "Salem"], ["rice", "coconut", "sugarcane", "banana"]),
+    "Rajasthan": (7.7, ["Jaipur", "Bikaner", "Kota", "Nagaur"], ["bajra", "mustard", "wheat", "gram"]),
+    "Kerala": (7.6, ["Palakkad", "Thrissur", "Wayanad"], ["coconut", "rubber", "rice", "spices"]),
+    "West Bengal": (7.2, ["Bardhaman", "Nadia", "Murshidabad", "Hooghly"], ["rice", "jute", "potato", "vegetables"]),
+    "Telangana": (6.0, ["Warangal", "Nalgonda", "Karimnagar"], ["cotton", "rice", "maize"]),
+    "Gujarat": (5.3, ["Rajkot", "Banaskantha", "Junagadh", "Anand"], ["cotton", "groundnut", "wheat"]),
+    "Odisha": (4.9, ["Cuttack", "Sambalpur", "Balasore"], ["rice", "pulses", "vegetables"]),
+    "Chhattisgarh": (4.0, ["Raipur", "Durg", "Bilaspur"], ["rice", "maize", "pulses"]),
+    "Jharkhand": (2.8, ["Ranchi", "Hazaribagh", "Dumka"], ["rice", "maize", "vegetables"]),
+    "Assam": (2.7, ["Nagaon", "Barpeta", "Dibrugarh"], ["rice", "tea", "jute"]),
+    "Haryana": (1.6, ["Karnal", "Hisar", "Sirsa"], ["wheat", "rice", "mustard", "cotton"]),
+    "Punjab": (1.1, ["Ludhiana", "Bathinda", "Amritsar", "Patiala"], ["wheat", "rice", "cotton", "maize"])
+}
+IRRIGATION = {"rain-fed": 0.48, "tube well": 0.22, "canal": 0.15, "well": 0.07, "drip": 0.05, "sprinkler": 0.03}
+# States where most cropped area is irrigated.
+IRRIGATED_STATES = {"Punjab", "Haryana", "Uttar Pradesh"}
+CASTE_CATEGORIES = {"general": 0.28, "obc": 0.45, "sc": 0.18, "st": 0.09}
+OWNERSHIP = {"owned": 0.83, "leased": 0.13, "sharecropped": 0.04}
+EXISTING_SCHEMES = {"none": 0.5, "pm-kisan": 0.35, "pmfby": 0.08, "pm-kisan, pmfby": 0.07}
+BANK_ACCOUNT_RATE = 0.93
+# Holdings are log-normal: median 0.6 ha, close to 90% under 2 ha.
+LAND_MEDIAN_HECTARES = 0.6
+LAND_SIGMA = 0.9
+ACRES_PER_HECTARE = 2.471
+VILLAGE_PREFIXES = ["ram", "sita", "kish", "nand", "sona", "hari", "shiv", "dev", "chand", "lakh"]
+VILLAGE_SUFFIXES = ["pur", "gaon", "wadi", "nagar", "palli", "halli", "garh", "kheda"]
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+LATE_AFTER = 0.1  # A request sent this many seconds after its slot means the client fell behind
+
+def _choice(rng: np.random.Generator, weights: Dict[str, float]) -> str:
+    p = np.array(list(weights.values()), dtype=np.float64)
+    return str(rng.choice(list(weights), p=p / p.sum()))
+
+def _land_size(rng: np.random.Generator) -> str:
+    hectares = float(np.clip(rng.lognormal(np.log(LAND_MEDIAN_HECTARES), LAND_SIGMA), 0.1, 25))
+    style = rng.integers(4)
+    if style == 0:
+        return f"{hectares:.1f} hectares"
+    if style == 1:
+        return f"{hectares:.2f} ha"
+    acres = round(hectares * ACRES_PER_HECTARE * 2) / 2 or 0.5
+    return f"{acres:g} acre" if acres == 1 else f"{acres:g} acres"
+
+def _income(rng: np.random.Generator, land: str) -> str:
+    hectares = float(land.split()[0]) / (ACRES_PER_HECTARE if "acre" in land else 1)
+    income = int(round((50000 + 60000 * hectares) * rng.lognormal(0, 0.4), -3))
+    if rng.random() < 0.5:
+        return str(income)
+    # Indian digit grouping, e.g. 1,50,000.
+    head, tail = str(income)[:-3], str(income)[-3:]
+    groups = [head[max(0, i - 2):i] for i in range(len(head), 0, -2)][::-1]
+    return ",".join(groups + [tail]) if head else tail
+
+def generate_profile(rng: np.random.Generator) -> Dict[str, str]:
+    state = _choice(rng, {name: share for name, (share, _, _) in STATES.items()})
+    _, districts, crops = STATES[state]
+    irrigation = dict(IRRIGATION, **({"rain-fed": 0.1} if state in IRRIGATED_STATES else {}))
+    land_size = _land_size(rng)
+    return {
+        "village": str(rng.choice(VILLAGE_PREFIXES)) + str(rng.choice(VILLAGE_SUFFIXES)),
+        "district": str(rng.choice(districts)),
+        "state": state,
+        "land_size": land_size,
+        "ownership": _choice(rng, OWNERSHIP),
+        "crop_type": _choice(rng, {crop: 1 / (rank + 1) for rank, crop in enumerate(crops)}),
+        "irrigation": _choice(rng, irrigation),
+        "income": _income(rng, land_size),
+        "caste_category": _choice(rng, CASTE_CATEGORIES),
+        "bank_account": "yes" if rng.random() < BANK_ACCOUNT_RATE else "no",
+        "existing_schemes": _choice(rng, EXISTING_SCHEMES)
+    }
+
+def generate_requests(count: int, rate: float, seed: int = 0, invalid_rate: float = 0.0) -> List[Dict[str, Any]]:
+    """Request-log entries for /api/recommendations, with Poisson arrivals at ``rate`` per second.
+
+    An ``invalid_rate`` fraction of profiles lack their district, to exercise the 400 path.
+    """
+    rng = np.random.default_rng(seed)
+    arrivals = np.cumsum(rng.exponential(1 / rate, count)) if rate > 0 else np.zeros(count)
+    arrivals -= arrivals[0] if count else 0.0
+    entries = []
+    for ts in arrivals:
+        profile = generate_profile(rng)
+        if rng.random() < invalid_rate:
+            del profile["district"]
+        entries.append({"ts": round(float(ts), 3), "path": "/api/recommendations", "status": None, "body": {"profile": profile}})
+    return entries
+
+@dataclass
+class Outcome:
+    path: str
+    status: str  # HTTP status code, or the exception class for requests that got no response
+    latency: float  # From the scheduled send time
+    service_time: float  # From the actual send time
+    lag: float  # Actual minus scheduled send time
+
+def _session(local: threading.local) -> requests.Session:
+    if not hasattr(local, "session"):
+        local.session = requests.Session()
+    return local.session
+
+def replay(
+    entries: List[Dict[str, Any]],
+    base_url: str,
+    concurrency: int = 16,
+    speed: float = 1.0,
+    rate: Optional[float] = None,
+    timeout: float = 60.0,
+    seed: int = 0
+) -> List[Outcome]:
+    """Send ``entries`` to ``base_url`` on their recorded schedule (divided by ``speed``) or at a fixed Poisson ``rate``."""
+    if rate:
+        offsets = np.cumsum(np.random.default_rng(seed).exponential(1 / rate, len(entries)))
+    else:
+        offsets = np.array([entry["offset"] for entry in entries], dtype=np.float64) / speed
+    local = threading.local()
+    outcomes: List[Optional[Outcome]] = [None] * len(entries)
+    start = time.perf_counter()
+
+    def send(i: int, entry: Dict[str, Any], scheduled: float) -> None:
+        sent = time.perf_counter()
+        try:
+            response = _session(local).post(base_url.rstrip("/") + entry["path"], json=entry["body"], timeout=timeout)
+            if entry["path"].endswith("/stream"):
+                for _ in response.iter_content(chunk_size=None):
+                    pass
+            status = str(response.status_code)
+        except requests.RequestException as e:
+            status = type(e).__name__
+        done = time.perf_counter()
+        outcomes[i] = Outcome(entry["path"], status, done - scheduled, done - sent, sent - scheduled)
+
+    logger.info("[Load] Replaying %d requests over %.1fs against %s", len(entries), offsets[-1] if len(entries) else 0.0, base_url)
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="load") as executor:
+        for i, (entry, offset) in enumerate(zip(entries, offsets)):
+            delay = start + offset - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(send, i, entry, start + offset)
+    return [outcome for outcome in outcomes if outcome is not None]
+
+def _percentiles(values: np.ndarray) -> Dict[str, float]:
+    if not values.size:
+        return {}
+    return {f"p{q}": round(float(v), 3) for q, v in zip((50, 95, 99), np.percentile(values, [50, 95, 99]))}
+
+def summarize(outcomes: List[Outcome], seconds: float) -> Dict[str, Any]:
+    latencies = np.array([o.latency for o in outcomes], dtype=np.float64)
+    service = np.array([o.service_time for o in outcomes], dtype=np.float64)
+    counts = np.histogram(latencies, bins=(0,) + LATENCY_BUCKETS + (np.inf,))[0]
+    return {
+        "requests": len(outcomes),
+        "seconds": round(seconds, 2),
+        "requests_per_second": round(len(outcomes) / seconds, 2) if seconds else 0.0,
+        "latency": {**_percentiles(latencies), "max": round(float(latencies.max()), 3) if latencies.size else None},
+        "service_time": _percentiles(service),
+        "late_sends": sum(1 for o in outcomes if o.lag > LATE_AFTER),
+        "statuses": dict(Counter(o.status for o in outcomes).most_common()),
+        "latency_histogram": {**{f"<={bound}s": int(n) for bound, n in zip(LATENCY_BUCKETS, counts)}, f">{LATENCY_BUCKETS[-1]}s": int(counts[-1])}
+    }
+
+def print_summary(summary: Dict[str, Any]) -> None:
+    print(f"Requests: {summary['requests']} in {summary['seconds']}s ({summary['requests_per_second']} req/s), {summary['late_sends']} sent late")
+    print(f"Latency:  {summary['latency']}")
+    print(f"Service:  {summary['service_time']}")
+    print(f"Statuses: {summary['statuses']}")
+    width = max(summary["latency_histogram"].values() or [1]) or 1
+    for bucket, n in summary["latency_histogram"].items():
+        print(f"  {bucket:>8} {n:>6} {'#' * round(40 * n / width)}")
+
+def serve_with_fakes(args: argparse.Namespace) -> None:
+    """Run api.py as serve.py does, with every outside service replaced by bench's fakes."""
+    import uvicorn
+
+    sites = install_fakes(args)
+    # Imported after the fakes are installed, so the warm-up thread finds them.
+    from serve import DrainingServer, SHUTDOWN_GRACE_PERIOD, asgi_app
+
+    try:
+        DrainingServer(uvicorn.Config(asgi_app, host=args.host, port=args.port, timeout_graceful_shutdown=SHUTDOWN_GRACE_PERIOD, log_level="warning")).run()
+    finally:
+        sites.stop()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] [%(name)s] - %(message)s")
+    parser = argparse.ArgumentParser(description="Generate and replay FarmWise API traffic.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate = commands.add_parser("generate", help="Write synthetic /api/recommendations requests as a request log.")
+    generate.add_argument("--count", type=int, default=500)
+    generate.add_argument("--rate", type=float, default=2.0, help="Mean arrivals per second")
+    generate.add_argument("--seed", type=int, default=0)
+    generate.add_argument("--invalid-rate", type=float, default=0.0, help="Fraction of profiles missing a required field")
+    generate.add_argument("--out", required=True)
+
+    replay_parser = commands.add_parser("replay", help="Send a request log to a server, open loop.")
+    replay_parser.add_argument("log")
+    replay_parser.add_argument("--url", default="http://127.0.0.1:8000")
+    replay_parser.add_argument("--concurrency", type=int, default=32, help="Client threads")
+    replay_parser.add_argument("--speed", type=float, default=1.0, help="Replay the recorded schedule this many times faster")
+    replay_parser.add_argument("--rate", type=float, help="Ignore the recorded schedule and send at this Poisson rate")
+    replay_parser.add_argument("--limit", type=int, help="Send only the first N requests")
+    replay_parser.add_argument("--timeout", type=float, default=60.0)
+    replay_parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+
+    serve_parser = commands.add_parser("serve", help="Run the API against latency-injecting fakes.")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8001)
+    serve_parser.set_defaults(workflow="workflow")
+    add_fake_arguments(serve_parser)
+
+    args = parser.parse_args()
+    if args.command == "generate":
+        entries = generate_requests(args.count, args.rate, args.seed, args.invalid_rate)
+        write_request_log(args.out, entries)
+        print(f"Wrote {len(entries)} requests over {entries[-1]['ts'] if entries else 0:.0f}s to {args.out}")
+    elif args.command == "replay":
+        entries = read_request_log(args.log)[:args.limit]
+        started = time.perf_counter()
+        outcomes = replay(entries, args.url, args.concurrency, args.speed, args.rate, args.timeout)
+        summary = summarize(outcomes, time.perf_counter() - started)
+        if args.json:
+            print(json.dumps(summary, indent=2))
+        else:
+            print_summary(summary)
+    else:
+        serve_with_fakes(args)
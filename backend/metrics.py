@@ -0,0 +1,147 @@
+"""
+Timing spans and Prometheus metrics for the recommendation pipeline.
+
+``span(kind, name)`` times a block: graph nodes ("node"), retrieval sources
+("source") and calls to outside services ("external": tavily, scrape,
+vector_search, bm25, embedding, llm). Every span feeds the
+``farmwise_stage_seconds`` histogram and, inside ``collect_spans()``, is also
+recorded for the current request so it can be returned as a breakdown.
+
+Metrics live in the default registry of each process; with several uvicorn
+workers, each worker exposes its own counters on /metrics.
+"""
+import time
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+from prometheus_client import Counter, Histogram, REGISTRY
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from cache import live_caches
+
+logger = logging.getLogger(__name__)
+
+STAGE_SECONDS = Histogram(
+    "farmwise_stage_seconds", "Time spent in one pipeline stage.", ["kind", "name"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40)
+)
+REQUEST_SECONDS = Histogram(
+    "farmwise_request_seconds", "End-to-end API request latency.", ["endpoint", "status"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+)
+LLM_CALLS_PER_WORKFLOW = Histogram(
+    "farmwise_llm_calls_per_workflow", "LLM calls made by one workflow run.", buckets=(0, 1, 2, 3, 4, 6, 8)
+)
+WORKFLOWS = Counter("farmwise_workflows_total", "Workflow runs by outcome.", ["outcome"])
+LLM_CALLS = Counter("farmwise_llm_calls_total", "LLM calls by graph node.", ["node"])
+SOURCE_FAILURES = Counter("farmwise_source_failures_total", "Retrieval sources that failed or missed their deadline.", ["source", "reason"])
+
+_spans: ContextVar[Optional[List[Tuple[str, str, float]]]] = ContextVar("farmwise_spans", default=None)
+
+@contextmanager
+def span(kind: str, name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(kind, name, time.perf_counter() - start)
+
+def record_span(kind: str, name: str, seconds: float) -> None:
+    STAGE_SECONDS.labels(kind, name).observe(seconds)
+    spans = _spans.get()
+    if spans is not None:
+        spans.append((kind, name, seconds))
+
+@contextmanager
+def collect_spans() -> Iterator[List[Tuple[str, str, float]]]:
+    """Collect the spans recorded in this context (and copies of it) into a list."""
+    spans: List[Tuple[str, str, float]] = []
+    token = _spans.set(spans)
+    try:
+        yield spans
+    finally:
+        try:
+            _spans.reset(token)
+        except ValueError:
+            # A generator resumed in another context (e.g. a streamed response) cannot reset its token.
+            _spans.set(None)
+
+def breakdown(spans: List[Tuple[str, str, float]]) -> Dict[str, float]:
+    """Total milliseconds per "kind:name", e.g. {"node:web_search": 812.4, "external:tavily": 640.2}."""
+    totals: Dict[str, float] = {}
+    for kind, name, seconds in spans:
+        key = f"{kind}:{name}"
+        totals[key] = totals.get(key, 0.0) + seconds * 1000
+    return {key: round(ms, 1) for key, ms in totals.items()}
+
+def instrument_node(name: str, fn: Callable[[Any], Dict[str, Any]]) -> Callable[[Any], Dict[str, Any]]:
+    """Wrap a LangGraph node so each run is timed as a "node" span."""
+    def node(state: Any) -> Dict[str, Any]:
+        with span("node", name):
+            return fn(state)
+    node.__name__ = getattr(fn, "__name__", name)
+    return node
+
+def record_workflow(state: Dict[str, Any], outcome: str = "completed") -> None:
+    WORKFLOWS.labels(outcome).inc()
+    if state.get("cache_hit"):
+        WORKFLOWS.labels("cache_hit").inc()
+    LLM_CALLS_PER_WORKFLOW.observe(state.get("llm_calls", 0))
+
+class LLMMetricsHandler(BaseCallbackHandler):
+    """LangChain callback that times every chat model call as an "external:llm" span."""
+
+    def __init__(self):
+        self._starts: Dict[UUID, Tuple[float, str]] = {}
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: Any, *, run_id: UUID, metadata: Optional[Dict[str, Any]] = None, **kwargs: Any) -> None:
+        self._starts[run_id] = (time.perf_counter(), (metadata or {}).get("langgraph_node", "other"))
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id)
+
+    def _finish(self, run_id: UUID) -> None:
+        started = self._starts.pop(run_id, None)
+        if started is None:
+            return
+        start, node = started
+        LLM_CALLS.labels(node).inc()
+        record_span("external", "llm", time.perf_counter() - start)
+
+class _StateCollector:
+    """Exports counters that other modules already keep: cache stats and refine paths."""
+
+    def collect(self):
+        from validation import refine_path_counts
+
+        totals: Dict[str, Dict[str, int]] = {}
+        for cache in live_caches():
+            stats = cache.stats()
+            total = totals.setdefault(stats["name"], {"hits": 0, "misses": 0, "evictions": 0, "size": 0, "stale": 0, "refreshes": 0, "refresh_failures": 0})
+            for key in total:
+                total[key] += stats.get(key, 0)
+        hits = CounterMetricFamily("farmwise_cache_hits", "Cache hits, including stale values served.", labels=["cache"])
+        misses = CounterMetricFamily("farmwise_cache_misses", "Cache misses.", labels=["cache"])
+        evictions = CounterMetricFamily("farmwise_cache_evictions", "Cache evictions.", labels=["cache"])
+        size = GaugeMetricFamily("farmwise_cache_entries", "Entries held in memory.", labels=["cache"])
+        stale = CounterMetricFamily("farmwise_cache_stale_hits", "Stale values served while a background refresh runs.", labels=["cache"])
+        refreshes = CounterMetricFamily("farmwise_cache_refreshes", "Background refreshes by outcome.", labels=["cache", "outcome"])
+        for name, total in totals.items():
+            hits.add_metric([name], total["hits"])
+            misses.add_metric([name], total["misses"])
+            evictions.add_metric([name], total["evictions"])
+            size.add_metric([name], total["size"])
+            stale.add_metric([name], total["stale"])
+            refreshes.add_metric([name, "ok"], total["refreshes"])
+            refreshes.add_metric([name, "failed"], total["refresh_failures"])
+        refine = CounterMetricFamily("farmwise_refine_paths", "Drafts by what happened after recommendation_node.", labels=["path"])
+        for path, count in refine_path_counts().items():
+            refine.add_metric([path], count)
+        return [hits, misses, evictions, size, stale, refreshes, refine]
+
+REGISTRY.register(_StateCollector())
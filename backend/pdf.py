@@ -1,9 +1,11 @@
+import itertools
 import streamlit as st
-from PyPDF2 import PdfReader
 from pinecone import Pinecone, ServerlessSpec
 from langchain_pinecone import PineconeVectorStore
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_cohere import CohereEmbeddings
+from vectorstore import LocalVectorStore, VECTOR_BACKEND, LOCAL_INDEX_PATH
+from ingest import LocalSink, PineconeSink, iter_annotated_pdf_chunks, sync_document
+from lexical import BM25_INDEX_PATH, BM25Index, LexicalSink
 import logging
 import os
 from dotenv import load_dotenv
@@ -53,6 +55,8 @@ with st.sidebar:
     st.header("Pinecone Settings")
     index_name = "farmwise-ai"
     st.write(f"Using Pinecone index: {index_name}")
+    if VECTOR_BACKEND == "local":
+        st.write(f"VECTOR_BACKEND=local: chunks go to {LOCAL_INDEX_PATH} instead")
     st.write(f"Using host: {PINECONE_HOST}")
     create_index = st.checkbox("Recreate index if it doesn't exist", value=False, help="Only enable if you want to overwrite the existing index.")
     dimension = 1024  # Matches Cohere embed-english-v3.0
@@ -100,40 +104,59 @@ def init_pinecone_index(index_name, dimension):
         st.error(f"Error initializing Pinecone index: {e}")
         return None
 
-# Function to extract text from PDF
-def extract_pdf_text(pdf_file):
+# Function to stream annotated chunks out of the PDF; returns None if it has no text
+def load_and_split_documents(pdf_file):
     try:
-        logger.debug(f"Extracting text from PDF: {pdf_file.name}")
-        pdf_reader = PdfReader(pdf_file)
-        text = ""
-        for page_num, page in enumerate(pdf_reader.pages, 1):
-            page_text = page.extract_text()
-            if page_text:
-                text += page_text + "\n"
-                logger.debug(f"Extracted text from page {page_num}")
-        if not text.strip():
-            logger.warning("No extractable text found in the PDF.")
-            st.warning("No extractable text found in the PDF.")
-            return None
-        logger.info(f"Successfully extracted text from PDF: {len(text)} characters")
-        return text
+        logger.debug(f"Extracting and splitting PDF: {pdf_file.name}")
+        documents = iter_annotated_pdf_chunks(pdf_file, source=pdf_file.name)
+        # An empty stream would mark every indexed chunk of this document stale.
+        first = next(documents, None)
     except Exception as e:
         logger.error(f"Error extracting text from PDF: {e}")
         st.error(f"Error extracting text from PDF: {e}")
         return None
-
-# Function to load and split documents
-def load_and_split_documents(pdf_file):
-    text = extract_pdf_text(pdf_file)
-    if not text:
+    if first is None:
+        logger.warning("No extractable text found in the PDF.")
+        st.warning("No extractable text found in the PDF.")
         return None
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=8000,
-        chunk_overlap=200
-    )
-    documents = text_splitter.create_documents([text])
-    logger.info(f"Split document into {len(documents)} chunks.")
-    return documents
+    return itertools.chain([first], documents)
+
+# Function to embed and upsert the changed chunks of a document through the ingestion pipeline
+def store_documents(source, documents, sink, target):
+    # documents is a stream: pages are extracted, split and annotated as the pipeline consumes them
+    logger.debug("Initializing Cohere embeddings...")
+    try:
+        embeddings = CohereEmbeddings(cohere_api_key=COHERE_API_KEY, model="embed-english-v3.0")
+        logger.info("Cohere embeddings initialized successfully.")
+    except Exception as e:
+        logger.error(f"Error initializing Cohere embeddings: {e}")
+        st.error(f"Error initializing Cohere embeddings: {e}")
+        return False
+
+    progress_bar = st.progress(0.0, text=f"Extracting and storing {source}...")
+
+    def report(stats):
+        done = stats["upserted"] + stats["failed"]
+        progress_bar.progress(min(done / max(stats["chunks"], 1), 1.0), text=f"Stored {stats['upserted']} changed chunks")
+
+    logger.debug(f"Storing embeddings in {target}...")
+    try:
+        stats = sync_document(source, documents, embeddings, sink, progress=report)
+        sink.close()
+    except Exception as e:
+        logger.error(f"Error storing embeddings in {target}: {e}")
+        st.error(f"Error storing embeddings in {target}: {e}")
+        return False
+
+    total = stats["total"]
+    if stats["failed"]:
+        logger.error(f"{stats['failed']} of {stats['new']} changed chunks could not be stored in {target} after retries.")
+        st.error(f"{stats['failed']} of {stats['new']} changed chunks could not be stored in {target} after retries.")
+        return False
+    summary = f"{stats['new']} new, {stats['unchanged']} unchanged, {stats['deleted']} removed"
+    logger.info(f"Successfully synced {total} chunks in {target} ({summary}).")
+    st.success(f"Successfully synced {total} chunks in {target} ({summary}).")
+    return True
 
 # Function to process PDF and store embeddings
 def process_and_store_pdf(pdf_file, index_name):
@@ -145,6 +168,10 @@ def process_and_store_pdf(pdf_file, index_name):
             logger.error("PDF processing aborted due to document loading failure.")
             return False
 
+        if VECTOR_BACKEND == "local":
+            sink = LexicalSink(LocalSink(LocalVectorStore.load(LOCAL_INDEX_PATH, embedding=None)), BM25Index.load(BM25_INDEX_PATH))
+            return store_documents(pdf_file.name, documents, sink, f"local index '{LOCAL_INDEX_PATH}'")
+
         logger.debug("Initializing Pinecone vector store...")
         vector_store = init_pinecone_index(index_name, dimension)
         if not vector_store:
@@ -152,30 +179,8 @@ def process_and_store_pdf(pdf_file, index_name):
             return False
         logger.info("Pinecone vector store initialized successfully.")
 
-        logger.debug("Initializing Cohere embeddings...")
-        try:
-            embeddings = CohereEmbeddings(cohere_api_key=COHERE_API_KEY, model="embed-english-v3.0")
-            logger.info("Cohere embeddings initialized successfully.")
-        except Exception as e:
-            logger.error(f"Error initializing Cohere embeddings: {e}")
-            st.error(f"Error initializing Cohere embeddings: {e}")
-            return False
-
-        logger.debug("Storing embeddings in Pinecone...")
-        try:
-            # Update the vector store with embeddings
-            vector_store = PineconeVectorStore.from_documents(
-                documents=documents,
-                index_name=index_name,
-                embedding=embeddings
-            )
-            logger.info(f"Successfully stored {len(documents)} chunks in Pinecone index '{index_name}'.")
-            st.success(f"Successfully stored {len(documents)} chunks in Pinecone index '{index_name}'.")
-            return True
-        except Exception as e:
-            logger.error(f"Error storing embeddings in Pinecone: {e}")
-            st.error(f"Error storing embeddings in Pinecone: {e}")
-            return False
+        sink = LexicalSink(PineconeSink(pc.Index(index_name)), BM25Index.load(BM25_INDEX_PATH))
+        return store_documents(pdf_file.name, documents, sink, f"Pinecone index '{index_name}'")
 
 # Main app logic
 def main():
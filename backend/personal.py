@@ -1,6 +1,8 @@
 import streamlit as st
 from dotenv import load_dotenv
-from workflow import run_workflow, FarmerState
+from workflow import run_workflow, revise_recommendations, FarmerState
+from validation import split_sections
+from charts import get_chart
 
 load_dotenv()   
 
@@ -31,6 +33,14 @@ with st.sidebar.form(key="farmer_form"):
 
     submit_button = st.form_submit_button(label="Get Recommendations")
 
+def reject_section(title: str) -> None:
+    # Only the rejected section is regenerated, from the profile and schemes kept in the session.
+    with st.spinner(f"Finding an alternative to {title}..."):
+        try:
+            st.session_state["result"] = revise_recommendations(st.session_state["result"], title)
+        except Exception as e:
+            st.session_state["error"] = str(e)
+
 if submit_button:
     if not all([district, state, land_size, crop_type]):
         st.error("Please fill all required fields (marked with *)!")
@@ -57,26 +67,28 @@ if submit_button:
                 "visuals": []
             }
 
+            st.session_state.pop("error", None)
             try:
-                result = run_workflow(initial_state)
-                st.subheader("Your Personalized Scheme Recommendations")
+                # Keeps the analysed profile and retrieved schemes for feedback on this answer.
+                st.session_state["result"] = run_workflow(initial_state)
+            except Exception as e:
+                st.session_state.pop("result", None)
+                st.session_state["error"] = str(e)
 
-                sections = result["recommendations"].split("##")[1:]
-                for section in sections:
-                    if section.strip():
-                        title = section.split("\n")[0].strip()
-                        content = "\n".join(section.split("\n")[1:]).strip()
-                        with st.expander(f"🌟 {title}", expanded=True):
-                            st.markdown(content)
-                            if st.button("Not Useful", key=title):
-                                initial_state["feedback"] = f"Not useful: {title}"
-                                result = run_workflow(initial_state)
-                                st.rerun() 
+if "error" in st.session_state:
+    st.error(f"An error occurred: {st.session_state.pop('error')}")
+    st.write("Check your inputs or API keys and try again.")
 
-                if result["visuals"]:
-                    st.image(f"data:image/png;base64,{result['visuals'][0]}", caption="Subsidy Breakdown")
-                
-                st.info("Tip: Add your village or update details for more tailored suggestions!")
-            except Exception as e:
-                st.error(f"An error occurred: {str(e)}")
-                st.write("Check your inputs or API keys and try again.")
+result = st.session_state.get("result")
+if result:
+    st.subheader("Your Personalized Scheme Recommendations")
+
+    for i, (title, content) in enumerate(split_sections(result["recommendations"])):
+        with st.expander(f"🌟 {title}", expanded=True):
+            st.markdown(content.strip())
+            st.button("Not Useful", key=f"not-useful-{i}", on_click=reject_section, args=(title,))
+
+    if result["visuals"]:
+        st.image(get_chart(result["visuals"][0]), caption="Subsidy Breakdown")
+
+    st.info("Tip: Add your village or update details for more tailored suggestions!")
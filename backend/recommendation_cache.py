@@ -0,0 +1,75 @@
+import os
+import json
+import hashlib
+import logging
+from langchain_core.documents import Document
+from typing import Any, Dict, List, Optional
+from cache import DiskStore, LRUCache
+
+logger = logging.getLogger(__name__)
+
+RECOMMENDATION_CACHE_TTL = float(os.getenv("RECOMMENDATION_CACHE_TTL", str(12 * 3600)))
+RECOMMENDATION_CACHE_SIZE = int(os.getenv("RECOMMENDATION_CACHE_SIZE", "2048"))
+RECOMMENDATION_CACHE_PATH = os.getenv("RECOMMENDATION_CACHE_PATH", "")
+
+# Fields that decide which schemes a farmer is eligible for. Everything else in
+# the profile (village, district, bank account, ...) does not change the answer.
+FINGERPRINT_FIELDS = ["state", "crop_type", "farmer_type", "needs_insurance", "irrigation", "caste_category", "land_ownership"]
+
+# Upper bounds of each income band, in rupees per year.
+INCOME_BANDS = [(100000, "<1L"), (250000, "1L-2.5L"), (500000, "2.5L-5L"), (1000000, "5L-10L")]
+
+recommendation_cache = LRUCache(
+    max_entries=RECOMMENDATION_CACHE_SIZE,
+    ttl=RECOMMENDATION_CACHE_TTL,
+    store=DiskStore(RECOMMENDATION_CACHE_PATH, table="recommendations") if RECOMMENDATION_CACHE_PATH else None,
+    name="recommendations"
+)
+
+def income_band(income: Any) -> str:
+    try:
+        amount = float(str(income).replace(",", "").strip())
+    except ValueError:
+        return "unknown"
+    for limit, band in INCOME_BANDS:
+        if amount < limit:
+            return band
+    return ">10L"
+
+def profile_fingerprint(profile: Dict[str, str]) -> str:
+    """Canonical hash of the eligibility-relevant part of an analysed profile."""
+    canonical = {field: str(profile.get(field, "")).strip().lower() for field in FINGERPRINT_FIELDS}
+    canonical["income_band"] = income_band(profile.get("income", ""))
+    return hashlib.sha256(json.dumps(canonical, sort_keys=True).encode("utf-8")).hexdigest()
+
+def schemes_fingerprint(schemes: List[Document]) -> str:
+    identities = sorted(
+        "|".join([
+            doc.metadata.get("source", ""),
+            doc.metadata.get("url", ""),
+            doc.metadata.get("title", ""),
+            hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest()
+        ])
+        for doc in schemes
+    )
+    return hashlib.sha256("\n".join(identities).encode("utf-8")).hexdigest()
+
+def cache_key(profile: Dict[str, str], schemes: List[Document]) -> str:
+    return f"{profile_fingerprint(profile)}:{schemes_fingerprint(schemes)}"
+
+def should_bypass(state: Dict[str, Any]) -> bool:
+    # Feedback asks for a different answer, so it must never be served from cache.
+    return bool(state.get("bypass_cache") or state.get("feedback"))
+
+def lookup_recommendations(state: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    if should_bypass(state):
+        return None
+    return recommendation_cache.get(cache_key(state["profile"], state["schemes"]))
+
+def store_recommendations(state: Dict[str, Any], recommendations: str, visuals: List[str]) -> None:
+    if should_bypass(state):
+        return
+    recommendation_cache.put(
+        cache_key(state["profile"], state["schemes"]),
+        {"recommendations": recommendations, "visuals": visuals}
+    )
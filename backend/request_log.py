@@ -0,0 +1,59 @@
+"""
+Recorded API traffic, for replay with ``loadgen.py replay``.
+
+With REQUEST_LOG_PATH set, api.py appends one JSON line per POST to the
+recommendation and eligibility routes: wall-clock time, path, response status
+and the request body. Profiles are written as sent, so only enable it where
+storing them is allowed. ``loadgen.py generate`` writes files in the same
+format, with times counted from zero.
+"""
+import os
+import json
+import time
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+REQUEST_LOG_PATH = os.getenv("REQUEST_LOG_PATH", "")
+LOGGED_PATHS = ("/api/recommendations", "/api/recommendations/stream", "/api/recommendations/batch", "/api/eligibility")
+
+class RequestLog:
+    """Appends requests to a JSON-lines file. Safe to share between threads and, since every line is one append, between workers."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        logger.info("[Request Log] Recording requests to %s", path)
+
+    def record(self, path: str, body: Any, status: Optional[int] = None) -> None:
+        line = json.dumps({"ts": round(time.time(), 3), "path": path, "status": status, "body": body}, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+def read_request_log(path: str) -> List[Dict[str, Any]]:
+    """Entries in time order, with ``offset`` in seconds since the first one."""
+    with open(path, encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    entries.sort(key=lambda entry: entry["ts"])
+    start = entries[0]["ts"] if entries else 0.0
+    for entry in entries:
+        entry["offset"] = entry["ts"] - start
+    return entries
+
+def write_request_log(path: str, entries: Iterable[Dict[str, Any]]) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+request_log = RequestLog(REQUEST_LOG_PATH) if REQUEST_LOG_PATH else None
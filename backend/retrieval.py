@@ -0,0 +1,156 @@
+import os
+import re
+import json
+import time
+import logging
+import requests
+from functools import partial
+from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from langchain_core.documents import Document
+from typing import Any, Callable, Dict, List, Optional
+from contextvars import copy_context
+from cache import DiskStore, LRUCache, StaleWhileRevalidateCache
+from metrics import SOURCE_FAILURES, span
+
+logger = logging.getLogger(__name__)
+
+RETRIEVAL_DEADLINE = float(os.getenv("RETRIEVAL_DEADLINE", "6"))
+SOURCE_TIMEOUT = float(os.getenv("RETRIEVAL_SOURCE_TIMEOUT", "4"))
+RETRIEVAL_WORKERS = int(os.getenv("RETRIEVAL_WORKERS", "16"))
+SCRAPE_CACHE_TTL = float(os.getenv("SCRAPE_CACHE_TTL", str(24 * 3600)))
+SCRAPE_CACHE_PATH = os.getenv("SCRAPE_CACHE_PATH", "")
+TAVILY_CACHE_TTL = float(os.getenv("TAVILY_CACHE_TTL", str(6 * 3600)))
+TAVILY_CACHE_SIZE = int(os.getenv("TAVILY_CACHE_SIZE", "512"))
+TAVILY_CACHE_PATH = os.getenv("TAVILY_CACHE_PATH", "")
+
+SCHEME_SITES = [
+    {"url": "https://pmkisan.gov.in", "title": "PM-KISAN", "desc": "₹6000/year for small farmers (land ≤ 2 hectares)"},
+    {"url": "https://pmfby.gov.in", "title": "PMFBY (Crop Insurance)", "desc": "Insurance against crop loss"},
+    {"url": "https://agrimachinery.nic.in", "title": "SMAM (Machinery Subsidy)", "desc": "Subsidies for farm equipment"},
+    {"url": "https://mahadbt.maharashtra.gov.in", "title": "Maha DBT", "desc": "Subsidies for farm equipment in Maharashtra"}
+]
+SCRAPE_HEADERS = {"User-Agent": "Mozilla/5.0"}
+
+# Shared by every request in the process. Never used as a context manager: a
+# source that overruns its deadline keeps its thread until the HTTP timeout
+# fires, but the request that submitted it does not wait for it.
+_executor = ThreadPoolExecutor(max_workers=RETRIEVAL_WORKERS, thread_name_prefix="retrieval")
+
+# The scheme pages change roughly weekly, so they are scraped once per TTL per
+# process (or per host, when SCRAPE_CACHE_PATH points at a shared file).
+scrape_cache = StaleWhileRevalidateCache(
+    ttl=SCRAPE_CACHE_TTL,
+    store=DiskStore(SCRAPE_CACHE_PATH, table="scrapes") if SCRAPE_CACHE_PATH else None,
+    name="scrape"
+)
+
+Source = Callable[[], List[Document]]
+
+def normalize_query(query: str) -> str:
+    return re.sub(r"\s+", " ", query).strip().lower()
+
+class CachedTavilyClient:
+    """Wraps a Tavily client so identical queries are answered from an LRU cache.
+
+    Only ``search`` and ``get_search_context`` are cached; any other attribute is
+    forwarded to the wrapped client. Works with any object exposing those methods.
+    """
+
+    def __init__(self, client: Any, cache: Optional[LRUCache] = None):
+        self.client = client
+        self.cache = cache or LRUCache(
+            max_entries=TAVILY_CACHE_SIZE,
+            ttl=TAVILY_CACHE_TTL,
+            store=DiskStore(TAVILY_CACHE_PATH, table="tavily") if TAVILY_CACHE_PATH else None,
+            name="tavily"
+        )
+
+    def search(self, query: str, **kwargs) -> Any:
+        return self._cached("search", query, kwargs)
+
+    def get_search_context(self, query: str, **kwargs) -> Any:
+        return self._cached("get_search_context", query, kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        return self.cache.stats()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.client, name)
+
+    def _cached(self, method: str, query: str, kwargs: Dict[str, Any]) -> Any:
+        key = f"{method}:{normalize_query(query)}:{json.dumps(kwargs, sort_keys=True, default=str)}"
+        return self.cache.get_or_load(key, lambda: self._call(method, query, kwargs))
+
+    def _call(self, method: str, query: str, kwargs: Dict[str, Any]) -> Any:
+        with span("external", "tavily"):
+            return getattr(self.client, method)(query=query, **kwargs)
+
+def fetch_page_text(url: str, timeout: float = SOURCE_TIMEOUT) -> str:
+    with span("external", "scrape"):
+        response = requests.get(url, headers=SCRAPE_HEADERS, timeout=timeout)
+    response.raise_for_status()
+    soup = BeautifulSoup(response.text, "html.parser")
+    content = soup.find("div", {"class": "content"}) or soup.find("div", {"id": "content"}) or soup.body
+    logger.info("[Retrieval] Scraped %s", url)
+    return content.get_text()[:500]
+
+def scrape_site(site: Dict[str, str], timeout: float = SOURCE_TIMEOUT) -> List[Document]:
+    text = scrape_cache.get(site["url"], partial(fetch_page_text, site["url"], timeout))
+    return [Document(
+        page_content=f"{site['title']}: {site['desc']}. {text}",
+        metadata={"url": site["url"], "source": "scraped", "title": site["title"]}
+    )]
+
+def site_sources(timeout: float = SOURCE_TIMEOUT) -> Dict[str, Source]:
+    return {f"scrape:{site['title']}": partial(scrape_site, site, timeout) for site in SCHEME_SITES}
+
+def _timed_source(name: str, fn: Source) -> List[Document]:
+    with span("source", name):
+        return fn()
+
+def gather_sources(
+    sources: Dict[str, Source],
+    deadline: float = RETRIEVAL_DEADLINE,
+    timeouts: Optional[Dict[str, float]] = None
+) -> List[Document]:
+    """Run every source concurrently and return the documents that arrived in time.
+
+    Each source is cut off at its own timeout (``SOURCE_TIMEOUT`` unless given in
+    ``timeouts``) or at the overall ``deadline``, whichever comes first. Failed or
+    late sources are logged and skipped. Documents keep the order of ``sources``.
+    """
+    start = time.monotonic()
+    timeouts = timeouts or {}
+    # Each source runs in a copy of this context, so its spans count towards the request.
+    pending = {name: _executor.submit(copy_context().run, _timed_source, name, fn) for name, fn in sources.items()}
+    cutoffs = {name: start + min(timeouts.get(name, SOURCE_TIMEOUT), deadline) for name in pending}
+    results: Dict[str, List[Document]] = {}
+
+    while pending:
+        now = time.monotonic()
+        for name in [n for n, f in pending.items() if cutoffs[n] <= now and not f.done()]:
+            pending.pop(name).cancel()
+            logger.warning("[Retrieval] %s missed its %.1fs deadline, skipping", name, cutoffs[name] - start)
+            SOURCE_FAILURES.labels(name, "deadline").inc()
+        if not pending:
+            break
+
+        next_cutoff = min(cutoffs[name] for name in pending)
+        done, _ = wait(list(pending.values()), timeout=max(0.0, next_cutoff - now), return_when=FIRST_COMPLETED)
+        for name in [n for n, f in pending.items() if f in done]:
+            future = pending.pop(name)
+            try:
+                results[name] = future.result() or []
+            except Exception as e:
+                logger.error("[Retrieval] Source %s failed: %s", name, str(e))
+                SOURCE_FAILURES.labels(name, "error").inc()
+
+    logger.info(
+        "[Retrieval] %d/%d sources answered in %.2fs",
+        len(results), len(sources), time.monotonic() - start
+    )
+    documents: List[Document] = []
+    for name in sources:
+        documents.extend(results.get(name, []))
+    return documents
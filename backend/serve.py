@@ -0,0 +1,82 @@
+"""
+Production entry point for the recommendations API.
+
+    python serve.py
+
+The Flask app runs behind uvicorn through a2wsgi's thread pool. Workflow
+concurrency is capped by admission.workflow_gate; on SIGTERM/SIGINT the gate
+stops admitting work and uvicorn waits up to SHUTDOWN_GRACE_PERIOD seconds for
+in-flight requests to finish. The lifespan shutdown then drains the gate,
+waiting up to SHUTDOWN_DRAIN_TIMEOUT seconds more for workflows still running
+on WSGI threads whose connections uvicorn gave up on. API clients are built in
+the background as each worker starts (WARM_UP=0 leaves them to the first
+request).
+"""
+import os
+import asyncio
+import logging
+import threading
+import uvicorn
+from a2wsgi import WSGIMiddleware
+from admission import workflow_gate, MAX_CONCURRENT_WORKFLOWS, MAX_QUEUED_WORKFLOWS
+from clients import warm_up
+from api import app
+
+logger = logging.getLogger(__name__)
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+SHUTDOWN_GRACE_PERIOD = int(os.getenv("SHUTDOWN_GRACE_PERIOD", "60"))
+SHUTDOWN_DRAIN_TIMEOUT = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", "10"))
+WARM_UP = os.getenv("WARM_UP", "1") == "1"
+
+# Every admitted or queued workflow holds a thread, plus a few spare threads so
+# cheap routes (charts, health) keep answering while the gate is saturated.
+WSGI_THREADS = int(os.getenv("WSGI_THREADS", str(MAX_CONCURRENT_WORKFLOWS + MAX_QUEUED_WORKFLOWS + 4)))
+
+class DrainOnShutdown:
+    """ASGI wrapper answering lifespan events: shutdown drains the admission gate."""
+
+    def __init__(self, app, gate, timeout: float):
+        self.app = app
+        self.gate = gate
+        self.timeout = timeout
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "lifespan":
+            return await self.app(scope, receive, send)
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                # drain() blocks on the gate's condition, so keep it off the event loop.
+                await asyncio.get_running_loop().run_in_executor(None, self.gate.drain, self.timeout)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+asgi_app = DrainOnShutdown(WSGIMiddleware(app, workers=WSGI_THREADS), workflow_gate, SHUTDOWN_DRAIN_TIMEOUT)
+
+# uvicorn imports this module in every worker process, so this runs after the fork.
+if WARM_UP:
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+
+class DrainingServer(uvicorn.Server):
+    def handle_exit(self, sig, frame):
+        logger.info("[Serve] Received signal %s, draining in-flight workflows", sig)
+        workflow_gate.close()
+        super().handle_exit(sig, frame)
+
+def main():
+    config = uvicorn.Config(
+        asgi_app,
+        host=HOST,
+        port=PORT,
+        timeout_graceful_shutdown=SHUTDOWN_GRACE_PERIOD,
+        lifespan="on",
+        log_level="info"
+    )
+    DrainingServer(config).run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+import os
+import sys
+import pytest
+
+# The backend is a flat set of modules imported by name, as when run from backend/.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    """Make ingest.with_retries retry immediately."""
+    import ingest
+    monkeypatch.setattr(ingest.time, "sleep", lambda seconds: None)
+
+@pytest.fixture
+def fake_llm():
+    """Installs a FakeChatModel with the given canned response as the LLM client, for the duration of the test."""
+    import clients
+    from fakes import FakeChatModel
+
+    def install(response, **kwargs):
+        model = FakeChatModel(response=response, tokens_per_second=0, first_token_latency=0, **kwargs)
+        clients.override("llm", model)
+        return model
+
+    yield install
+    clients.reset()
@@ -0,0 +1,97 @@
+import asyncio
+import threading
+import time
+import pytest
+from admission import AdmissionGate, Overloaded
+
+def gate(max_concurrent=1, max_queue=1, queue_timeout=5.0):
+    return AdmissionGate(max_concurrent, max_queue, queue_timeout, retry_after=7)
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+def queue_one(g):
+    """Start a thread that queues for a slot; returns the list its outcome lands in."""
+    outcome = []
+    def wait():
+        try:
+            g.acquire()
+            outcome.append("admitted")
+        except Overloaded as e:
+            outcome.append(e)
+    threading.Thread(target=wait, daemon=True).start()
+    wait_until(lambda: g.waiting == 1)
+    return outcome
+
+def test_full_queue_is_rejected_with_429():
+    g = gate()
+    g.acquire()
+    queue_one(g)
+    with pytest.raises(Overloaded) as rejected:
+        g.acquire()
+    assert (rejected.value.status, rejected.value.retry_after) == (429, 7)
+    assert g.stats()["rejected"] == 1
+
+def test_queued_request_is_admitted_when_a_slot_frees():
+    g = gate()
+    g.acquire()
+    outcome = queue_one(g)
+    g.release()
+    wait_until(lambda: outcome)
+    assert outcome == ["admitted"] and g.active == 1
+
+def test_queue_timeout_is_rejected_with_503():
+    g = gate(queue_timeout=0.05)
+    g.acquire()
+    with pytest.raises(Overloaded) as rejected:
+        g.acquire()
+    assert rejected.value.status == 503
+    assert g.waiting == 0
+
+def test_close_rejects_queued_and_new_requests_with_503():
+    g = gate()
+    g.acquire()
+    outcome = queue_one(g)
+    g.close()
+    wait_until(lambda: outcome)
+    assert outcome[0].status == 503
+    with pytest.raises(Overloaded) as rejected:
+        g.acquire()
+    assert rejected.value.status == 503
+
+def test_drain_waits_for_running_workflows():
+    g = gate()
+    g.acquire()
+    assert not g.drain(0.05)
+    threading.Timer(0.05, g.release).start()
+    assert g.drain(2.0)
+    assert g.stats()["closed"]
+
+def test_overloaded_response_sets_retry_after():
+    from api import app, overloaded_response
+    with app.app_context():
+        response = overloaded_response(Overloaded(429, "Too many requests in progress", 7))
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "7"
+
+def test_lifespan_shutdown_drains_the_gate(monkeypatch):
+    monkeypatch.setenv("WARM_UP", "0")
+    from serve import DrainOnShutdown
+    g = gate()
+    g.acquire()
+    threading.Timer(0.05, g.release).start()
+    messages = iter([{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}])
+    sent = []
+
+    async def receive():
+        return next(messages)
+
+    async def send(message):
+        sent.append(message["type"])
+
+    asyncio.run(DrainOnShutdown(None, g, timeout=2.0)({"type": "lifespan"}, receive, send))
+    assert sent == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+    assert g.closed and g.active == 0
@@ -0,0 +1,75 @@
+from langchain_core.documents import Document
+from chunk_metadata import ALL_CROPS, ALL_INDIA, annotate_chunk, annotate_chunks, find_scheme, profile_filter, scan_document
+from ingest import chunk_id
+from vectorstore import matches_filter
+
+GAZETTE = [
+    (1, "Government of Odisha. KALIA: Krushak Assistance for Livelihood and Income Augmentation. Details at https://kalia.odisha.gov.in"),
+    (2, "Small and marginal farmers receive assistance for cultivation of paddy and pulses.")
+]
+
+def chunk(text):
+    return Document(page_content=text, metadata={"source": "kalia.pdf"})
+
+def test_scan_document_finds_scheme_states_and_portal():
+    document = scan_document(GAZETTE, "schemes/kalia_guidelines.pdf")
+    assert document["scheme"]["title"] == "KALIA"
+    assert document["states"] == ["Odisha"]
+    assert document["url"] == "https://kalia.odisha.gov.in"
+    assert document["fallback_title"] == "kalia guidelines"
+
+def test_scan_document_treats_many_states_as_nationwide():
+    document = scan_document([(1, "Bihar, Punjab, Kerala and Assam farmers")], "notice.pdf")
+    assert document["states"] == []
+
+def test_find_scheme_prefers_the_catalogue():
+    assert find_scheme("Register for PM Kisan today")["title"] == "PM-KISAN"
+    assert find_scheme("Farmers under Mukhyamantri Krishi Ashirwad Yojana get support") == {"title": "Mukhyamantri Krishi Ashirwad Yojana"}
+    assert find_scheme("Nothing named here") is None
+
+def test_annotate_chunk_inherits_document_metadata():
+    document = scan_document(GAZETTE, "kalia.pdf")
+    doc = chunk("Farmers growing paddy receive assistance in two instalments.")
+    assert annotate_chunk(doc, document, use_llm=False) is False
+    assert doc.metadata["title"] == "KALIA"
+    assert doc.metadata["states"] == ["Odisha"]
+    assert doc.metadata["crops"] == ["paddy"]
+    assert doc.metadata["url"] == "https://kalia.odisha.gov.in"
+
+def test_annotate_chunk_prefers_what_the_chunk_names():
+    document = scan_document(GAZETTE, "kalia.pdf")
+    doc = chunk("PMFBY covers crop loss for farmers in Bihar; see https://pmfby.gov.in/faq")
+    assert annotate_chunk(doc, document, use_llm=False) is True
+    assert doc.metadata["title"] == "PMFBY (Crop Insurance)"
+    assert doc.metadata["states"] == ["Bihar"]
+    assert doc.metadata["crops"] == [ALL_CROPS]
+    assert doc.metadata["url"] == "https://pmfby.gov.in/faq"
+
+def test_nationwide_catalogue_schemes_are_all_india():
+    document = scan_document([(1, "General notice")], "notice.pdf")
+    doc = chunk("Soil Health Card testing is free.")
+    annotate_chunk(doc, document, use_llm=False)
+    assert doc.metadata["states"] == [ALL_INDIA]
+
+def test_annotate_chunks_streams():
+    document = scan_document(GAZETTE, "kalia.pdf")
+    stream = annotate_chunks(iter([chunk("one"), chunk("two")]), document, use_llm=False)
+    assert next(stream).metadata["title"] == "KALIA"
+    assert len(list(stream)) == 1
+
+def test_profile_filter_selects_state_nationwide_and_unannotated_chunks():
+    condition = profile_filter({"state": " odisha "})
+    assert matches_filter({"states": ["Odisha"]}, condition)
+    assert matches_filter({"states": [ALL_INDIA]}, condition)
+    assert matches_filter({"title": "indexed before metadata extraction"}, condition)
+    assert not matches_filter({"states": ["Bihar"]}, condition)
+
+def test_profile_filter_needs_a_known_state():
+    assert profile_filter({"state": "Atlantis"}) is None
+    assert profile_filter({}) is None
+
+def test_chunk_ids_change_with_the_metadata_version(monkeypatch):
+    import ingest
+    before = chunk_id("kalia.pdf", "text")
+    monkeypatch.setattr(ingest, "METADATA_VERSION", ingest.METADATA_VERSION + 1)
+    assert chunk_id("kalia.pdf", "text") != before
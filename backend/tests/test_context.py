@@ -0,0 +1,42 @@
+from langchain_core.documents import Document
+from context import dedupe, mmr_order, pack_context, repeated_lines, strip_boilerplate
+
+MENU = "Home\nSchemes\nDownloads\nContact Us\n"
+PROFILE = {"state": "Maharashtra", "crop_type": "wheat", "irrigation": "rain-fed"}
+
+def page(title, body):
+    return Document(page_content=MENU + body, metadata={"title": title})
+
+def test_headings_survive_and_known_navigation_is_dropped():
+    text = "Skip to main content\nPM-KISAN\nEligibility:\nAll landholding farmers.\nBenefits\n₹6000 a year.\nPrivacy Policy\n© 2025 Government of India"
+    assert strip_boilerplate(text) == "PM-KISAN Eligibility: All landholding farmers. Benefits ₹6000 a year."
+
+def test_short_lines_repeated_across_pages_are_dropped():
+    pages = [MENU + "Eligibility:\nSmall farmers qualify.", MENU + "Eligibility:\nTenant farmers qualify.\nBenefits"]
+    repeated = repeated_lines(pages)
+    assert repeated == {"home", "schemes", "downloads", "contact us"}
+    assert strip_boilerplate(pages[1], repeated) == "Eligibility: Tenant farmers qualify. Benefits"
+
+def test_near_duplicates_keep_the_first():
+    text = "PMFBY insures notified crops against yield losses from drought, flood and pests at a premium of two percent for kharif crops."
+    documents = [Document(page_content=text, metadata={"title": "a"}), Document(page_content=text + " Apply online.", metadata={"title": "b"}), Document(page_content="SMAM subsidises tractors and power tillers for small farmers.", metadata={"title": "c"})]
+    assert [doc.metadata["title"] for doc in dedupe(documents)] == ["a", "c"]
+
+def test_mmr_puts_a_different_relevant_passage_before_a_redundant_one():
+    documents = [
+        Document(page_content="Wheat farmers in Maharashtra get crop insurance for rain-fed wheat under PMFBY."),
+        Document(page_content="Crop insurance for rain-fed wheat farmers in Maharashtra: PMFBY covers wheat losses."),
+        Document(page_content="Maharashtra gives rain-fed farmers a drip irrigation subsidy."),
+        Document(page_content="Fishermen in Kerala get boat subsidies.")
+    ]
+    assert mmr_order("Maharashtra wheat rain-fed", documents) == [0, 2, 1, 3]
+    assert mmr_order("Maharashtra wheat rain-fed", documents, lambda_=1.0)[:2] == [0, 1]
+
+def test_pack_context_strips_dedupes_and_fits_the_budget():
+    body = "Eligibility:\nRain-fed wheat farmers in Maharashtra with up to 2 hectares. " * 5
+    documents = [page("PMFBY", body), page("PMFBY copy", body), page("SMAM", "Benefits:\nTractors at 50% subsidy for small farmers.")]
+    packed = pack_context(PROFILE, documents, budget=60)
+    assert packed.stats["duplicates_dropped"] == 1
+    assert "Home" not in packed.text and "Eligibility:" in packed.text
+    assert packed.stats["tokens_out"] <= 60
+    assert [doc.metadata["title"] for doc in packed.documents][0] == "PMFBY"
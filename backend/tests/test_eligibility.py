@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+from eligibility import SchemeTable, parse_land_size
+
+CATALOGUE = [
+    {"title": "Open Scheme", "url": "https://open.gov.in", "desc": "For everyone", "aliases": ["open"]},
+    {"title": "Small Holder Grant", "url": "https://small.gov.in", "desc": "Small farms only", "aliases": ["grant"], "max_land": 2, "max_income": 200000},
+    {"title": "Kalia", "url": "https://kalia.odisha.gov.in", "desc": "Odisha only", "aliases": ["kalia"], "states": ["odisha"]},
+    {"title": "Portal One", "url": "https://portal.gov.in/one", "desc": "Shared portal"},
+    {"title": "Portal Two", "url": "https://portal.gov.in/two", "desc": "Shared portal"}
+]
+
+@pytest.fixture
+def table():
+    return SchemeTable(CATALOGUE)
+
+def doc(title="", url=""):
+    return Document(page_content="...", metadata={"title": title, "url": url})
+
+def test_parse_land_size_converts_acres():
+    assert parse_land_size("2 hectares") == 2
+    assert parse_land_size("5 acres") == pytest.approx(2.0234, abs=1e-3)
+    assert np.isnan(parse_land_size("unknown"))
+
+def test_evaluate_applies_numeric_and_categorical_rules(table):
+    profiles = [
+        {"state": "Odisha", "land_size": "1 hectare", "income": "100000"},
+        {"state": "Punjab", "land_size": "5 hectares", "income": "100000"},
+        {"state": "Punjab", "land_size": "not sure", "income": ""}
+    ]
+    eligible, scores = table.evaluate(profiles)
+    assert eligible.shape == (3, len(CATALOGUE))
+    assert eligible[0].tolist() == [True, True, True, True, True]
+    assert eligible[1].tolist() == [True, False, False, True, True]
+    # Values that cannot be parsed pass numeric limits.
+    assert eligible[2].tolist() == [True, True, False, True, True]
+    assert np.isneginf(scores[1, 1])
+
+def test_eligible_schemes_ranks_targeted_schemes_first(table):
+    titles = [s["title"] for s in table.eligible_schemes({"state": "Odisha", "land_size": "1 hectare", "income": "1000"})]
+    assert titles == ["Small Holder Grant", "Kalia", "Open Scheme", "Portal One", "Portal Two"]
+
+def test_match_uses_whole_word_aliases(table):
+    assert table.match(doc("KALIA scheme details")) == 2
+    assert table.match(doc("Skalia farming")) is None
+    assert table.match(doc("Open and grant schemes compared")) is None
+
+def test_match_falls_back_to_a_unique_host(table):
+    assert table.match(doc("Apply now", "https://www.small.gov.in/apply")) == 1
+    # Hosts shared by several schemes identify none of them.
+    assert table.match(doc("Apply now", "https://portal.gov.in/one")) is None
+
+def test_filter_documents_drops_only_ineligible_catalogue_schemes(table):
+    documents = [doc("Kalia guidelines"), doc("Small Holder Grant"), doc("Unknown state scheme"), doc("Open Scheme")]
+    kept, titles = table.filter_documents({"state": "Punjab", "land_size": "5 hectares", "income": "100000"}, documents)
+    assert [d.metadata["title"] for d in kept] == ["Unknown state scheme", "Open Scheme"]
+    assert set(titles) == {"Open Scheme", "Portal One", "Portal Two"}
@@ -0,0 +1,33 @@
+import pytest
+from cache import DiskStore
+from embedding_cache import CachedEmbeddings
+from fakes import FakeEmbeddings
+
+def disk_rows(store):
+    return store._conn.execute(f"SELECT COUNT(*) FROM {store.table}").fetchone()[0]
+
+@pytest.fixture
+def store(tmp_path):
+    return DiskStore(str(tmp_path / "embeddings.db"), table="embeddings")
+
+def test_each_distinct_text_is_embedded_once(store):
+    fake = FakeEmbeddings(size=8)
+    embeddings = CachedEmbeddings(fake, model="fake", store=store)
+    first = embeddings.embed_documents(["PM Kisan", "pm  kisan", "KALIA"])
+    second = embeddings.embed_documents(["KALIA", "Rythu Bandhu"])
+    assert first[0] == first[1] and second[0] == first[2]
+    assert fake.texts_embedded == 3
+
+def test_vectors_on_disk_are_shared_with_a_fresh_cache(store):
+    fake = FakeEmbeddings(size=8)
+    vector = CachedEmbeddings(fake, model="fake", store=store).embed_query("soil health card")
+    assert CachedEmbeddings(fake, model="fake", store=store).embed_query("soil health card") == pytest.approx(vector)
+    assert fake.calls == 1
+
+def test_disk_store_is_pruned_every_few_writes(store):
+    embeddings = CachedEmbeddings(FakeEmbeddings(size=8), model="fake", store=store, disk_entries=5, prune_every=4)
+    embeddings.embed_documents([f"scheme {i}" for i in range(11)])
+    # Pruned at the 4th and 8th writes; three more written since.
+    assert disk_rows(store) == 8
+    embeddings.embed_documents(["scheme 11"])
+    assert disk_rows(store) == 5
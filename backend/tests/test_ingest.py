@@ -0,0 +1,149 @@
+import pytest
+import ingest
+from langchain_core.documents import Document
+from fakes import FakeEmbeddings, FakeServiceError, FakeVectorSink
+from ingest import IngestionPipeline, ManifestStore, chunk_id, commit_sync, iter_chunks, plan_sync, sync_document
+
+SOURCE = "schemes.pdf"
+
+def chunks(*texts):
+    return [Document(page_content=text, metadata={"source": SOURCE}) for text in texts]
+
+class FlakySink(FakeVectorSink):
+    """Fails the first ``failures`` upserts, or every upsert containing one of ``poison``."""
+
+    def __init__(self, failures=0, poison=()):
+        super().__init__()
+        self.failures = failures
+        self.poison = set(poison)
+        self.attempts = 0
+
+    def upsert(self, ids, vectors, texts, metadatas):
+        self.attempts += 1
+        if self.attempts <= self.failures or self.poison & set(texts):
+            raise FakeServiceError("Injected upsert failure")
+        super().upsert(ids, vectors, texts, metadatas)
+
+@pytest.fixture
+def manifests(tmp_path):
+    return ManifestStore(str(tmp_path / "manifests"))
+
+def test_chunk_ids_are_content_addressed():
+    assert chunk_id(SOURCE, "a") == chunk_id(SOURCE, "a")
+    assert chunk_id(SOURCE, "a") != chunk_id(SOURCE, "b")
+    assert chunk_id(SOURCE, "a") != chunk_id("other.pdf", "a")
+
+def test_plan_streams_only_new_chunks(manifests):
+    manifests.save(SOURCE, [chunk_id(SOURCE, "a"), chunk_id(SOURCE, "gone")])
+    plan = plan_sync(SOURCE, manifests)
+    new = [doc.page_content for doc in plan.new_chunks(chunks("a", "b", "b", "c"))]
+    assert new == ["b", "c"]
+    assert plan.complete
+    assert (len(plan.current), plan.new, plan.unchanged) == (3, 2, 1)
+    assert plan.stale == [chunk_id(SOURCE, "gone")]
+
+def test_commit_requires_a_complete_plan(manifests):
+    plan = plan_sync(SOURCE, manifests)
+    stream = plan.new_chunks(chunks("a", "b"))
+    next(stream)
+    with pytest.raises(ValueError):
+        commit_sync(plan, [], FakeVectorSink(), manifests)
+
+def test_commit_deletes_stale_ids_and_records_current(manifests):
+    sink = FakeVectorSink()
+    sync_document(SOURCE, chunks("a", "b"), FakeEmbeddings(size=8), sink, manifests)
+    stats = sync_document(SOURCE, chunks("b", "c"), FakeEmbeddings(size=8), sink, manifests)
+    assert (stats["new"], stats["unchanged"], stats["deleted"]) == (1, 1, 1)
+    assert set(sink.records) == {chunk_id(SOURCE, "b"), chunk_id(SOURCE, "c")}
+    assert set(manifests.load(SOURCE)) == set(sink.records)
+
+def test_failed_upserts_stay_out_of_the_manifest(manifests, no_backoff):
+    sink = FlakySink(poison={"b"})
+    stats = sync_document(SOURCE, chunks("a", "b"), FakeEmbeddings(size=8), sink, manifests, embed_batch_size=1, upsert_workers=1, retries=1)
+    assert stats["failed_ids"] == [chunk_id(SOURCE, "b")]
+    assert manifests.load(SOURCE) == [chunk_id(SOURCE, "a")]
+    # The next sync retries only the chunk that failed.
+    sink.poison.clear()
+    stats = sync_document(SOURCE, chunks("a", "b"), FakeEmbeddings(size=8), sink, manifests)
+    assert (stats["new"], stats["unchanged"], stats["upserted"]) == (1, 1, 1)
+
+def test_failed_deletes_stay_in_the_manifest(manifests, no_backoff):
+    sink = FakeVectorSink()
+    sync_document(SOURCE, chunks("a", "b"), FakeEmbeddings(size=8), sink, manifests)
+    plan = plan_sync(SOURCE, manifests)
+    list(plan.new_chunks(chunks("a")))
+    sink.failure_rate = 1.0
+    assert commit_sync(plan, [], sink, manifests) == 0
+    assert set(manifests.load(SOURCE)) == {chunk_id(SOURCE, "a"), chunk_id(SOURCE, "b")}
+    sink.failure_rate = 0.0
+    plan = plan_sync(SOURCE, manifests)
+    list(plan.new_chunks(chunks("a")))
+    assert commit_sync(plan, [], sink, manifests) == 1
+    assert manifests.load(SOURCE) == [chunk_id(SOURCE, "a")]
+
+def test_pipeline_retries_transient_failures(no_backoff):
+    sink = FlakySink(failures=2)
+    stats = IngestionPipeline(FakeEmbeddings(size=8), sink, upsert_workers=1, retries=3).run(chunks("a", "b", "c"))
+    assert (stats["upserted"], stats["failed"]) == (3, 0)
+    assert sink.attempts == 3
+
+def test_pipeline_skips_batches_that_keep_failing(no_backoff):
+    sink = FlakySink(poison={"b"})
+    pipeline = IngestionPipeline(FakeEmbeddings(size=8), sink, embed_batch_size=1, upsert_batch_size=1, upsert_workers=2, retries=2)
+    stats = pipeline.run(chunks("a", "b", "c"))
+    assert (stats["chunks"], stats["upserted"], stats["failed"]) == (3, 2, 1)
+    assert {record["text"] for record in sink.records.values()} == {"a", "c"}
+
+def test_pipeline_skips_failed_embeddings(no_backoff):
+    embeddings = FakeEmbeddings(size=8, failure_rate=1.0)
+    sink = FakeVectorSink()
+    stats = IngestionPipeline(embeddings, sink, embed_batch_size=2, retries=1).run(chunks("a", "b", "c"))
+    assert (stats["embedded"], stats["upserted"], stats["failed"]) == (0, 0, 3)
+    assert len(stats["failed_ids"]) == 3
+    assert not sink.records
+
+def test_pipeline_batches_embedding_calls():
+    embeddings = FakeEmbeddings(size=8)
+    progress = []
+    stats = IngestionPipeline(embeddings, FakeVectorSink(), embed_batch_size=2, progress=progress.append).run(chunks("a", "b", "c", "d", "e"))
+    assert embeddings.calls == 3
+    assert stats["upserted"] == 5
+    assert progress[-1]["upserted"] == 5
+
+PAGE_WORDS = {2: "bbbb", 3: "cccc", 5: "eeee", 6: "ffff"}
+
+def pages(words_per_page=30):
+    yield from ((page, " ".join([word] * words_per_page)) for page, word in PAGE_WORDS.items())
+    yield 7, ""
+
+def test_iter_chunks_tags_the_pages_each_chunk_spans():
+    docs = list(iter_chunks(pages(), SOURCE, chunk_size=60, chunk_overlap=10))
+    assert len(docs) > 8
+    for doc in docs:
+        spanned = [page for page, word in PAGE_WORDS.items() if word in doc.page_content]
+        assert (doc.metadata["page_start"], doc.metadata["page_end"]) == (min(spanned), max(spanned))
+        assert doc.metadata["source"] == SOURCE
+    assert {doc.metadata["page_start"] for doc in docs} == set(PAGE_WORDS)
+    # Every page's text survives the rounds of splitting and carry-over.
+    assert sum(doc.page_content.count("ffff") for doc in docs) >= 30
+
+def test_iter_chunks_skips_empty_documents():
+    assert list(iter_chunks([(1, ""), (2, "")], SOURCE)) == []
+
+def test_annotated_chunks_come_from_one_extraction_pass(monkeypatch):
+    extracted = []
+
+    def fake_pages(pdf_file, workers=1):
+        intro = (1, "Rythu Bandhu guidelines for farmers in Telangana. Apply at https://rythubandhu.telangana.gov.in")
+        for page, text in [intro, *pages()]:
+            extracted.append(page)
+            yield page, text
+
+    monkeypatch.setattr(ingest, "iter_pdf_pages", fake_pages)
+    docs = list(ingest.iter_annotated_pdf_chunks("gazette.pdf", SOURCE, lookahead=2))
+    assert extracted == [1, 2, 3, 5, 6, 7]
+    assert docs[0].metadata["page_start"] == 1
+    # Chunks that name nothing inherit the scheme and state found in the opening pages.
+    assert {doc.metadata["title"] for doc in docs} == {"Rythu Bandhu"}
+    assert {tuple(doc.metadata["states"]) for doc in docs} == {("Telangana",)}
+    assert docs[-1].metadata["url"] == "https://rythubandhu.telangana.gov.in"
@@ -0,0 +1,99 @@
+import pytest
+from fakes import FakeEmbeddings, FakeVectorStore
+from lexical import BM25Index, HybridRetriever, tokenize
+from vectorstore import matches_filter
+
+RECORDS = [
+    {"id": "kisan", "page_content": "PM-KISAN pays small farmers 6000 rupees a year", "metadata": {"title": "PM-KISAN", "states": ["all-India"]}},
+    {"id": "kalia", "page_content": "KALIA livelihood support for small farmers in Odisha", "metadata": {"title": "KALIA", "states": ["Odisha"]}},
+    {"id": "rythu", "page_content": "Rythu Bandhu investment support per acre for farmers in Telangana", "metadata": {"title": "Rythu Bandhu", "states": ["Telangana"]}},
+    {"id": "legacy", "page_content": "Crop insurance for farmers against drought and flood", "metadata": {"title": "PMFBY"}}
+]
+
+ODISHA = {"$or": [{"states": {"$in": ["Odisha", "all-India"]}}, {"states": {"$exists": False}}]}
+
+@pytest.fixture
+def index():
+    return BM25Index(records=[dict(r) for r in RECORDS])
+
+@pytest.fixture
+def store():
+    store = FakeVectorStore(FakeEmbeddings(size=32))
+    store.add_texts([r["page_content"] for r in RECORDS], [r["metadata"] for r in RECORDS], [r["id"] for r in RECORDS])
+    return store
+
+def test_tokenize_joins_compounds():
+    assert tokenize("PM-KISAN") == ["pm", "kisan", "pmkisan"]
+
+@pytest.mark.parametrize("condition, expected", [
+    ({"states": "Odisha"}, True),
+    ({"states": {"$in": ["Bihar", "Odisha"]}}, True),
+    ({"states": {"$nin": ["Odisha"]}}, False),
+    ({"states": {"$ne": "Bihar"}}, True),
+    ({"states": {"$exists": True}}, True),
+    ({"crops": {"$exists": False}}, True),
+    ({"$and": [{"states": "Odisha"}, {"title": "KALIA"}]}, True),
+    ({"$or": [{"states": "Bihar"}, {"title": "Other"}]}, False)
+])
+def test_matches_filter(condition, expected):
+    assert matches_filter({"title": "KALIA", "states": ["Odisha"]}, condition) is expected
+
+def test_matches_filter_rejects_unknown_operators():
+    with pytest.raises(ValueError):
+        matches_filter({"states": ["Odisha"]}, {"states": {"$gt": 1}})
+
+def test_bm25_ranks_by_term_overlap(index):
+    ids = [doc.id for doc, _ in index.search("small farmers Odisha", k=2)]
+    assert ids == ["kalia", "kisan"]
+    assert index.search("pmkisan", k=1)[0][0].id == "kisan"
+
+def test_bm25_applies_filter_and_keeps_unannotated_chunks(index):
+    ids = {doc.id for doc, _ in index.search("farmers", filter=ODISHA)}
+    assert ids == {"kisan", "kalia", "legacy"}
+
+def test_bm25_add_and_delete(index):
+    index.delete(["kalia"])
+    index.add(["kusum"], ["KUSUM solar pumps for farmers"], [{"title": "PM-KUSUM"}])
+    ids = {doc.id for doc, _ in index.search("farmers solar Odisha")}
+    assert "kalia" not in ids and "kusum" in ids
+
+def test_bm25_save_and_load_round_trip(index, tmp_path):
+    index.save(str(tmp_path))
+    loaded = BM25Index.load(str(tmp_path))
+    assert [doc.id for doc, _ in loaded.search("small farmers Odisha", k=2)] == ["kalia", "kisan"]
+
+def test_bm25_reloads_after_another_writer_saves(index, tmp_path):
+    index.save(str(tmp_path))
+    reader = BM25Index.load(str(tmp_path))
+    assert not reader.reload_if_changed()
+    writer = BM25Index.load(str(tmp_path))
+    writer.add(["kusum"], ["KUSUM solar pumps for farmers"], [{"title": "PM-KUSUM"}])
+    writer.save()
+    assert reader.reload_if_changed()
+    assert reader.search("solar pumps", k=1)[0][0].id == "kusum"
+
+def test_hybrid_fuses_both_rankings(index, store):
+    retriever = HybridRetriever(vector_store=store, index=index, k=4, fetch_k=4)
+    dense, lexical = retriever._candidates("small farmers in Odisha", None)
+    results = retriever.search("small farmers in Odisha")
+    scores = {doc.id: score for doc, score in results}
+    for doc_id in scores:
+        expected = sum(1 / (retriever.rrf_k + rank + 1) for ranking in (dense, lexical) for rank, d in enumerate(ranking) if d.id == doc_id)
+        assert scores[doc_id] == pytest.approx(expected)
+    assert [score for _, score in results] == sorted(scores.values(), reverse=True)
+    assert all(doc.metadata["rrf_score"] == score for doc, score in results)
+
+def test_hybrid_filters_both_sources(index, store):
+    retriever = HybridRetriever(vector_store=store, index=index, k=4, fetch_k=4)
+    ids = {doc.id for doc, _ in retriever.search("farmers support", filter=ODISHA)}
+    assert "rythu" not in ids
+    assert "legacy" in ids
+
+def test_hybrid_uses_bm25_alone_when_vector_search_fails(index, store):
+    store.failure_rate = 1.0
+    retriever = HybridRetriever(vector_store=store, index=index, k=2, fetch_k=4)
+    assert [doc.id for doc, _ in retriever.search("small farmers Odisha")] == ["kalia", "kisan"]
+
+def test_hybrid_keeps_an_empty_filtered_result(index, store):
+    retriever = HybridRetriever(vector_store=store, index=index, k=4, fetch_k=4)
+    assert retriever.search("farmers", filter={"states": "Nowhere"}) == []
@@ -0,0 +1,56 @@
+import json
+import pytest
+from cache import LRUCache
+from fakes import FakeTavilyClient
+from retrieval import CachedTavilyClient, normalize_query
+
+@pytest.fixture
+def tavily():
+    fake = FakeTavilyClient()
+    return fake, CachedTavilyClient(fake, cache=LRUCache(max_entries=8, ttl=60, name="test-tavily"))
+
+def test_normalize_query_collapses_case_and_whitespace():
+    assert normalize_query("  PM  Kisan\n\tScheme ") == "pm kisan scheme"
+
+def test_equivalent_queries_share_one_call(tavily):
+    fake, client = tavily
+    first = client.search("PM Kisan scheme", max_results=3)
+    second = client.search("  pm   KISAN scheme ", max_results=3)
+    assert first == second
+    assert fake.calls == 1
+    assert client.stats()["hits"] == 1
+    assert client.stats()["misses"] == 1
+
+def test_arguments_and_method_are_part_of_the_key(tavily):
+    fake, client = tavily
+    client.search("crop insurance", max_results=3)
+    client.search("crop insurance", max_results=5)
+    context = client.get_search_context("crop insurance", max_results=3)
+    assert fake.calls == 3
+    assert len(json.loads(json.loads(context))) == 3
+
+def test_entries_expire_after_ttl(tavily, monkeypatch):
+    import cache
+    fake, client = tavily
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "time", lambda: now[0])
+    client.search("soil health card")
+    now[0] += 30
+    client.search("soil health card")
+    assert fake.calls == 1
+    now[0] += 61
+    client.search("soil health card")
+    assert fake.calls == 2
+
+def test_failures_are_not_cached(tavily):
+    fake, client = tavily
+    fake.failure_rate = 1.0
+    with pytest.raises(Exception):
+        client.search("kalia")
+    fake.failure_rate = 0.0
+    assert client.search("kalia")["results"]
+    assert fake.calls == 1
+
+def test_other_attributes_are_forwarded(tavily):
+    fake, client = tavily
+    assert client.failure_rate == fake.failure_rate
@@ -0,0 +1,40 @@
+import pytest
+from fakes import CANNED_RECOMMENDATIONS
+from validation import replace_section, split_sections, validate_recommendations
+
+def section(title, url="https://pmkisan.gov.in"):
+    return f"## {title}\n- Eligibility: small farmers qualify.\n- Benefit: ₹6000 a year.\n- Steps: 1. Apply at {url}.\n"
+
+def test_canned_draft_is_valid():
+    assert validate_recommendations(CANNED_RECOMMENDATIONS) == []
+
+def test_section_count_is_checked():
+    issues = validate_recommendations(section("PM-KISAN"))
+    assert issues == ["expected 4-6 '##' sections, found 1"]
+
+def test_missing_lines_are_reported_per_section():
+    text = "\n".join(section(f"Scheme {i}") for i in range(3)) + "\n## Vague\nSome general advice.\n"
+    assert validate_recommendations(text) == [
+        "'Vague' has no URL or application steps",
+        "'Vague' has no eligibility line",
+        "'Vague' has no benefit line"
+    ]
+
+def test_replace_section_keeps_the_others():
+    text = section("A") + "\n" + section("B") + "\n" + section("C")
+    revised = replace_section(text, "B", section("B", url="https://example.gov.in"))
+    titles = [title for title, _ in split_sections(revised)]
+    assert titles == ["A", "B", "C"]
+    assert "https://example.gov.in" in dict(split_sections(revised))["B"]
+    assert dict(split_sections(revised))["A"] == dict(split_sections(text))["A"]
+    assert dict(split_sections(revised))["C"] == dict(split_sections(text))["C"]
+
+def test_replace_last_section():
+    text = section("A") + "\n" + section("B")
+    revised = replace_section(text, "B", "## B\nNew body.")
+    assert revised.endswith("## B\nNew body.\n")
+    assert revised.startswith(section("A"))
+
+def test_replace_unknown_section_raises():
+    with pytest.raises(ValueError):
+        replace_section(section("A"), "Missing", "## Missing\n")
@@ -0,0 +1,47 @@
+import numpy as np
+from vectorstore import LocalVectorStore
+
+def ids(results):
+    return [doc.id for doc, _ in results]
+
+def test_writes_before_save_are_searchable(tmp_path):
+    store = LocalVectorStore(None, str(tmp_path))
+    store.add_vectors([[1, 0, 0], [0, 1, 0]], ["a", "b"], [{"states": ["Odisha"]}, {"states": ["Punjab"]}], ["a", "b"])
+    store.save()
+    store.add_vectors([[0, 0, 1], [0.9, 0.1, 0]], ["c", "a2"], [{"states": ["Odisha"]}, {"states": ["Odisha"]}], ["c", "a"])
+    store.delete(["b"])
+    assert len(store) == 2
+    assert ids(store.similarity_search_by_vector_with_score([1, 0, 0], k=5)) == ["a", "c"]
+    assert ids(store.similarity_search_by_vector_with_score([0, 0, 1], k=1, filter={"states": "Odisha"})) == ["c"]
+    assert store.similarity_search_by_vector_with_score([0, 1, 0], filter={"states": "Punjab"}) == []
+
+def test_writes_leave_the_mapped_matrix_alone_until_save(tmp_path):
+    store = LocalVectorStore(None, str(tmp_path))
+    store.add_vectors([[1, 0], [0, 1]], ["a", "b"], ids=["a", "b"])
+    store.save()
+    store = LocalVectorStore.load(str(tmp_path), None)
+    mapped = store.vectors
+    for i in range(3):
+        store.add_vectors([[1, 1]], [f"new {i}"], ids=[f"n{i}"])
+    store.delete(["a"])
+    assert store.vectors is mapped
+
+    store.save()
+    loaded = LocalVectorStore.load(str(tmp_path), None)
+    assert [record["id"] for record in loaded.records] == ["b", "n0", "n1", "n2"]
+    assert loaded.vectors.shape == (4, 2)
+    np.testing.assert_allclose(loaded.vectors[1], [2 ** -0.5, 2 ** -0.5], rtol=1e-6)
+
+def test_save_compacts_in_bounded_blocks(tmp_path, monkeypatch):
+    import vectorstore
+    monkeypatch.setattr(vectorstore, "COPY_ROWS", 2)
+    store = LocalVectorStore(None, str(tmp_path))
+    store.add_vectors([[i + 1, 0] for i in range(5)], [str(i) for i in range(5)], ids=[str(i) for i in range(5)])
+    store.delete(["1", "3"])
+    store.save()
+    assert [record["id"] for record in store.records] == ["0", "2", "4"]
+    assert store.vectors.shape == (3, 2)
+
+    store.delete(["0", "2", "4"])
+    store.save()
+    assert LocalVectorStore.load(str(tmp_path), None).vectors.shape == (0, 2)
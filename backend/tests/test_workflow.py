@@ -0,0 +1,131 @@
+import pytest
+import workflow
+from budget import new_budget
+from fakes import CANNED_RECOMMENDATIONS
+
+PROFILE = {"village": "hasdar", "district": "Pune", "state": "Maharashtra", "land_size": "2 hectares", "land_ownership": "owned", "crop_type": "wheat", "irrigation": "rain-fed", "income": "150000", "caste_category": "general", "bank_account": "yes", "existing_schemes": "none"}
+
+def draft_state(**fields):
+    state = {"profile": dict(PROFILE), "schemes": [], "recommendations": CANNED_RECOMMENDATIONS, "refinement_needed": False, "draft_valid": True, "visuals": [], "feedback": None}
+    state.update(new_budget(max_llm_calls=4))
+    state.update(fields)
+    return state
+
+def generation_state(**fields):
+    state = draft_state(recommendations=None, draft_valid=False, bypass_cache=False, cache_hit=False, eligible_schemes=[])
+    state.update(fields)
+    return state
+
+@pytest.fixture
+def cache_writes(monkeypatch):
+    writes = []
+    monkeypatch.setattr(workflow, "lookup_recommendations", lambda state: None)
+    monkeypatch.setattr(workflow, "store_recommendations", lambda state, recommendations, visuals: writes.append(recommendations))
+    return writes
+
+@pytest.mark.parametrize("fields, mode, route", [
+    ({}, "always", "refine"),
+    ({}, "validate", "handle_feedback"),
+    ({"draft_valid": False}, "validate", "refine"),
+    ({"llm_calls": 4}, "always", "out_of_budget"),
+    ({"deadline": 0.0}, "always", "out_of_budget"),
+    ({"refinement_needed": True}, "always", "recommendation"),
+    ({"refinement_needed": True, "llm_calls": 4}, "always", "out_of_budget")
+])
+def test_route_draft(monkeypatch, fields, mode, route):
+    monkeypatch.setattr(workflow, "REFINE_MODE", mode)
+    assert workflow.route_draft(draft_state(**fields)) == route
+
+def test_route_recommendations_stops_when_out_of_budget():
+    assert workflow.route_recommendations(draft_state(refinement_needed=True)) == "recommendation"
+    assert workflow.route_recommendations(draft_state(refinement_needed=True, llm_calls=4)) == "refine"
+    assert workflow.route_recommendations(draft_state()) == "refine"
+
+def test_refined_draft_is_cached(fake_llm, cache_writes):
+    fake_llm(CANNED_RECOMMENDATIONS)
+    result = workflow.generation_app.invoke(generation_state())
+    assert result["llm_calls"] == 2
+    assert not result["refinement_needed"]
+    assert cache_writes == [CANNED_RECOMMENDATIONS.strip()]
+
+def test_budget_cut_draft_is_served_but_not_cached(fake_llm, cache_writes):
+    fake_llm(CANNED_RECOMMENDATIONS)
+    result = workflow.generation_app.invoke(generation_state(max_llm_calls=1))
+    assert result["llm_calls"] == 1
+    assert result["budget_exhausted"]
+    assert result["recommendations"] == CANNED_RECOMMENDATIONS.strip()
+    assert cache_writes == []
+
+def test_draft_needing_refinement_stays_flagged_when_out_of_budget(fake_llm, cache_writes):
+    fake_llm("## Only one section, no links")
+    result = workflow.generation_app.invoke(generation_state(max_llm_calls=2))
+    assert result["llm_calls"] == 2
+    assert result["refinement_needed"]
+    assert cache_writes == []
+
+def test_not_useful_feedback_regenerates_once(fake_llm, cache_writes):
+    fake_llm(CANNED_RECOMMENDATIONS)
+    result = workflow.generation_app.invoke(generation_state(feedback="Not useful", max_llm_calls=10))
+    # Draft and refine, then one more draft and refine for the feedback.
+    assert result["llm_calls"] == 4
+    assert not result["refinement_needed"]
+    assert result["feedback"] is None
+
+KUSUM = "## PM-KUSUM\n- Eligibility: farmers with a diesel pump qualify.\n- Benefit: 60% subsidy on a solar pump.\n- Steps: 1. Apply at https://pmkusum.mnre.gov.in.\n"
+
+def finished_run():
+    return draft_state(visuals=[], eligible_schemes=[], cache_hit=False, llm_calls=2)
+
+def titles(result):
+    return [title for title, _ in workflow.split_sections(result["recommendations"])]
+
+def test_revision_replaces_only_the_rejected_section(fake_llm):
+    fake_llm("Here is a replacement.\n\n" + KUSUM)
+    result = workflow.revise_recommendations(finished_run(), "PMFBY (Crop Insurance)")
+    assert titles(result) == ["PM-KISAN", "PM-KUSUM", "SMAM (Machinery Subsidy)", "Soil Health Card"]
+    assert result["llm_calls"] == 1
+
+def test_revision_uses_only_the_first_section_of_the_reply(fake_llm):
+    fake_llm(KUSUM + "\n## SMAM (Machinery Subsidy)\n- Repeated.\n\n## Soil Health Card\n- Repeated.\n")
+    result = workflow.revise_recommendations(finished_run(), "PMFBY (Crop Insurance)")
+    assert titles(result) == ["PM-KISAN", "PM-KUSUM", "SMAM (Machinery Subsidy)", "Soil Health Card"]
+
+def test_revision_repeating_a_kept_scheme_is_rejected(fake_llm):
+    fake_llm("## PM-KISAN\n- Eligibility: again.\n")
+    result = workflow.revise_recommendations(finished_run(), "PMFBY (Crop Insurance)")
+    assert result["recommendations"] == CANNED_RECOMMENDATIONS
+    assert result["rejected_section"] is None
+
+def batch_state(**profile):
+    return {"profile": dict(PROFILE, **profile), "schemes": [], "recommendations": None, "refinement_needed": False, "feedback": None, "visuals": [], "bypass_cache": False, "cache_hit": False}
+
+@pytest.fixture
+def searches(monkeypatch):
+    """Replaces web_search_node; records the state each search was for, failing for Punjab."""
+    calls = []
+    def web_search_node(state):
+        calls.append(state["profile"]["state"])
+        if state["profile"]["state"] == "Punjab":
+            raise RuntimeError("Tavily is down")
+        return {"schemes": [workflow.Document(page_content="PM-KISAN gives Rs 6000 a year.", metadata={"source": "tavily"})]}
+    monkeypatch.setattr(workflow, "web_search_node", web_search_node)
+    return calls
+
+def test_batch_searches_once_per_state(fake_llm, cache_writes, searches):
+    fake_llm(CANNED_RECOMMENDATIONS)
+    results = workflow.run_batch([batch_state(), batch_state(district="Nashik", state=" maharashtra"), batch_state(state="Karnataka")])
+    assert sorted(searches) == ["Karnataka", "Maharashtra"]
+    assert [result["recommendations"] for result in results] == [CANNED_RECOMMENDATIONS.strip()] * 3
+
+def test_batch_failure_is_confined_to_its_profiles(fake_llm, cache_writes, searches):
+    fake_llm(CANNED_RECOMMENDATIONS)
+    results = workflow.run_batch([batch_state(state="Punjab"), {"schemes": []}, batch_state()])
+    assert isinstance(results[0], RuntimeError)
+    assert isinstance(results[1], KeyError)
+    assert results[2]["recommendations"] == CANNED_RECOMMENDATIONS.strip()
+
+def test_batch_reports_timings_per_profile(fake_llm, cache_writes, searches):
+    fake_llm(CANNED_RECOMMENDATIONS)
+    results = workflow.run_batch([batch_state(), batch_state(district="Nashik")])
+    for result in results:
+        assert {"node:profile_analysis", "node:web_search", "node:recommendation", "node:refine"} <= set(result["timings"])
@@ -0,0 +1,64 @@
+import os
+import re
+import logging
+import threading
+from collections import Counter
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# "always" sends every acceptable draft through refine_node; "validate" skips
+# refine_node for drafts that already pass validate_recommendations.
+REFINE_MODE = os.getenv("REFINE_MODE", "always")
+
+MIN_SECTIONS = 4
+MAX_SECTIONS = 6
+
+SECTION_RE = re.compile(r"^##\s+(.+?)\s*$", re.MULTILINE)
+URL_RE = re.compile(r"https?://\S+")
+STEPS_RE = re.compile(r"^\s*(?:\d+[.)]|[-*]\s*step\b)|\b(?:apply|visit|register|submit)\b", re.IGNORECASE | re.MULTILINE)
+ELIGIBILITY_RE = re.compile(r"eligib|qualif", re.IGNORECASE)
+BENEFIT_RE = re.compile(r"benefit|₹|\brs\.?\s?\d|rupees|\d+\s?%|subsid", re.IGNORECASE)
+
+_path_counts: Counter = Counter()
+_lock = threading.Lock()
+
+def split_sections(text: str) -> List[Tuple[str, str]]:
+    matches = list(SECTION_RE.finditer(text))
+    return [
+        (match.group(1), text[match.end():matches[i + 1].start() if i + 1 < len(matches) else len(text)])
+        for i, match in enumerate(matches)
+    ]
+
+def replace_section(text: str, title: str, section: str) -> str:
+    """``text`` with its "## title" section (header included) swapped for ``section``."""
+    matches = list(SECTION_RE.finditer(text))
+    for i, match in enumerate(matches):
+        if match.group(1) == title:
+            last = i + 1 == len(matches)
+            end = len(text) if last else matches[i + 1].start()
+            return text[:match.start()] + section.strip() + ("\n" if last else "\n\n") + text[end:]
+    raise ValueError(f"No section titled {title!r}")
+
+def validate_recommendations(text: str) -> List[str]:
+    """Check a draft against the structure refine_node enforces. Returns the problems found."""
+    sections = split_sections(text)
+    issues = []
+    if not MIN_SECTIONS <= len(sections) <= MAX_SECTIONS:
+        issues.append(f"expected {MIN_SECTIONS}-{MAX_SECTIONS} '##' sections, found {len(sections)}")
+    for title, body in sections:
+        if not (URL_RE.search(body) or STEPS_RE.search(body)):
+            issues.append(f"'{title}' has no URL or application steps")
+        if not ELIGIBILITY_RE.search(body):
+            issues.append(f"'{title}' has no eligibility line")
+        if not BENEFIT_RE.search(body):
+            issues.append(f"'{title}' has no benefit line")
+    return issues
+
+def record_refine_path(path: str) -> None:
+    with _lock:
+        _path_counts[path] += 1
+
+def refine_path_counts() -> Dict[str, int]:
+    with _lock:
+        return dict(_path_counts)
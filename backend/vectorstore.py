@@ -0,0 +1,260 @@
+import os
+import json
+import uuid
+import logging
+import argparse
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone")
+LOCAL_INDEX_PATH = os.getenv("LOCAL_INDEX_PATH", "data/local_index")
+
+VECTORS_FILE = "vectors.npy"
+DOCUMENTS_FILE = "documents.jsonl"
+# Rows copied at a time when compacting, so saving never holds the whole matrix in memory.
+COPY_ROWS = 65536
+
+def matches_filter(metadata: Dict[str, Any], filter: Dict[str, Any]) -> bool:
+    """Evaluate a Pinecone-style metadata filter ($eq, $ne, $in, $nin, $exists, $and, $or or a bare value)."""
+    for field, condition in filter.items():
+        if field == "$and":
+            if not all(matches_filter(metadata, clause) for clause in condition):
+                return False
+            continue
+        if field == "$or":
+            if not any(matches_filter(metadata, clause) for clause in condition):
+                return False
+            continue
+        value = metadata.get(field)
+        values = value if isinstance(value, list) else [value]
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, operand in condition.items():
+            if op == "$eq" and operand not in values:
+                return False
+            if op == "$ne" and operand in values:
+                return False
+            if op == "$in" and not any(v in operand for v in values):
+                return False
+            if op == "$nin" and any(v in operand for v in values):
+                return False
+            if op == "$exists" and (field in metadata) != bool(operand):
+                return False
+            if op not in ("$eq", "$ne", "$in", "$nin", "$exists"):
+                raise ValueError(f"Unsupported filter operator: {op}")
+    return True
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+class LocalVectorStore(VectorStore):
+    """In-process exact cosine search over a memory-mapped embedding matrix.
+
+    A drop-in replacement for ``PineconeVectorStore`` in the workflows: rows are
+    L2-normalized on write, so a query is one matrix-vector product and scores
+    are cosine similarities, as with the ``farmwise-ai`` cosine index.
+
+    Writes never copy the mapped matrix: added rows are buffered after it and
+    replaced or deleted rows are only marked, so ingesting document by document
+    stays linear. ``save`` compacts everything into a new file.
+    """
+
+    def __init__(self, embedding: Embeddings, path: Optional[str] = None, vectors: Optional[np.ndarray] = None, records: Optional[List[Dict[str, Any]]] = None):
+        self.embedding = embedding
+        self.path = path
+        self.vectors = vectors if vectors is not None else np.zeros((0, 0), dtype=np.float32)
+        # One record per row of self.vectors followed by the rows in self._pending.
+        self.records = list(records or [])
+        self._pending: List[np.ndarray] = []
+        self._deleted: Set[int] = set()
+        self._rows: Dict[str, int] = {record["id"]: row for row, record in enumerate(self.records)}
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @classmethod
+    def load(cls, path: str, embedding: Embeddings) -> "LocalVectorStore":
+        vectors_path = os.path.join(path, VECTORS_FILE)
+        if not os.path.exists(vectors_path):
+            logger.warning("[Local Index] No index at %s, starting empty", path)
+            return cls(embedding, path)
+        vectors = np.load(vectors_path, mmap_mode="r")
+        with open(os.path.join(path, DOCUMENTS_FILE), encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+        if len(records) != vectors.shape[0]:
+            raise ValueError(f"Local index at {path} is corrupt: {len(records)} documents for {vectors.shape[0]} vectors")
+        logger.info("[Local Index] Loaded %d vectors from %s", len(records), path)
+        return cls(embedding, path, vectors, records)
+
+    def _dimension(self) -> int:
+        return self._pending[0].shape[1] if self._pending else self.vectors.shape[1]
+
+    def _live_blocks(self) -> Iterator[np.ndarray]:
+        """The rows that are not deleted, in order, at most COPY_ROWS at a time."""
+        offset = 0
+        for block in [self.vectors] + self._pending:
+            for start in range(0, block.shape[0], COPY_ROWS):
+                keep = [i for i in range(start, min(start + COPY_ROWS, block.shape[0])) if offset + i not in self._deleted]
+                if keep:
+                    yield np.asarray(block[keep], dtype=np.float32)
+            offset += block.shape[0]
+
+    def save(self, path: Optional[str] = None) -> None:
+        path = path or self.path
+        os.makedirs(path, exist_ok=True)
+        # Write next to the live files and swap them in, so readers that have the
+        # old matrix mapped are never pointed at a half-written file.
+        vectors_tmp = os.path.join(path, VECTORS_FILE + ".tmp.npy")
+        if self._rows:
+            out = np.lib.format.open_memmap(vectors_tmp, mode="w+", dtype=np.float32, shape=(len(self._rows), self._dimension()))
+            written = 0
+            for block in self._live_blocks():
+                out[written:written + block.shape[0]] = block
+                written += block.shape[0]
+            out.flush()
+            del out
+        else:
+            np.save(vectors_tmp, np.zeros((0, self._dimension()), dtype=np.float32))
+        records = [record for row, record in enumerate(self.records) if row not in self._deleted]
+        with open(os.path.join(path, DOCUMENTS_FILE + ".tmp"), "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        os.replace(vectors_tmp, os.path.join(path, VECTORS_FILE))
+        os.replace(os.path.join(path, DOCUMENTS_FILE + ".tmp"), os.path.join(path, DOCUMENTS_FILE))
+        self.path = path
+        self.vectors = np.load(os.path.join(path, VECTORS_FILE), mmap_mode="r")
+        self.records = records
+        self._pending, self._deleted = [], set()
+        self._rows = {record["id"]: row for row, record in enumerate(records)}
+        logger.info("[Local Index] Saved %d vectors to %s", len(records), path)
+
+    def add_vectors(self, vectors: List[List[float]], texts: List[str], metadatas: Optional[List[Dict[str, Any]]] = None, ids: Optional[List[str]] = None) -> List[str]:
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        metadatas = metadatas or [{} for _ in texts]
+        if not ids:
+            return ids
+        self._pending.append(_normalize(np.asarray(vectors, dtype=np.float32)))
+        for id_, text, metadata in zip(ids, texts, metadatas):
+            if id_ in self._rows:
+                self._deleted.add(self._rows[id_])
+            self._rows[id_] = len(self.records)
+            self.records.append({"id": id_, "page_content": text, "metadata": metadata})
+        return ids
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[Dict[str, Any]]] = None, ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        return self.add_vectors(self.embedding.embed_documents(texts), texts, metadatas, ids)
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        for id_ in ids or []:
+            row = self._rows.pop(id_, None)
+            if row is not None:
+                self._deleted.add(row)
+        return True
+
+    def _scores(self, query: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        """Cosine scores of the given rows (all rows if None) against a normalized query."""
+        mapped = self.vectors.shape[0]
+        if rows is None:
+            return np.concatenate([block @ query for block in [self.vectors] + self._pending if block.shape[0]])
+        scores = np.empty(rows.size, dtype=np.float32)
+        in_mapped = rows < mapped
+        if in_mapped.any():
+            scores[in_mapped] = self.vectors[rows[in_mapped]] @ query
+        if not in_mapped.all():
+            scores[~in_mapped] = np.vstack(self._pending)[rows[~in_mapped] - mapped] @ query
+        return scores
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4, filter: Optional[Dict[str, Any]] = None) -> List[Tuple[Document, float]]:
+        if not self._rows:
+            return []
+        query = _normalize(np.asarray(embedding, dtype=np.float32))
+        if filter:
+            candidates = np.fromiter((i for i, r in enumerate(self.records) if i not in self._deleted and matches_filter(r["metadata"], filter)), dtype=np.int64)
+            if candidates.size == 0:
+                return []
+            scores = self._scores(query, candidates)
+            k = min(k, candidates.size)
+        else:
+            candidates = None
+            scores = self._scores(query, None)
+            if self._deleted:
+                scores[list(self._deleted)] = -np.inf
+            k = min(k, len(self._rows))
+
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        results = []
+        for position in top:
+            record = self.records[int(candidates[position]) if candidates is not None else int(position)]
+            results.append((
+                Document(id=record["id"], page_content=record["page_content"], metadata=record["metadata"]),
+                float(scores[position])
+            ))
+        return results
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self.embedding.embed_query(query), k=k, filter=filter)
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, filter=filter)]
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[Dict[str, Any]]] = None, ids: Optional[List[str]] = None, path: Optional[str] = None, **kwargs: Any) -> "LocalVectorStore":
+        store = cls.load(path, embedding) if path else cls(embedding)
+        store.add_texts(texts, metadatas, ids)
+        if path:
+            store.save(path)
+        return store
+
+def load_vector_store(embedding: Embeddings, index_name: str = "farmwise-ai") -> VectorStore:
+    """Return the vector store selected by VECTOR_BACKEND ("pinecone" or "local")."""
+    if VECTOR_BACKEND == "local":
+        return LocalVectorStore.load(LOCAL_INDEX_PATH, embedding)
+    from langchain_pinecone import PineconeVectorStore
+    return PineconeVectorStore.from_existing_index(index_name=index_name, embedding=embedding)
+
+def export_pinecone_snapshot(index_name: str, path: str, api_key: str, text_key: str = "text", batch_size: int = 100) -> int:
+    """Copy every vector of a Pinecone serverless index into a local snapshot."""
+    from pinecone import Pinecone
+
+    index = Pinecone(api_key=api_key).Index(index_name)
+    store = LocalVectorStore(embedding=None, path=path)
+    exported = 0
+    for ids in index.list(limit=batch_size):
+        fetched = index.fetch(ids=list(ids)).vectors
+        vectors, texts, metadatas, kept_ids = [], [], [], []
+        for id_, vector in fetched.items():
+            metadata = dict(vector.metadata or {})
+            texts.append(metadata.pop(text_key, ""))
+            metadatas.append(metadata)
+            vectors.append(vector.values)
+            kept_ids.append(id_)
+        if kept_ids:
+            store.add_vectors(vectors, texts, metadatas, kept_ids)
+            exported += len(kept_ids)
+            logger.info("[Local Index] Exported %d vectors so far", exported)
+    store.save(path)
+    return exported
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] [%(name)s] - %(message)s")
+    parser = argparse.ArgumentParser(description="Export the Pinecone index into a local vector store snapshot.")
+    parser.add_argument("--index", default="farmwise-ai")
+    parser.add_argument("--out", default=LOCAL_INDEX_PATH)
+    args = parser.parse_args()
+    count = export_pinecone_snapshot(args.index, args.out, os.getenv("PINECONE_API_KEY"))
+    print(f"Exported {count} vectors from '{args.index}' to {args.out}")
@@ -1,28 +1,28 @@
 import os
-import io
-import base64
-import requests
 import logging
-from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import partial
 from dotenv import load_dotenv
-from tavily import TavilyClient
-import matplotlib.pyplot as plt
 from langgraph.graph import StateGraph, END
 from langchain_core.documents import Document
 from langchain.prompts import ChatPromptTemplate
-from typing import TypedDict, List, Optional, Dict, Any
-from langchain_google_genai import ChatGoogleGenerativeAI
+from typing import TypedDict, List, Optional, Dict, Any, Iterator, Tuple, Union
+from retrieval import RETRIEVAL_DEADLINE, SOURCE_TIMEOUT, gather_sources, site_sources
+from clients import get_llm, get_tavily
+from budget import can_call_llm, new_budget, retrieval_window, with_budget
+from recommendation_cache import lookup_recommendations, store_recommendations
+from validation import REFINE_MODE, record_refine_path, replace_section, split_sections, validate_recommendations
+from charts import subsidy_charts
+from eligibility import scheme_table
+from context import pack_context
+from metrics import breakdown, collect_spans, instrument_node, record_workflow, span
 
 load_dotenv()
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
-llm = ChatGoogleGenerativeAI(
-    model="gemini-1.5-flash",
-    api_key=os.getenv("GOOGLE_API_KEY")
-)
-
-tavily = TavilyClient(api_key=os.getenv("TAVILY_API_KEY"))
+BATCH_PARALLELISM = int(os.getenv("BATCH_PARALLELISM", "4"))
 
 class FarmerState(TypedDict):
     profile: Dict[str, str]
@@ -30,7 +30,17 @@ class FarmerState(TypedDict):
     recommendations: Optional[str]
     refinement_needed: bool
     feedback: Optional[str]  # For user feedback
-    visuals: Optional[List[str]]  # Base64-encoded images
+    visuals: Optional[List[str]]  # Chart ids, rendered by charts.get_chart
+    bypass_cache: bool  # Skip the profile-fingerprint response cache
+    cache_hit: bool
+    draft_valid: bool  # Draft already has the structure refine_node enforces
+    deadline: float  # Epoch seconds by which the request must answer (see budget.py)
+    llm_calls: int
+    max_llm_calls: int
+    eligible_schemes: List[str]  # Catalogue schemes that pass eligibility.py's rules
+    context_stats: Dict[str, int]  # Token counts from context.pack_context
+    budget_exhausted: bool  # route_draft ran out of budget; the draft is served but not cached
+    rejected_section: Optional[str]  # Title of the section revise_section_node replaces
 
 def profile_analysis_node(state: FarmerState) -> Dict[str, Any]:
     logging.info("Starting profile_analysis_node")
@@ -50,43 +60,32 @@ def profile_analysis_node(state: FarmerState) -> Dict[str, Any]:
     logging.info(f"Enhanced profile: {profile}")
     return {"profile": profile, "schemes": [], "refinement_needed": False, "visuals": []}
 
+def tavily_search(profile: Dict[str, str]) -> List[Document]:
+    query = f"latest agricultural schemes for farmers in {profile['state']} 2025 site:*.gov.in OR site:*.org.in -inurl:(signup login)"
+    response = get_tavily().search(query=query, max_results=5)
+    logging.info(f"Tavily raw response: {response}")
+    tavily_results = response.get("results", [])
+    logging.info(f"Fetched {len(tavily_results)} schemes from Tavily")
+    return [
+        Document(page_content=r["content"], metadata={"url": r.get("url", "unknown"), "source": "tavily", "title": r.get("title", "Untitled")})
+        for r in tavily_results if isinstance(r, dict) and "content" in r
+    ]
+
+def retrieval_key(profile: Dict[str, str]) -> str:
+    # web_search_node only depends on the state (Tavily query); the scraped sites are fixed.
+    return profile.get("state", "").strip().lower()
+
 def web_search_node(state: FarmerState) -> Dict[str, List[Document]]:
     logging.info("Starting web_search_node")
-    schemes = []
     profile = state["profile"]
 
-    try:
-        query = f"latest agricultural schemes for farmers in {profile['state']} 2025 site:*.gov.in OR site:*.org.in -inurl:(signup login)"
-        response = tavily.search(query=query, max_results=5)
-        logging.info(f"Tavily raw response: {response}")
-        tavily_results = response.get("results", [])
-        schemes.extend([
-            Document(page_content=r["content"], metadata={"url": r.get("url", "unknown"), "source": "tavily", "title": r.get("title", "Untitled")})
-            for r in tavily_results if isinstance(r, dict) and "content" in r
-        ])
-        logging.info(f"Fetched {len(tavily_results)} schemes from Tavily")
-    except Exception as e:
-        logging.error(f"Tavily error: {str(e)}")
-
-    sites = [
-        {"url": "https://pmkisan.gov.in", "title": "PM-KISAN", "desc": "₹6000/year for small farmers (land ≤ 2 hectares)"},
-        {"url": "https://pmfby.gov.in", "title": "PMFBY (Crop Insurance)", "desc": "Insurance against crop loss"},
-        {"url": "https://agrimachinery.nic.in", "title": "SMAM (Machinery Subsidy)", "desc": "Subsidies for farm equipment"},
-        {"url": "https://mahadbt.maharashtra.gov.in", "title": "Maha DBT", "desc": "Subsidies for farm equipment in Maharashtra"}
-    ]
-    headers = {"User-Agent": "Mozilla/5.0"}
-    for site in sites:
-        try:
-            response = requests.get(site["url"], headers=headers, timeout=5)
-            soup = BeautifulSoup(response.text, "html.parser")
-            content = soup.find("div", {"class": "content"}) or soup.find("div", {"id": "content"}) or soup.body
-            schemes.append(Document(
-                page_content=f"{site['title']}: {site['desc']}. {content.get_text()[:500]}",
-                metadata={"url": site["url"], "source": "scraped", "title": site["title"]}
-            ))
-            logging.info(f"Scraped {site['title']}")
-        except Exception as e:
-            logging.error(f"Scraping error for {site['url']}: {str(e)}")
+    window = retrieval_window(state, RETRIEVAL_DEADLINE)
+    sources = {"tavily": partial(tavily_search, profile)}
+    if window >= SOURCE_TIMEOUT:
+        sources.update(site_sources())
+    else:
+        logging.info(f"Only {window:.1f}s left for retrieval, skipping the scheme sites")
+    schemes = gather_sources(sources, deadline=window) if window > 0 else []
 
     if not schemes:
         schemes.append(Document(
@@ -96,11 +95,26 @@ def web_search_node(state: FarmerState) -> Dict[str, List[Document]]:
     logging.info(f"Total schemes fetched: {len(schemes)}")
     return {"schemes": schemes}
 
+def eligibility_node(state: FarmerState) -> Dict[str, Any]:
+    logging.info("Starting eligibility_node")
+    schemes, eligible = scheme_table.filter_documents(state["profile"], state["schemes"])
+    logging.info(f"Rule-checked eligible schemes: {eligible}")
+    return {"schemes": schemes, "eligible_schemes": eligible}
+
+def cache_lookup_node(state: FarmerState) -> Dict[str, Any]:
+    logging.info("Starting cache_lookup_node")
+    cached = lookup_recommendations(state)
+    if cached is None:
+        return {"cache_hit": False}
+    logging.info("Serving cached recommendations for this profile fingerprint")
+    return {"recommendations": cached["recommendations"], "visuals": cached["visuals"], "refinement_needed": False, "cache_hit": True}
+
 def recommendation_node(state: FarmerState) -> Dict[str, Any]:
     logging.info("Starting recommendation_node")
     profile = state["profile"]
     profile_str = "\n".join(f"{k}: {v}" for k, v in profile.items())
-    schemes_str = "\n".join(f"{doc.metadata.get('title', 'Untitled')}: {doc.page_content}" for doc in state["schemes"])
+    context = pack_context(profile, state["schemes"], eligible=state.get("eligible_schemes") or [])
+    schemes_str = context.text
     
     seed_cost_estimate = profile.get("seed_cost_estimate", "unknown")
     
@@ -110,29 +124,22 @@ def recommendation_node(state: FarmerState) -> Dict[str, Any]:
         - Quantify benefits (e.g., '₹6000 covers 25% of wheat seed costs at ₹{seed_cost_estimate}/hectare').
         - Provide steps with URLs (e.g., https://pmkisan.gov.in) or local instructions (e.g., 'Visit your district office').
         Include national schemes (PM-KISAN, PMFBY, SMAM) and state-specific ones (e.g., Maha DBT for Maharashtra). Use markdown with headers (## Scheme Name)."""),
-        ("human", "Profile:\n{profile_str}\nSchemes:\n{schemes_str}")
+        ("human", "Profile:\n{profile_str}\nSchemes:\n{schemes_str}\nSchemes the profile passes the eligibility rules for: {eligible_str}")
     ])
     
-    response = (prompt | llm).invoke({
+    response = (prompt | get_llm()).invoke({
         "profile_str": profile_str,
         "schemes_str": schemes_str,
+        "eligible_str": ", ".join(state.get("eligible_schemes") or []) or "unknown",
         "seed_cost_estimate": seed_cost_estimate
     }).content.strip()
     refinement_needed = "http" not in response or len(response.split("##")) < 4
+    draft_issues = validate_recommendations(response)
     
-    visuals = []
-    if not refinement_needed:
-        fig, ax = plt.subplots(figsize=(6, 4))
-        ax.pie([40, 25, 20, 15], labels=["PM-KISAN", "PMFBY", "Maha DBT", "SMAM"], autopct="%1.1f%%")
-        ax.set_title("Estimated Subsidy Contribution")
-        buf = io.BytesIO()
-        fig.savefig(buf, format="png")
-        buf.seek(0)
-        visuals.append(base64.b64encode(buf.getvalue()).decode("utf-8"))
-        plt.close(fig)
+    visuals = subsidy_charts() if not refinement_needed else []
     
-    logging.info(f"Generated recommendations: {response[:100]}... Refinement needed: {refinement_needed}")
-    return {"recommendations": response, "refinement_needed": refinement_needed, "visuals": visuals}
+    logging.info(f"Generated recommendations: {response[:100]}... Refinement needed: {refinement_needed}, validation issues: {draft_issues}")
+    return {"recommendations": response, "refinement_needed": refinement_needed, "visuals": visuals, "draft_valid": not draft_issues, "llm_calls": state.get("llm_calls", 0) + 1, "context_stats": context.stats}
 
 def refine_node(state: FarmerState) -> Dict[str, Any]:
     logging.info("Starting refine_node")
@@ -146,38 +153,130 @@ def refine_node(state: FarmerState) -> Dict[str, Any]:
         ("human", "{recommendations}")
     ])
     
-    response = (prompt | llm).invoke({"recommendations": state["recommendations"]}).content.strip()
+    response = (prompt | get_llm()).invoke({"recommendations": state["recommendations"]}).content.strip()
     logging.info(f"Refined recommendations: {response[:100]}...")
-    return {"recommendations": response, "refinement_needed": False, "visuals": state["visuals"]}
+    return {"recommendations": response, "refinement_needed": False, "visuals": state["visuals"], "llm_calls": state.get("llm_calls", 0) + 1}
+
+def revise_section_node(state: FarmerState) -> Dict[str, Any]:
+    logging.info("Starting revise_section_node")
+    title = state["rejected_section"]
+    if not can_call_llm(state):
+        logging.warning(f"Out of budget, keeping section {title}")
+        return {}
+    profile = state["profile"]
+    context = pack_context(profile, state["schemes"], eligible=state.get("eligible_schemes") or [])
+    kept = [t for t, _ in split_sections(state["recommendations"]) if t != title]
+
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", """You're an expert on Indian agricultural schemes. The farmer found the recommendation "{title}" not useful. Replace it with one different scheme they qualify for, other than: {kept}. Write a single markdown section:
+        - A header with the scheme name (## Scheme Name).
+        - Eligibility confirmed with profile specifics (e.g., 'Your 2 hectares qualify').
+        - Quantified benefits (e.g., '₹6000 buys wheat seeds').
+        - Steps with URLs (e.g., https://pmkisan.gov.in) or clear instructions."""),
+        ("human", "Profile:\n{profile_str}\nSchemes:\n{schemes_str}\nSchemes the profile passes the eligibility rules for: {eligible_str}\nFeedback: {feedback}")
+    ])
+
+    response = (prompt | get_llm()).invoke({
+        "title": title,
+        "kept": ", ".join(kept) or "none",
+        "profile_str": "\n".join(f"{k}: {v}" for k, v in profile.items()),
+        "schemes_str": context.text,
+        "eligible_str": ", ".join(state.get("eligible_schemes") or []) or "unknown",
+        "feedback": state.get("feedback") or f"Not useful: {title}"
+    }).content.strip()
+    sections = split_sections(response)
+    # Only the first section is used: the reply may run on into more schemes.
+    new_title, body = sections[0] if sections else (f"Instead of {title}", "\n" + response)
+    update = {"rejected_section": None, "llm_calls": state.get("llm_calls", 0) + 1, "context_stats": context.stats}
+    if new_title.strip().lower() in {t.strip().lower() for t in kept}:
+        logging.warning(f"Replacement for {title} repeats section {new_title}, keeping the original")
+        return update
+    section = f"## {new_title}{body}"
+    logging.info(f"Replaced section {title} with: {section[:100]}...")
+    return dict(update, recommendations=replace_section(state["recommendations"], title, section))
 
 def handle_feedback_node(state: FarmerState) -> Dict[str, Any]:
     logging.info("Starting handle_feedback_node")
+    if not state["refinement_needed"] and not state.get("budget_exhausted"):
+        store_recommendations(state, state["recommendations"], state["visuals"])
     feedback = state.get("feedback")
     if feedback and "not useful" in feedback.lower(): 
-        return {"refinement_needed": True}
-    return {"refinement_needed": False}
+        # Consumed here, so feedback buys one regeneration rather than a loop until the budget runs out.
+        return {"refinement_needed": True, "feedback": None}
+    # A draft cut off by the budget is still unrefined; keep it flagged for the caller.
+    return {"refinement_needed": state["refinement_needed"]}
 
-def route_recommendations(state: FarmerState) -> str:
+def out_of_budget_node(state: FarmerState) -> Dict[str, Any]:
+    logging.info("Starting out_of_budget_node")
+    # The draft goes out as it is, but an unrefined draft must not be served from cache for the whole TTL.
+    return {"budget_exhausted": True}
+
+def route_cache(state: FarmerState) -> str:
+    return "hit" if state.get("cache_hit") else "miss"
+
+def route_draft(state: FarmerState) -> str:
     if state["refinement_needed"]:
+        if can_call_llm(state):
+            return "recommendation"
+        logging.warning("Out of budget, returning the current draft as is")
+        record_refine_path("budget")
+        return "out_of_budget"
+    if REFINE_MODE == "validate" and state.get("draft_valid"):
+        logging.info("Draft passed validation, skipping refine_node")
+        record_refine_path("skipped")
+        return "handle_feedback"
+    if not can_call_llm(state):
+        logging.warning("Out of budget, returning the draft unrefined")
+        record_refine_path("budget")
+        return "out_of_budget"
+    record_refine_path("refined")
+    return "refine"
+
+def route_recommendations(state: FarmerState) -> str:
+    if state["refinement_needed"] and can_call_llm(state):
         return "recommendation"
     return "refine"
 
-workflow = StateGraph(FarmerState)
+def build_workflow(with_retrieval: bool = True):
+    workflow = StateGraph(FarmerState)
+
+    if with_retrieval:
+        workflow.add_node("profile_analysis", instrument_node("profile_analysis", profile_analysis_node))
+        workflow.add_node("web_search", instrument_node("web_search", web_search_node))
+    workflow.add_node("eligibility", instrument_node("eligibility", eligibility_node))
+    workflow.add_node("cache_lookup", instrument_node("cache_lookup", cache_lookup_node))
+    workflow.add_node("recommendation", instrument_node("recommendation", recommendation_node))
+    workflow.add_node("refine", instrument_node("refine", refine_node))
+    workflow.add_node("handle_feedback", instrument_node("handle_feedback", handle_feedback_node))
+    workflow.add_node("out_of_budget", instrument_node("out_of_budget", out_of_budget_node))
 
-workflow.add_node("profile_analysis", profile_analysis_node)
-workflow.add_node("web_search", web_search_node)
-workflow.add_node("recommendation", recommendation_node)
-workflow.add_node("refine", refine_node)
-workflow.add_node("handle_feedback", handle_feedback_node)  
+    if with_retrieval:
+        workflow.set_entry_point("profile_analysis")
+        workflow.add_edge("profile_analysis", "web_search")
+        workflow.add_edge("web_search", "eligibility")
+    else:
+        # Generation only: the caller has already analysed the profile and filled in schemes.
+        workflow.set_entry_point("eligibility")
+    workflow.add_edge("eligibility", "cache_lookup")
+    workflow.add_conditional_edges("cache_lookup", route_cache, {"miss": "recommendation", "hit": END})
+    workflow.add_conditional_edges("recommendation", route_draft, {"recommendation": "recommendation", "refine": "refine", "handle_feedback": "handle_feedback", "out_of_budget": "out_of_budget"})
+    workflow.add_edge("refine", "handle_feedback")
+    workflow.add_edge("out_of_budget", "handle_feedback")
+    workflow.add_conditional_edges("handle_feedback", route_recommendations, {"recommendation": "recommendation", "refine": END})
 
-workflow.set_entry_point("profile_analysis")
-workflow.add_edge("profile_analysis", "web_search")
-workflow.add_edge("web_search", "recommendation")
-workflow.add_conditional_edges("recommendation", route_recommendations, {"recommendation": "recommendation", "refine": "refine"})
-workflow.add_edge("refine", "handle_feedback")
-workflow.add_conditional_edges("handle_feedback", route_recommendations, {"recommendation": "recommendation", "refine": END})
+    return workflow.compile()
 
-app = workflow.compile()
+def build_revision_workflow():
+    # Feedback on a finished answer: the profile, schemes and draft come from the earlier run.
+    workflow = StateGraph(FarmerState)
+    workflow.add_node("revise_section", instrument_node("revise_section", revise_section_node))
+    workflow.set_entry_point("revise_section")
+    workflow.add_edge("revise_section", END)
+    return workflow.compile()
+
+app = build_workflow()
+generation_app = build_workflow(with_retrieval=False)
+revision_app = build_revision_workflow()
 
 def run_workflow(initial_state: Optional[FarmerState] = None) -> FarmerState:
     logging.info("Starting workflow")
@@ -187,14 +286,126 @@ def run_workflow(initial_state: Optional[FarmerState] = None) -> FarmerState:
         "recommendations": None,
         "refinement_needed": False,
         "feedback": None,
-        "visuals": []
+        "visuals": [],
+        "bypass_cache": False,
+        "cache_hit": False,
+        "draft_valid": False,
+        "eligible_schemes": []
     }
-    state = initial_state or default_state
+    state = with_budget(initial_state or default_state)
     
     try:
-        final_state = app.invoke(state)
-        logging.info("Workflow completed")
+        with collect_spans() as spans:
+            final_state = app.invoke(state)
+        final_state["timings"] = breakdown(spans)
+        record_workflow(final_state)
+        logging.info(f"Workflow completed: {final_state['timings']}")
         return final_state
     except Exception as e:
         logging.error(f"Workflow execution failed: {str(e)}")
+        record_workflow(state, "failed")
         raise
+
+def stream_workflow(initial_state: FarmerState) -> Iterator[Tuple[str, Any]]:
+    """Run the graph and yield (event, payload) pairs as it progresses.
+
+    Events are "schemes" (retrieved documents), "token" (draft text from
+    recommendation_node as the LLM generates it), "draft" (refinement status
+    after each draft) and finally "done" with the complete final state.
+    """
+    logging.info("Starting streaming workflow")
+    final_state = initial_state = with_budget(initial_state)
+    try:
+        with collect_spans() as spans:
+            for mode, chunk in app.stream(initial_state, stream_mode=["updates", "messages", "values"]):
+                if mode == "messages":
+                    message, metadata = chunk
+                    if metadata.get("langgraph_node") == "recommendation" and message.content:
+                        yield "token", message.content
+                elif mode == "updates":
+                    for node, update in chunk.items():
+                        if node == "web_search":
+                            yield "schemes", update["schemes"]
+                        elif node == "recommendation":
+                            yield "draft", {"refinement_needed": update["refinement_needed"]}
+                else:
+                    final_state = chunk
+    except Exception as e:
+        logging.error(f"Streaming workflow failed: {str(e)}")
+        record_workflow(final_state, "failed")
+        raise
+    final_state["timings"] = breakdown(spans)
+    record_workflow(final_state)
+    logging.info("Streaming workflow completed")
+    yield "done", final_state
+
+def revise_recommendations(result: FarmerState, title: str, feedback: Optional[str] = None) -> FarmerState:
+    """Regenerate only the ``title`` section of a finished run, with one LLM call and no retrieval."""
+    logging.info(f"Revising section {title}")
+    state = dict(result, **new_budget(), rejected_section=title, feedback=feedback or f"Not useful: {title}")
+    with collect_spans() as spans:
+        final_state = revision_app.invoke(state)
+    final_state["timings"] = breakdown(spans)
+    record_workflow(final_state)
+    logging.info(f"Revision completed: {final_state['timings']}")
+    return final_state
+
+def run_batch(initial_states: List[FarmerState], parallelism: int = BATCH_PARALLELISM, gate: Optional[Any] = None) -> List[Union[FarmerState, Exception]]:
+    """Run many profiles, retrieving schemes once per distinct retrieval_key.
+
+    Returns one entry per input, in order: the final state, or the exception
+    that profile failed with. With an admission ``gate``, every retrieval and
+    generation holds one of its slots while it runs, so a batch counts against
+    the concurrency cap like that many single requests.
+    """
+    slot = gate.slot if gate is not None else nullcontext
+    logging.info(f"Starting batch of {len(initial_states)} profiles")
+    results: List[Union[FarmerState, Exception]] = [None] * len(initial_states)
+    states: List[Optional[FarmerState]] = [None] * len(initial_states)
+    # Spans per profile; a group's retrieval spans are shared by every profile in it.
+    spans: List[List[Tuple[str, str, float]]] = [[] for _ in initial_states]
+    groups: Dict[str, List[int]] = {}
+    for i, initial_state in enumerate(initial_states):
+        try:
+            state = dict(initial_state)
+            with collect_spans() as analysis_spans, span("node", "profile_analysis"):
+                state.update(profile_analysis_node(state))
+            spans[i].extend(analysis_spans)
+            states[i] = state
+            groups.setdefault(retrieval_key(state["profile"]), []).append(i)
+        except Exception as e:
+            logging.error(f"Batch profile {i} failed during analysis: {str(e)}")
+            results[i] = e
+    logging.info(f"Batch has {len(groups)} distinct retrieval groups")
+
+    def retrieve(indices: List[int]) -> None:
+        try:
+            with slot(), collect_spans() as retrieval_spans, span("node", "web_search"):
+                schemes = web_search_node(states[indices[0]])["schemes"]
+        except Exception as e:
+            logging.error(f"Batch retrieval failed for {len(indices)} profiles: {str(e)}")
+            for i in indices:
+                results[i] = e
+            return
+        for i in indices:
+            states[i]["schemes"] = list(schemes)
+            spans[i].extend(retrieval_spans)
+
+    def generate(i: int) -> None:
+        try:
+            # The budget starts when generation does; retrieval was shared.
+            with slot(), collect_spans() as generation_spans:
+                results[i] = generation_app.invoke(with_budget(states[i]))
+            results[i]["timings"] = breakdown(spans[i] + generation_spans)
+            record_workflow(results[i])
+        except Exception as e:
+            logging.error(f"Batch profile {i} failed during generation: {str(e)}")
+            record_workflow(states[i], "failed")
+            results[i] = e
+
+    with ThreadPoolExecutor(max_workers=max(1, parallelism), thread_name_prefix="batch") as executor:
+        list(executor.map(retrieve, groups.values()))
+        list(executor.map(generate, [i for i in range(len(states)) if results[i] is None]))
+
+    logging.info("Batch completed")
+    return results
@@ -1,19 +1,20 @@
-import os
-import io
-import base64
-import requests
 import logging
-from bs4 import BeautifulSoup
+from functools import partial
 from dotenv import load_dotenv
-from langchain_cohere import CohereEmbeddings
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_pinecone import PineconeVectorStore
-import matplotlib.pyplot as plt
 from langgraph.graph import StateGraph, END
 from langchain_core.documents import Document
 from langchain.prompts import ChatPromptTemplate
 from typing import TypedDict, List, Optional, Dict, Any
-from tavily import TavilyClient
+from retrieval import RETRIEVAL_DEADLINE, SOURCE_TIMEOUT, gather_sources, site_sources
+from clients import get_llm, get_retriever, get_tavily
+from chunk_metadata import profile_filter
+from budget import can_call_llm, retrieval_window, with_budget
+from recommendation_cache import lookup_recommendations, store_recommendations
+from validation import REFINE_MODE, record_refine_path, validate_recommendations
+from charts import subsidy_charts
+from eligibility import scheme_table
+from context import pack_context
+from metrics import breakdown, collect_spans, instrument_node, record_workflow
 
 load_dotenv()
 
@@ -24,21 +25,6 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-pinecone_api_key = os.getenv("PINECONE_API_KEY")
-cohere_api_key = os.getenv("COHERE_API_KEY")
-google_api_key = os.getenv("GOOGLE_API_KEY")
-tavily_api_key = os.getenv("TAVILY_API_KEY")
-pinecone_environment = os.getenv("PINECONE_ENVIRONMENT", "us-east-1")
-
-embeddings = CohereEmbeddings(cohere_api_key=cohere_api_key, model="embed-english-v3.0")
-pc = PineconeVectorStore.from_existing_index(
-    index_name="farmwise-ai",
-    embedding=embeddings
-)
-
-llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash", api_key=google_api_key)
-tavily = TavilyClient(api_key=tavily_api_key)
-
 class FarmerState(TypedDict):
     profile: Dict[str, str]
     schemes: List[Document]
@@ -46,6 +32,15 @@ class FarmerState(TypedDict):
     refinement_needed: bool
     feedback: Optional[str]
     visuals: Optional[List[str]]
+    bypass_cache: bool
+    cache_hit: bool
+    draft_valid: bool
+    deadline: float
+    llm_calls: int
+    max_llm_calls: int
+    eligible_schemes: List[str]
+    context_stats: Dict[str, int]
+    budget_exhausted: bool
 
 def profile_analysis_node(state: FarmerState) -> Dict[str, Any]:
     logger.info("[Profile Analysis] Starting analysis of farmer profile.")
@@ -66,86 +61,74 @@ def profile_analysis_node(state: FarmerState) -> Dict[str, Any]:
     logger.info("[Profile Analysis] Enhanced profile: %s", profile)
     return {"profile": profile, "schemes": [], "refinement_needed": False, "visuals": []}
 
+def pinecone_search(profile: Dict[str, str]) -> List[Document]:
+    query_text = f"Available agricultural schemes for farmer with profile: {profile}"
+    logger.debug("[Web Search] Hybrid query: %s", query_text)
+    # Dense and BM25 ranks are fused, so raw similarity scores are no longer thresholded.
+    results = get_retriever().search(query_text, filter=profile_filter(profile))
+    logger.info("[Web Search] Hybrid search returned %d matches", len(results))
+
+    if len(results) == 0:
+        logger.warning("[Web Search] No matches found in the index. Check index data or query relevance. Consider adjusting query or verifying index content.")
+
+    return [
+        Document(
+            page_content=doc.page_content,
+            metadata={
+                "url": doc.metadata.get("url", "unknown"),
+                "source": "pinecone",
+                "title": doc.metadata.get("title", "Untitled")
+            }
+        )
+        for doc, _ in results
+    ]
+
+def tavily_search(profile: Dict[str, str]) -> List[Document]:
+    tavily_query = f"agricultural schemes in India for a farmer with {profile['land_size']} land and {profile['irrigation']} irrigation"
+    logger.debug("[Web Search] Tavily query: %s", tavily_query)
+    tavily_response = get_tavily().get_search_context(query=tavily_query, max_results=3)
+    logger.debug("[Web Search] Raw Tavily response: %s", tavily_response)
+
+    if isinstance(tavily_response, str):
+        logger.error("[Web Search] Tavily returned a string: %s", tavily_response)
+        tavily_results = []
+    elif isinstance(tavily_response, dict):
+        tavily_results = tavily_response.get("results", [])
+    else:
+        logger.error("[Web Search] Unexpected Tavily response format: %s", type(tavily_response))
+        tavily_results = []
+
+    if not tavily_results:
+        logger.warning("[Web Search] No valid Tavily results retrieved, proceeding with other sources.")
+        return []
+
+    logger.info("[Web Search] Fetched %d schemes from Tavily", len(tavily_results))
+    return [
+        Document(
+            page_content=result.get("content", "No content available"),
+            metadata={
+                "url": result.get("url", "unknown"),
+                "source": "tavily",
+                "title": result.get("title", "Untitled")
+            }
+        )
+        for result in tavily_results
+    ]
+
 def web_search_node(state: FarmerState) -> Dict[str, List[Document]]:
     logger.info("[Web Search] Starting search for agricultural schemes.")
-    schemes = []
     profile = state["profile"]
 
-    try:
-        query_text = f"Available agricultural schemes for farmer with profile: {profile}"
-        logger.debug("[Web Search] Embedding query: %s", query_text)
-        results = pc.similarity_search_with_score(query=query_text, k=5)
-        logger.info(results);
-        logger.info("[Web Search] Pinecone query returned %d matches", len(results))
-
-        if len(results) == 0:
-            logger.warning("[Web Search] No matches found in Pinecone. Check index data or query relevance. Consider adjusting query or verifying index content.")
-
-        schemes.extend([
-            Document(
-                page_content=result[0].page_content,
-                metadata={
-                    "url": result[0].metadata.get("url", "unknown"),
-                    "source": "pinecone",
-                    "title": result[0].metadata.get("title", "Untitled")
-                }
-            )
-            for result in results if result[1] > 0.2
-        ])
-        logger.info("[Web Search] Fetched %d schemes from Pinecone after filtering", len(schemes))
-
-        tavily_query = f"agricultural schemes in India for a farmer with {profile['land_size']} land and {profile['irrigation']} irrigation"
-        logger.debug("[Web Search] Tavily query: %s", tavily_query)
-        tavily_response = tavily.get_search_context(query=tavily_query, max_results=3)
-        logger.debug("[Web Search] Raw Tavily response: %s", tavily_response)
-
-        if isinstance(tavily_response, str):
-            logger.error("[Web Search] Tavily returned a string: %s", tavily_response)
-            tavily_results = []
-        elif isinstance(tavily_response, dict):
-            tavily_results = tavily_response.get("results", [])
-        else:
-            logger.error("[Web Search] Unexpected Tavily response format: %s", type(tavily_response))
-            tavily_results = []
-
-        if tavily_results:
-            schemes.extend([
-                Document(
-                    page_content=result.get("content", "No content available"),
-                    metadata={
-                        "url": result.get("url", "unknown"),
-                        "source": "tavily",
-                        "title": result.get("title", "Untitled")
-                    }
-                )
-                for result in tavily_results
-            ])
-            logger.info("[Web Search] Fetched %d schemes from Tavily", len(tavily_results))
-        else:
-            logger.warning("[Web Search] No valid Tavily results retrieved, proceeding with other sources.")
-
-    except Exception as e:
-        logger.error("[Web Search] Search failed: %s", str(e))
-
-    sites = [
-        {"url": "https://pmkisan.gov.in", "title": "PM-KISAN", "desc": "₹6000/year for small farmers (land ≤ 2 hectares)"},
-        {"url": "https://pmfby.gov.in", "title": "PMFBY (Crop Insurance)", "desc": "Insurance against crop loss"},
-        {"url": "https://agrimachinery.nic.in", "title": "SMAM (Machinery Subsidy)", "desc": "Subsidies for farm equipment"},
-        {"url": "https://mahadbt.maharashtra.gov.in", "title": "Maha DBT", "desc": "Subsidies for farm equipment in Maharashtra"}
-    ]
-    headers = {"User-Agent": "Mozilla/5.0"}
-    for site in sites:
-        try:
-            response = requests.get(site["url"], headers=headers, timeout=5)
-            soup = BeautifulSoup(response.text, "html.parser")
-            content = soup.find("div", {"class": "content"}) or soup.find("div", {"id": "content"}) or soup.body
-            schemes.append(Document(
-                page_content=f"{site['title']}: {site['desc']}. {content.get_text()[:500]}",
-                metadata={"url": site["url"], "source": "scraped", "title": site["title"]}
-            ))
-            logger.info("[Web Search] Successfully scraped: %s", site["title"])
-        except Exception as e:
-            logger.error("[Web Search] Scraping error for %s: %s", site["url"], str(e))
+    sources = {
+        "pinecone": partial(pinecone_search, profile),
+        "tavily": partial(tavily_search, profile)
+    }
+    window = retrieval_window(state, RETRIEVAL_DEADLINE)
+    if window >= SOURCE_TIMEOUT:
+        sources.update(site_sources())
+    else:
+        logger.info("[Web Search] Only %.1fs left for retrieval, skipping the scheme sites.", window)
+    schemes = gather_sources(sources, deadline=window) if window > 0 else []
 
     if not schemes:
         schemes.append(Document(
@@ -155,11 +138,27 @@ def web_search_node(state: FarmerState) -> Dict[str, List[Document]]:
     logger.info("[Web Search] Total schemes fetched: %d", len(schemes))
     return {"schemes": schemes}
 
+def eligibility_node(state: FarmerState) -> Dict[str, Any]:
+    logger.info("[Eligibility] Filtering retrieved schemes against the catalogue rules.")
+    schemes, eligible = scheme_table.filter_documents(state["profile"], state["schemes"])
+    logger.info("[Eligibility] Rule-checked eligible schemes: %s", eligible)
+    return {"schemes": schemes, "eligible_schemes": eligible}
+
+def cache_lookup_node(state: FarmerState) -> Dict[str, Any]:
+    logger.info("[Cache] Looking up recommendations for this profile fingerprint.")
+    cached = lookup_recommendations(state)
+    if cached is None:
+        logger.info("[Cache] No cached recommendations, generating.")
+        return {"cache_hit": False}
+    logger.info("[Cache] Serving cached recommendations.")
+    return {"recommendations": cached["recommendations"], "visuals": cached["visuals"], "refinement_needed": False, "cache_hit": True}
+
 def recommendation_node(state: FarmerState) -> Dict[str, Any]:
     logger.info("[Recommendation] Generating recommendations for farmer profile.")
     profile = state["profile"]
     profile_str = "\n".join(f"{k}: {v}" for k, v in profile.items())
-    schemes_str = "\n".join(f"{doc.metadata.get('title', 'Untitled')}: {doc.page_content}" for doc in state["schemes"])
+    context = pack_context(profile, state["schemes"], eligible=state.get("eligible_schemes") or [])
+    schemes_str = context.text
 
     seed_cost_estimate = profile.get("seed_cost_estimate", "unknown")
 
@@ -169,29 +168,22 @@ def recommendation_node(state: FarmerState) -> Dict[str, Any]:
         - Quantify benefits (e.g., '₹6000 covers 25% of wheat seed costs at ₹{seed_cost_estimate}/hectare').
         - Provide steps with URLs (e.g., https://pmkisan.gov.in) or local instructions (e.g., 'Visit your district office').
         Include national schemes (PM-KISAN, PMFBY, SMAM) and state-specific ones (e.g., Maha DBT for Maharashtra). Use markdown with headers (## Scheme Name)."""),
-        ("human", "Profile:\n{profile_str}\nSchemes:\n{schemes_str}")
+        ("human", "Profile:\n{profile_str}\nSchemes:\n{schemes_str}\nSchemes the profile passes the eligibility rules for: {eligible_str}")
     ])
 
-    response = (prompt | llm).invoke({
+    response = (prompt | get_llm()).invoke({
         "profile_str": profile_str,
         "schemes_str": schemes_str,
+        "eligible_str": ", ".join(state.get("eligible_schemes") or []) or "unknown",
         "seed_cost_estimate": seed_cost_estimate
     }).content.strip()
     refinement_needed = "http" not in response or len(response.split("##")) < 4
+    draft_issues = validate_recommendations(response)
 
-    visuals = []
-    if not refinement_needed:
-        fig, ax = plt.subplots(figsize=(6, 4))
-        ax.pie([40, 25, 20, 15], labels=["PM-KISAN", "PMFBY", "Maha DBT", "SMAM"], autopct="%1.1f%%")
-        ax.set_title("Estimated Subsidy Contribution")
-        buf = io.BytesIO()
-        fig.savefig(buf, format="png")
-        buf.seek(0)
-        visuals.append(base64.b64encode(buf.getvalue()).decode("utf-8"))
-        plt.close(fig)
+    visuals = subsidy_charts() if not refinement_needed else []
 
-    logger.info("[Recommendation] Generated recommendations (first 100 chars): %s... Refinement needed: %s", response[:100], refinement_needed)
-    return {"recommendations": response, "refinement_needed": refinement_needed, "visuals": visuals}
+    logger.info("[Recommendation] Generated recommendations (first 100 chars): %s... Refinement needed: %s, validation issues: %s", response[:100], refinement_needed, draft_issues)
+    return {"recommendations": response, "refinement_needed": refinement_needed, "visuals": visuals, "draft_valid": not draft_issues, "llm_calls": state.get("llm_calls", 0) + 1, "context_stats": context.stats}
 
 def refine_node(state: FarmerState) -> Dict[str, Any]:
     logger.info("[Refine] Starting refinement of recommendations.")
@@ -205,37 +197,73 @@ def refine_node(state: FarmerState) -> Dict[str, Any]:
         ("human", "{recommendations}")
     ])
 
-    response = (prompt | llm).invoke({"recommendations": state["recommendations"]}).content.strip()
+    response = (prompt | get_llm()).invoke({"recommendations": state["recommendations"]}).content.strip()
     logger.info("[Refine] Refined recommendations (first 100 chars): %s...", response[:100])
-    return {"recommendations": response, "refinement_needed": False, "visuals": state["visuals"]}
+    return {"recommendations": response, "refinement_needed": False, "visuals": state["visuals"], "llm_calls": state.get("llm_calls", 0) + 1}
 
 def handle_feedback_node(state: FarmerState) -> Dict[str, Any]:
     logger.info("[Feedback] Processing user feedback.")
+    if not state["refinement_needed"] and not state.get("budget_exhausted"):
+        store_recommendations(state, state["recommendations"], state["visuals"])
     feedback = state.get("feedback")
     if feedback and "not useful" in feedback.lower():
         logger.info("[Feedback] Refinement triggered due to 'not useful' feedback.")
-        return {"refinement_needed": True}
-    logger.info("[Feedback] No refinement needed based on feedback.")
-    return {"refinement_needed": False}
+        # Consumed here, so feedback buys one regeneration rather than a loop until the budget runs out.
+        return {"refinement_needed": True, "feedback": None}
+    logger.info("[Feedback] No refinement requested by feedback.")
+    # A draft cut off by the budget is still unrefined; keep it flagged for the caller.
+    return {"refinement_needed": state["refinement_needed"]}
 
-def route_recommendations(state: FarmerState) -> str:
+def out_of_budget_node(state: FarmerState) -> Dict[str, Any]:
+    logger.info("[Budget] Out of budget, the draft will not be cached.")
+    # The draft goes out as it is, but an unrefined draft must not be served from cache for the whole TTL.
+    return {"budget_exhausted": True}
+
+def route_cache(state: FarmerState) -> str:
+    return "hit" if state.get("cache_hit") else "miss"
+
+def route_draft(state: FarmerState) -> str:
     if state["refinement_needed"]:
+        if can_call_llm(state):
+            return "recommendation"
+        logger.warning("[Routing] Out of budget, returning the current draft as is.")
+        record_refine_path("budget")
+        return "out_of_budget"
+    if REFINE_MODE == "validate" and state.get("draft_valid"):
+        logger.info("[Routing] Draft passed validation, skipping refinement.")
+        record_refine_path("skipped")
+        return "handle_feedback"
+    if not can_call_llm(state):
+        logger.warning("[Routing] Out of budget, returning the draft unrefined.")
+        record_refine_path("budget")
+        return "out_of_budget"
+    record_refine_path("refined")
+    return "refine"
+
+def route_recommendations(state: FarmerState) -> str:
+    if state["refinement_needed"] and can_call_llm(state):
         return "recommendation"
     return "refine"
 
 workflow = StateGraph(FarmerState)
 
-workflow.add_node("profile_analysis", profile_analysis_node)
-workflow.add_node("web_search", web_search_node)
-workflow.add_node("recommendation", recommendation_node)
-workflow.add_node("refine", refine_node)
-workflow.add_node("handle_feedback", handle_feedback_node)
+workflow.add_node("profile_analysis", instrument_node("profile_analysis", profile_analysis_node))
+workflow.add_node("web_search", instrument_node("web_search", web_search_node))
+workflow.add_node("eligibility", instrument_node("eligibility", eligibility_node))
+workflow.add_node("cache_lookup", instrument_node("cache_lookup", cache_lookup_node))
+workflow.add_node("recommendation", instrument_node("recommendation", recommendation_node))
+workflow.add_node("refine", instrument_node("refine", refine_node))
+workflow.add_node("handle_feedback", instrument_node("handle_feedback", handle_feedback_node))
+workflow.add_node("out_of_budget", instrument_node("out_of_budget", out_of_budget_node))
 
 workflow.set_entry_point("profile_analysis")
 workflow.add_edge("profile_analysis", "web_search")
-workflow.add_edge("web_search", "recommendation")
-workflow.add_conditional_edges("recommendation", route_recommendations, {"recommendation": "recommendation", "refine": "refine"})
+workflow.add_edge("web_search", "eligibility")
+workflow.add_edge("eligibility", "cache_lookup")
+workflow.add_conditional_edges("cache_lookup", route_cache, {"miss": "recommendation", "hit": END})
+workflow.add_conditional_edges("recommendation", route_draft, {"recommendation": "recommendation", "refine": "refine", "handle_feedback": "handle_feedback", "out_of_budget": "out_of_budget"})
 workflow.add_edge("refine", "handle_feedback")
+workflow.add_edge("out_of_budget", "handle_feedback")
 workflow.add_conditional_edges("handle_feedback", route_recommendations, {"recommendation": "recommendation", "refine": END})
 
 app = workflow.compile()
@@ -248,14 +276,22 @@ def run_workflow(initial_state: Optional[FarmerState] = None) -> FarmerState:
         "recommendations": None,
         "refinement_needed": False,
         "feedback": None,
-        "visuals": []
+        "visuals": [],
+        "bypass_cache": False,
+        "cache_hit": False,
+        "draft_valid": False,
+        "eligible_schemes": []
     }
-    state = initial_state or default_state
+    state = with_budget(initial_state or default_state)
 
     try:
-        final_state = app.invoke(state)
-        logger.info("[Workflow] Execution completed successfully.")
+        with collect_spans() as spans:
+            final_state = app.invoke(state)
+        final_state["timings"] = breakdown(spans)
+        record_workflow(final_state)
+        logger.info("[Workflow] Execution completed successfully: %s", final_state["timings"])
         return final_state
     except Exception as e:
         logger.error("[Workflow] Execution failed: %s", str(e))
+        record_workflow(state, "failed")
         raise
\ No newline at end of file
@@ -1,15 +1,11 @@
-import os
 import logging
+from functools import lru_cache
 from dotenv import load_dotenv
-from langchain_cohere import CohereEmbeddings
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_pinecone import PineconeVectorStore
 from langgraph.graph import StateGraph, END
 from langchain_core.documents import Document
 from typing import TypedDict, Optional, Dict, Any, List
-from langchain import hub
-from langchain.agents import create_react_agent, AgentExecutor
-from langchain.tools import tool
+from langchain_core.tools import tool
+from clients import get_llm, get_react_prompt, get_retriever
 
 load_dotenv()
 
@@ -20,19 +16,6 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-pinecone_api_key = os.getenv("PINECONE_API_KEY")
-cohere_api_key = os.getenv("COHERE_API_KEY")
-google_api_key = os.getenv("GOOGLE_API_KEY")
-pinecone_environment = os.getenv("PINECONE_ENVIRONMENT", "us-east-1")
-
-embeddings = CohereEmbeddings(cohere_api_key=cohere_api_key, model="embed-english-v3.0")
-pc = PineconeVectorStore.from_existing_index(
-    index_name="farmwise-ai",
-    embedding=embeddings
-)
-
-llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash", api_key=google_api_key)
-
 class FarmerState(TypedDict):
     profile: Dict[str, str]
     schemes: List[Document]
@@ -45,17 +28,17 @@ def pinecone_search(query: str) -> List[Document]:
     """Search for agricultural schemes in the Pinecone index based on a query."""
     logger.info("[Pinecone Search Tool] Searching with query: %s", query)
     try:
-        results = pc.similarity_search_with_score(query=query, k=5)
+        results = get_retriever().search(query)
         return [
             Document(
-                page_content=result[0].page_content,
+                page_content=doc.page_content,
                 metadata={
-                    "url": result[0].metadata.get("url", "unknown"),
+                    "url": doc.metadata.get("url", "unknown"),
                     "source": "pinecone",
-                    "title": result[0].metadata.get("title", "Untitled")
+                    "title": doc.metadata.get("title", "Untitled")
                 }
             )
-            for result in results if result[1] > 0.2
+            for doc, _ in results
         ]
     except Exception as e:
         logger.error("[Pinecone Search Tool] Search failed: %s", str(e))
@@ -63,10 +46,13 @@ def pinecone_search(query: str) -> List[Document]:
 
 tools = [pinecone_search]
 
-# Load ReAct prompt and create agent
-prompt_template = hub.pull("hwchase17/react")
-agent = create_react_agent(llm, tools, prompt_template)
-agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True)
+@lru_cache(maxsize=None)
+def get_agent_executor():
+    # Built on first use; the ReAct prompt is vendored in clients.py.
+    from langchain.agents import create_react_agent, AgentExecutor
+
+    agent = create_react_agent(get_llm(), tools, get_react_prompt())
+    return AgentExecutor(agent=agent, tools=tools, verbose=True)
 
 def profile_analysis_node(state: FarmerState) -> Dict[str, Any]:
     logger.info("[Profile Analysis] Starting analysis of farmer profile.")
@@ -99,7 +85,7 @@ def react_agent_node(state: FarmerState) -> Dict[str, Any]:
     """
 
     try:
-        response = agent_executor.invoke({"input": combined_input})
+        response = get_agent_executor().invoke({"input": combined_input})
         logger.info("[ReAct Agent] Agent response: %s", response["output"][:100] if "output" in response else "No output")
 
         # Parse agent response to extract schemes and recommendations
@@ -29,6 +29,10 @@ import { useState } from "react";
 import axios from "axios";
 import MDEditor from "@uiw/react-md-editor";
 
+// Recommendations API base URL; chart URLs in visuals are paths on it.
+const API_BASE_URL =
+  import.meta.env.VITE_RECOMMENDATIONS_API_URL || "http://localhost:8000";
+
 // Zod schema for form validation
 const formSchema = z.object({
   district: z.string().min(1, "District is required"),
@@ -93,7 +97,7 @@ export function AgriculturalSubsidyForm() {
       };
 
       const res = await axios.post(
-        "http://localhost:8000/api/recommendations",
+        `${API_BASE_URL}/api/recommendations`,
         requestData
       );
       setRecommendations(res.data.data);
@@ -528,7 +532,7 @@ export function AgriculturalSubsidyForm() {
                         Subsidy Breakdown
                       </h3>
                       <img
-                        src={`data:image/png;base64,${visuals[0]}`}
+                        src={`${API_BASE_URL}${visuals[0]}`}
                         alt="Subsidy Breakdown"
                         className="max-h-64 mx-auto"
                       />